@@ -0,0 +1,94 @@
+from collections import Counter
+
+from django.utils import timezone
+
+from leads.api import ApiMixin, ResourceDetailView, ResourceListView
+from leads.autocomplete import invalidate_autocomplete
+from leads.conditional import touch_organizations
+from leads.models import Agent, User
+from leads.provisioning import provision_users
+from .forms import AgentInviteRowForm
+from .invites import AgentCSVInviter, queue_invites, users_by_username
+
+
+#the agents of the API, see leads/api.py. An agent is its user's names and email, agents created
+#here are invited like the ones of an invite csv, and deleting one keeps the user like the page does.
+
+USER_FIELDS = ("username", "email", "first_name", "last_name")
+
+
+class AgentResourceMixin(ApiMixin):
+    model = Agent
+    fields = {
+        "id": "id",
+        "username": "user__username",
+        "email": "user__email",
+        "first_name": "user__first_name",
+        "last_name": "user__last_name",
+        "updated_at": "updated_at",
+    }
+    writable_fields = USER_FIELDS
+    organizor_only = True
+    form_class = AgentInviteRowForm
+
+    def get_queryset(self):
+        #the user is only read along for the updates, values() leaves it out
+        return Agent.objects.for_tenant(self.request.tenant).select_related("user")
+
+    def current_values(self, agent):
+        return {name: getattr(agent.user, name) for name in USER_FIELDS}
+
+    def apply(self, agent, change):
+        for name, value in change.items():
+            setattr(agent.user, name, value)
+
+    def check_batch(self, changes, errors, objects=None):
+        #usernames are unique across every organization
+        own = {}
+        if objects is not None:
+            own = {agent.user.username: agent.user_id for agent in objects}
+        usernames = [change["username"] for change in changes if "username" in change]
+        repeated = {username for username, count in Counter(usernames).items() if count > 1}
+        taken = users_by_username(usernames)
+        for position, change in enumerate(changes):
+            username = change.get("username")
+            if username is None:
+                continue
+            if username in repeated:
+                errors.setdefault(str(position), {})["username"] = [f"{username} is in the batch more than once."]
+            elif username in taken and taken[username] != own.get(username):
+                errors.setdefault(str(position), {})["username"] = [f"{username} already exists."]
+
+    def create_objects(self, changes):
+        organization = self.request.tenant.organization
+        inviter = AgentCSVInviter(organization, self.request)
+        users = [inviter.build_user({"first_name": "", "last_name": "", **change}) for change in changes]
+        users, _, agents = provision_users(users, {user.username: organization for user in users})
+        queue_invites(self.request, users)
+        return agents
+
+    def update_objects(self, objects, changes):
+        fields = set()
+        for agent, change in zip(objects, changes):
+            self.apply(agent, change)
+            fields.update(change)
+        if not fields:
+            return
+        User.objects.bulk_update([agent.user for agent in objects], fields)
+        #what the user's post_save would have done, the agent cards show the username
+        Agent.objects.filter(pk__in=[agent.pk for agent in objects]).update(updated_at=timezone.now())
+        organization_id = self.request.tenant.organization.pk
+        touch_organizations(organization_id)
+        invalidate_autocomplete(organization_id)
+
+
+class AgentApiListView(AgentResourceMixin, ResourceListView):
+    query_budget = 4
+    sql_time_budget = 50
+    #deleting an agent clears it from its leads one agent at a time
+    query_max_repeats = None
+
+
+class AgentApiDetailView(AgentResourceMixin, ResourceDetailView):
+    query_budget = 5
+    sql_time_budget = 50
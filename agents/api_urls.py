@@ -0,0 +1,9 @@
+from django.urls import path
+from .api import AgentApiListView, AgentApiDetailView
+
+app_name = "agents-api"
+
+urlpatterns = [
+    path('', AgentApiListView.as_view(), name='agent-list'),
+    path('<int:pk>/', AgentApiDetailView.as_view(), name='agent-detail'),
+]
@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.validators import UnicodeUsernameValidator
 
 User = get_user_model()
 
@@ -13,4 +14,16 @@ class AgentModelForm(forms.ModelForm):
             'username',
             'first_name', 
             'last_name'
-        )
\ No newline at end of file
+        )
+
+
+class AgentInviteForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header row: username, email, first_name, last_name")
+
+
+#one row of an agent invite csv, usernames are checked for duplicates for the whole file at once
+class AgentInviteRowForm(forms.Form):
+    username = forms.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = forms.EmailField()
+    first_name = forms.CharField(max_length=150, required=False)
+    last_name = forms.CharField(max_length=150, required=False)
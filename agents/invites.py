@@ -0,0 +1,145 @@
+import csv
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.shortcuts import reverse
+from django.utils.crypto import salted_hmac
+
+from leads.importers import ImportResult
+from leads.models import QueuedEmail, User
+from leads.provisioning import LOOKUP_BATCH_SIZE, provision_users
+from .forms import AgentInviteRowForm
+
+
+#agents are created without a password (set_unusable_password, no hashing in the request) and
+#emailed a signed link that lets them pick one. The token carries the user id and a fingerprint of
+#the password field, so it stops working once a password is set, and expires after
+#AGENT_INVITE_MAX_AGE seconds.
+
+INVITE_SALT = "agents.invite"
+INVITE_FROM_EMAIL = "admin@test.com"
+
+
+def users_by_username(usernames):
+    """{username: id} of the users that exist among usernames."""
+    usernames = list(usernames)
+    ids = {}
+    for start in range(0, len(usernames), LOOKUP_BATCH_SIZE):
+        ids.update(
+            User.objects.filter(username__in=usernames[start:start + LOOKUP_BATCH_SIZE]).values_list("username", "pk")
+        )
+    return ids
+
+
+def password_fingerprint(user):
+    return salted_hmac(INVITE_SALT, user.password).hexdigest()[:16]
+
+
+def make_invite_token(user):
+    return signing.dumps({"user": user.pk, "password": password_fingerprint(user)}, salt=INVITE_SALT)
+
+
+def check_invite_token(token):
+    """The agent user a token invites, or None when it is forged, expired or already used."""
+    try:
+        data = signing.loads(token, salt=INVITE_SALT, max_age=settings.AGENT_INVITE_MAX_AGE)
+    except signing.BadSignature:
+        #SignatureExpired is a BadSignature too
+        return None
+    user = User.objects.filter(pk=data.get("user"), is_agent=True).first()
+    if user is None or user.has_usable_password() or data.get("password") != password_fingerprint(user):
+        return None
+    return user
+
+
+def invite_email(user, accept_url):
+    days = settings.AGENT_INVITE_MAX_AGE // (24 * 3600)
+    return QueuedEmail(
+        subject="You are invited to be a agent",
+        message=(
+            "You were added as an agent on DJCRM. Choose your password here to start working:\n\n"
+            f"{accept_url}\n\nThe link works for {days} days."
+        ),
+        from_email=INVITE_FROM_EMAIL,
+        recipients=user.email,
+    )
+
+
+def invite_urls(request, users):
+    """{user id: absolute accept invite url}, the host is only worked out once."""
+    base_url = request.build_absolute_uri("/")[:-1]
+    return {
+        user.pk: base_url + reverse("agents:accept-invite", args=[make_invite_token(user)])
+        for user in users
+    }
+
+
+def queue_invites(request, users):
+    urls = invite_urls(request, users)
+    QueuedEmail.objects.bulk_create(
+        [invite_email(user, urls[user.pk]) for user in users if user.email],
+        batch_size=500,
+    )
+
+
+class AgentCSVInviter:
+    """Create the agents listed in a CSV file and queue their invites.
+
+    Rows are validated with AgentInviteRowForm and usernames checked against the database in one
+    query per 500, then users, profiles and agents are written by provision_users and the invite
+    emails with one more bulk insert, all in one transaction. A file with any invalid row creates
+    nothing, so it can be fixed and uploaded again.
+
+    Expected columns: username, email and optionally first_name, last_name.
+    """
+
+    def __init__(self, organization, request):
+        self.organization = organization
+        self.request = request
+
+    def run(self, lines):
+        result = ImportResult()
+        users = []
+        line_numbers = {}
+        #line 1 is the header
+        for line_number, row in enumerate(csv.DictReader(lines), start=2):
+            form = AgentInviteRowForm(data=row)
+            if not form.is_valid():
+                result.add_error(line_number, [
+                    f"{field}: {message}" for field, messages in form.errors.items() for message in messages
+                ])
+                continue
+            username = form.cleaned_data["username"]
+            if username in line_numbers:
+                result.add_error(line_number, [f"username: {username} is also on line {line_numbers[username]}"])
+                continue
+            line_numbers[username] = line_number
+            users.append(self.build_user(form.cleaned_data))
+
+        taken = users_by_username(line_numbers)
+        for username in sorted(taken, key=line_numbers.get):
+            result.add_error(line_numbers[username], [f"username: {username} already exists"])
+        if result.error_count or not users:
+            return result
+
+        result.created = len(self.write(users))
+        return result
+
+    def build_user(self, data):
+        user = User(
+            username=data["username"],
+            email=data["email"],
+            first_name=data["first_name"],
+            last_name=data["last_name"],
+            is_agent=True,
+            is_organizor=False,
+        )
+        user.set_unusable_password()
+        return user
+
+    def write(self, users):
+        with transaction.atomic():
+            users, _, _ = provision_users(users, {user.username: self.organization for user in users})
+            queue_invites(self.request, users)
+        return users
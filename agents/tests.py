@@ -1,3 +1,143 @@
-from django.test import TestCase
+import json
+import re
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from leads.models import Agent, QueuedEmail, User, UserProfile
+from leads.testing import OrganizationTestMixin, QueryCountAssertionsMixin
+
+
+class AgentListQueryCountTest(OrganizationTestMixin, QueryCountAssertionsMixin, TestCase):
+    def add_agents(self, count):
+        for i in range(count):
+            self.add_agent(f"agent{i}")
+
+    def test_agent_list(self):
+        self.client.force_login(self.organizor)
+        get = lambda: self.assertEqual(self.client.get(reverse("agents:agent-list")).status_code, 200)
+        self.assertConstantQueries(get, lambda: self.add_agents(5), num=4)
+
+
+class AgentInviteTest(TestCase):
+    def setUp(self):
+        self.organizor = User.objects.create_user(username="organizor", password="pass")
+        self.client.force_login(self.organizor)
+
+    def invite_url(self, email):
+        message = QueuedEmail.objects.get(recipients=email).message
+        return re.search(r"http://testserver(/agents/invite/\S+/)", message).group(1)
+
+    def test_created_agents_get_an_invite_instead_of_a_password(self):
+        self.client.post(reverse("agents:agent-create"), {
+            "username": "jane", "email": "jane@example.com", "first_name": "Jane", "last_name": "Doe",
+        })
+        user = User.objects.get(username="jane")
+        self.assertFalse(user.has_usable_password())
+        self.assertTrue(Agent.objects.filter(user=user, organization=self.organizor.userprofile).exists())
+
+        url = self.invite_url("jane@example.com")
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post(url, {"new_password1": "a long passphrase", "new_password2": "a long passphrase"})
+        self.assertRedirects(response, reverse("leads:lead-list"))
+        user.refresh_from_db()
+        self.assertTrue(user.check_password("a long passphrase"))
+
+        #the link only works until a password is set
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_expired_and_forged_tokens_are_rejected(self):
+        self.client.post(reverse("agents:agent-create"), {"username": "jane", "email": "jane@example.com"})
+        url = self.invite_url("jane@example.com")
+        with override_settings(AGENT_INVITE_MAX_AGE=-1):
+            self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url.replace("invite/", "invite/x")).status_code, 400)
+
+    def upload(self, rows, encoding="utf-8"):
+        lines = ["username,email,first_name,last_name"] + [",".join(row) for row in rows]
+        upload = SimpleUploadedFile("agents.csv", "\n".join(lines).encode(encoding), content_type="text/csv")
+        return self.client.post(reverse("agents:agent-invite"), {"file": upload})
+
+    def test_bulk_invite_is_a_constant_number_of_queries(self):
+        rows = [(f"agent{i}", f"agent{i}@example.com", "Agent", str(i)) for i in range(500)]
+        #session, user, organization, the username check, users read back and a bulk insert each for
+        #users, profiles, agents and emails (split further by SQLite's bound parameter limit)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(rows)
+        self.assertLess(len(queries), 30)
+        self.assertEqual(response.context["result"].created, 500)
+        self.assertEqual(Agent.objects.filter(organization=self.organizor.userprofile).count(), 500)
+        self.assertEqual(UserProfile.objects.filter(user__username__startswith="agent").count(), 500)
+        self.assertEqual(QueuedEmail.objects.count(), 500)
+        self.assertFalse(User.objects.get(username="agent7").has_usable_password())
+        self.assertEqual(self.client.get(self.invite_url("agent7@example.com")).status_code, 200)
+
+    def test_bulk_invite_with_errors_creates_nobody(self):
+        User.objects.create_user(username="taken", password="pass")
+        response = self.upload([
+            ("fine", "fine@example.com", "", ""),
+            ("taken", "taken@example.com", "", ""),
+            ("twice", "twice@example.com", "", ""),
+            ("twice", "twice2@example.com", "", ""),
+            ("bad name!", "not-an-email", "", ""),
+        ])
+        result = response.context["result"]
+        self.assertEqual(result.created, 0)
+        self.assertEqual([line for line, _ in result.errors], [5, 6, 3])
+        self.assertFalse(User.objects.filter(username="fine").exists())
+
+    def test_bulk_invite_reports_a_file_that_isnt_utf8(self):
+        response = self.upload([("jose", "jose@example.com", "José", "Soap")], encoding="latin-1")
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response, "form", "file", 'The file isn\'t UTF-8 encoded, save it as "CSV UTF-8" and upload it again.')
+        self.assertFalse(User.objects.filter(username="jose").exists())
+
+
+class AgentApiTest(OrganizationTestMixin, TestCase):
+    def setUp(self):
+        super(AgentApiTest, self).setUp()
+        self.client.force_login(self.organizor)
+
+    def send(self, method, batch):
+        return getattr(self.client, method)(
+            reverse("agents-api:agent-list"), json.dumps(batch), content_type="application/json"
+        )
+
+    def test_created_agents_are_invited(self):
+        response = self.send("post", [
+            {"username": "jane", "email": "jane@example.com", "first_name": "Jane"},
+            {"username": "joe", "email": "joe@example.com"},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row["username"] for row in response.json()["results"]], ["jane", "joe"])
+        self.assertEqual(response.json()["results"][0]["first_name"], "Jane")
+        self.assertFalse(User.objects.get(username="jane").has_usable_password())
+        self.assertEqual(QueuedEmail.objects.count(), 2)
+
+        response = self.send("post", [{"username": "agent", "email": "agent@example.com"}])
+        self.assertEqual(response.json(), {"errors": {"0": {"username": ["agent already exists."]}}})
+
+    def test_update_and_delete(self):
+        response = self.send("patch", [{"id": self.agent.pk, "username": "renamed", "last_name": "Smith"}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["username"], "renamed")
+        self.assertEqual(User.objects.get(pk=self.agent.user_id).last_name, "Smith")
+        #keeping its own username is fine, taking someone else's isn't
+        self.assertEqual(self.send("patch", [{"id": self.agent.pk, "username": "renamed"}]).status_code, 200)
+        self.assertEqual(self.send("patch", [{"id": self.agent.pk, "username": "organizor"}]).status_code, 400)
+
+        self.assertEqual(self.send("delete", [self.agent.pk]).json(), {"deleted": 1})
+        self.assertFalse(Agent.objects.exists())
+        self.assertTrue(User.objects.filter(username="renamed").exists())
+
+    def test_is_for_organizors(self):
+        url = reverse("agents-api:agent-detail", args=[self.agent.pk])
+        self.assertEqual(self.client.get(url, {"fields": "username"}).json(), {"username": "agent"})
+        self.client.force_login(self.agent.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(reverse("agents-api:agent-list")).status_code, 403)
@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
     AgentListView, AgentCreateView, AgentDetailView, 
-    AgentUpdateView, AgentDeleteView
+    AgentUpdateView, AgentDeleteView, AgentInviteView, AcceptInviteView
 )
 app_name = "agents"
 
@@ -11,5 +11,7 @@ urlpatterns = [
     path('<int:pk>/update/', AgentUpdateView.as_view(), name='agent-update'),
     path('<int:pk>/delete/', AgentDeleteView.as_view(), name='agent-delete'),
     path('create/', AgentCreateView.as_view(), name='agent-create'),
+    path('invite/', AgentInviteView.as_view(), name='agent-invite'),
+    path('invite/<str:token>/', AcceptInviteView.as_view(), name='accept-invite'),
     
 ]
\ No newline at end of file
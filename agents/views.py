@@ -1,21 +1,27 @@
-import random
-from django.core.mail import send_mail
+import io
 from django.views import generic
+from django.contrib.auth import login
+from django.contrib.auth.forms import SetPasswordForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import reverse, render, redirect
+from leads.conditional import ConditionalGetMixin
+from leads.importers import CSV_READ_ERRORS, csv_read_error
 from leads.models import Agent
-from .forms import AgentModelForm
+from .forms import AgentModelForm, AgentInviteForm
+from .invites import AgentCSVInviter, check_invite_token, queue_invites
 from .mixins import OrganizorAndLoginRequiredMixin
 
 
 # Create your views here.
-class AgentListView(OrganizorAndLoginRequiredMixin, generic.ListView):
+class AgentListView(OrganizorAndLoginRequiredMixin, ConditionalGetMixin, generic.ListView):
+    query_budget = 4
+    sql_time_budget = 50
     template_name = "agents/agent_list.html"
 
     def get_queryset(self):
-        organization = self.request.user.userprofile
-        #filtering by organiztion for the request.user.profile model
-        return Agent.objects.filter(organization=organization)
+        #filtering by organiztion of the logged in organizor
+        #select_related joins the user in so agent.user.username in the template doesn't query per row
+        return Agent.objects.for_tenant(self.request.tenant).select_related("user")
 
 
 
@@ -42,24 +48,61 @@ class AgentCreateView(OrganizorAndLoginRequiredMixin, generic.CreateView):
         user = form.save(commit=False)
         user.is_agent = True
         user.is_organizor = False
-        user.set_password(f"{random.randint(0, 10000000)}")
+        #no password until the agent picks one through the invite link, and no hashing here
+        user.set_unusable_password()
         user.save()
         Agent.objects.create(
             user=user,
-            organization=self.request.user.userprofile
-        )
-        send_mail(
-            subject="You are invited to be a agent",
-            message="You were added as an agent on DJCRM. Please come login to start working.",
-            from_email="admin@test.com",
-            recipient_list=[user.email]
+            organization=self.request.tenant.organization
         )
+        queue_invites(self.request, [user])
         # agent.organization = self.request.user.userprofile
         # agent.save()
         return super(AgentCreateView, self).form_valid(form)
 
 
 
+class AgentInviteView(OrganizorAndLoginRequiredMixin, generic.FormView):
+    template_name = "agents/agent_invite.html"
+    form_class = AgentInviteForm
+
+    def form_valid(self, form):
+        lines = io.TextIOWrapper(form.cleaned_data["file"].file, encoding="utf-8-sig", newline="")
+        try:
+            result = AgentCSVInviter(self.request.tenant.organization, self.request).run(lines)
+        except CSV_READ_ERRORS as error:
+            #nothing is written until the whole file has been read
+            form.add_error("file", csv_read_error(error))
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(form=form, result=result))
+
+
+#the link in the invite email, lets a new agent choose a password and logs them in
+class AcceptInviteView(generic.FormView):
+    template_name = "agents/accept_invite.html"
+    form_class = SetPasswordForm
+
+    def dispatch(self, request, *args, **kwargs):
+        self.invited_user = check_invite_token(kwargs["token"])
+        if self.invited_user is None:
+            return render(request, "agents/accept_invite.html", {"invalid": True}, status=400)
+        return super(AcceptInviteView, self).dispatch(request, *args, **kwargs)
+
+    def get_form_kwargs(self):
+        kwargs = super(AcceptInviteView, self).get_form_kwargs()
+        kwargs["user"] = self.invited_user
+        return kwargs
+
+    def get_success_url(self):
+        return reverse("leads:lead-list")
+
+    def form_valid(self, form):
+        user = form.save()
+        login(self.request, user)
+        return super(AcceptInviteView, self).form_valid(form)
+
+
+
 # def agent_create(request):
     # form = AgentModelForm()
     # if request.method == "POST":
@@ -83,13 +126,23 @@ class AgentCreateView(OrganizorAndLoginRequiredMixin, generic.CreateView):
     # }
     # return render(request, "leads/agent_list.html", context)
 
-class AgentDetailView(OrganizorAndLoginRequiredMixin, generic.DetailView):
+class AgentDetailView(OrganizorAndLoginRequiredMixin, ConditionalGetMixin, generic.DetailView):
+    query_budget = 5
+    sql_time_budget = 50
     template_name = "agents/agent_detail.html"
     context_object_name = "agent"
 
+    def get_change_stamp(self):
+        #also moved when the agent's user is saved
+        return (
+            Agent.objects.for_tenant(self.request.tenant)
+            .filter(pk=self.kwargs["pk"])
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+
     def get_queryset(self):
-        organization = self.request.user.userprofile
-        return Agent.objects.filter(organization=organization)
+        return Agent.objects.for_tenant(self.request.tenant).select_related("user")
 
 
 
@@ -113,8 +166,7 @@ class AgentUpdateView(OrganizorAndLoginRequiredMixin, generic.UpdateView):
         return reverse("agents:agent-list")
 
     def get_queryset(self):
-        organization = self.request.user.userprofile
-        return Agent.objects.filter(organization=organization)
+        return Agent.objects.for_tenant(self.request.tenant).select_related("user")
 
 
 
@@ -144,8 +196,7 @@ class AgentDeleteView(OrganizorAndLoginRequiredMixin, generic.DeleteView):
         return reverse("agents:agent-list")
 
     def get_queryset(self):
-        organization = self.request.user.userprofile
-        return Agent.objects.filter(organization=organization)
+        return Agent.objects.for_tenant(self.request.tenant).select_related("user")
 
 
 
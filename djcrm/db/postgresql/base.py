@@ -0,0 +1,153 @@
+import threading
+import time
+from contextlib import suppress
+
+from django.db import DatabaseError
+from django.db.backends.postgresql import base
+import psycopg2
+from psycopg2 import extensions
+
+
+#the stock postgresql backend plus two things Django 3.1 doesn't have:
+#
+#CONN_HEALTH_CHECKS   before a request first uses a persistent connection it checks it still works,
+#                     so a connection the server dropped while idle costs a reconnect instead of a 500
+#POOL                 {"max_size": n, "timeout": seconds, "max_lifetime": seconds} keeps connections in a
+#                     pool shared by all threads of the process. Use it with CONN_MAX_AGE = 0, Django then
+#                     hands the connection back to the pool at the end of every request
+
+
+class ConnectionPool:
+    """At most max_size connections, checked out by one thread at a time, newest idle connection first."""
+
+    def __init__(self, max_size, timeout=10, max_lifetime=3600, health_checks=False):
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_checks = health_checks
+        self.lock = threading.Lock()
+        #[(created, connection)]
+        self.idle = []
+        self.created = {}
+
+    def usable(self, connection, created):
+        if connection.closed or time.monotonic() - created > self.max_lifetime:
+            return False
+        if self.health_checks:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            except psycopg2.Error:
+                return False
+        return True
+
+    def get(self, connect):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise psycopg2.OperationalError(f"No database connection free after {self.timeout}s, raise POOL max_size")
+        try:
+            while True:
+                with self.lock:
+                    created, connection = self.idle.pop() if self.idle else (None, None)
+                if connection is None:
+                    connection = connect()
+                    self.created[id(connection)] = time.monotonic()
+                    return connection
+                if self.usable(connection, created):
+                    self.created[id(connection)] = created
+                    return connection
+                self.discard(connection)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def put(self, connection):
+        try:
+            created = self.created.pop(id(connection), 0)
+            if connection.closed:
+                return
+            #whatever the request left open is rolled back, the next one gets a clean connection
+            if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            with self.lock:
+                self.idle.append((created, connection))
+        except psycopg2.Error:
+            self.discard(connection)
+        finally:
+            self.slots.release()
+
+    def discard(self, connection):
+        with suppress(psycopg2.Error):
+            connection.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for _, connection in idle:
+            self.discard(connection)
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias, options, health_checks):
+    with pools_lock:
+        if alias not in pools:
+            pools[alias] = ConnectionPool(
+                options["max_size"],
+                timeout=options.get("timeout", 10),
+                max_lifetime=options.get("max_lifetime", 3600),
+                health_checks=health_checks,
+            )
+        return pools[alias]
+
+
+def close_pools():
+    with pools_lock:
+        for pool in pools.values():
+            pool.close()
+        pools.clear()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get("POOL")
+        if not options:
+            return None
+        return get_pool(self.alias, options, self.settings_dict.get("CONN_HEALTH_CHECKS", False))
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super(DatabaseWrapper, self).get_new_connection(conn_params)
+        #the pool checks its own connections, a fresh checkout needs no second check
+        self.health_check_done = True
+        return pool.get(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super(DatabaseWrapper, self)._close()
+        with self.wrap_database_errors:
+            pool.put(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        super(DatabaseWrapper, self).close_if_unusable_or_obsolete()
+        #runs when a request starts and finishes, the next request checks the connection again
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                with suppress(DatabaseError):
+                    self.close()
+            self.health_check_done = True
+        super(DatabaseWrapper, self).ensure_connection()
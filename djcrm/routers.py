@@ -0,0 +1,81 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+#reads go to a replica, writes to the primary (default). Replicas lag behind the primary, so once
+#a request writes, the rest of it and the same browser's requests for the next
+#DATABASE_REPLICA_STICKY_SECONDS read from the primary too and people see what they just saved.
+#
+#the flags live in context variables so they are per request under both WSGI threads and ASGI tasks.
+#outside a request (management commands, the mail worker) the first write pins the rest of the run.
+
+pinned_to_primary = ContextVar("pinned_to_primary", default=False)
+wrote_to_primary = ContextVar("wrote_to_primary", default=False)
+
+
+def pin_to_primary():
+    pinned_to_primary.set(True)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or pinned_to_primary.get():
+            return DEFAULT_DB_ALIAS
+        #reads inside a transaction must see the transaction's own writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        wrote_to_primary.set(True)
+        pinned_to_primary.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        #every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        #replicas get their schema through replication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """Keep a browser's reads on the primary for a while after it wrote something.
+
+    Goes first in MIDDLEWARE, so session writes made while the response goes out count too.
+    """
+    cookie_name = "primary_until"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def pinned_until(self, request):
+        try:
+            return float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            return 0
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        pinned = pinned_to_primary.set(self.pinned_until(request) > time.time())
+        wrote = wrote_to_primary.set(False)
+        try:
+            response = self.get_response(request)
+            if wrote_to_primary.get():
+                window = settings.DATABASE_REPLICA_STICKY_SECONDS
+                response.set_cookie(
+                    self.cookie_name, str(time.time() + window), max_age=window, httponly=True, samesite="Lax"
+                )
+        finally:
+            pinned_to_primary.reset(pinned)
+            wrote_to_primary.reset(wrote)
+        return response
@@ -34,6 +34,9 @@ urlpatterns = [
     path('', LandingPageView.as_view(), name='landing-page'),
     path('leads/',  include('leads.urls', namespace="leads")),
     path('agents/',  include('agents.urls', namespace="agents")),
+    #JSON API of the same rows, see leads/api.py
+    path('api/leads/',  include('leads.api_urls', namespace="leads-api")),
+    path('api/agents/',  include('agents.api_urls', namespace="agents-api")),
     path('signup/', SignupView.as_view(), name='signup'),
     path('reset-password/', PasswordResetView.as_view(), name='reset-password'),
     path('password-reset-done/', PasswordResetDoneView.as_view(), name='password_reset_done'),   
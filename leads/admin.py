@@ -1,10 +1,11 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import User, Lead, Agent, UserProfile, Category
+from .models import User, Lead, Agent, UserProfile, Category, QueuedEmail
 
 admin.site.register(Category)
 admin.site.register(User)
 admin.site.register(UserProfile)
 admin.site.register(Lead)
 admin.site.register(Agent)
+admin.site.register(QueuedEmail)
@@ -0,0 +1,376 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from django.views import generic
+
+from .conditional import ConditionalGetMixin, touch_organizations
+from .forms import CategoryModelForm, LeadImportRowForm
+from .models import Agent, Category, Lead
+from .pagination import IdKeysetPaginator, KeysetPaginator
+from .provisioning import read_back_inserted_ids
+
+
+#JSON API for integrations. Each resource has a collection url and one url per row:
+#
+#  GET     collection/?fields=id,email&limit=100&cursor=...   {"results": [...], "next_cursor": ...}
+#  POST    collection/  [{...}, ...]                          creates the rows, 201 {"results": [...]}
+#  PATCH   collection/  [{"id": 1, ...}, ...]                 changes the fields sent, {"results": [...]}
+#  DELETE  collection/  [1, 2, ...]                           {"deleted": 2}
+#  GET     collection/<id>/?fields=...                        the row
+#
+#rows are scoped like the pages, organizors see their organization and agents their own leads. A
+#batch is validated as a whole and written in one transaction, a single bad row writes nothing and
+#comes back as {"errors": {"<position in the batch>": {"<field>": ["..."]}}}.
+#
+#responses are built from values() dicts, the fields= sparse fieldset picks the columns read, and
+#writes use bulk_create / bulk_update so a batch of hundreds of rows is a handful of statements.
+#the API goes by the session like the pages, unsafe requests need the csrftoken cookie sent back
+#in an X-CSRFToken header.
+
+
+class ApiError(Exception):
+    """Ends a request with status and body as JSON."""
+
+    def __init__(self, status, body):
+        super(ApiError, self).__init__(body)
+        self.status = status
+        self.body = body
+
+
+def bad_request(detail):
+    return ApiError(400, {"detail": detail})
+
+
+def form_errors(form):
+    return {field: list(messages) for field, messages in form.errors.items()}
+
+
+class ApiMixin:
+    """JSON in and out, errors included, for the rows of model the tenant may see.
+
+    fields maps the field names of the API to the values() lookups they are read with. Organizors
+    may write writable_fields, agents only agent_writable_fields of the rows they can see, and
+    nothing at all with organizor_only.
+    """
+
+    model = None
+    fields = {}
+    writable_fields = ()
+    agent_writable_fields = ()
+    organizor_only = False
+    #validates each row of a batch, the rows of an update with their current values filled in
+    form_class = None
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            if not request.user.is_authenticated:
+                raise ApiError(401, {"detail": "Authentication credentials were not provided."})
+            if self.organizor_only and not request.tenant.is_organizor:
+                raise PermissionDenied
+            return super(ApiMixin, self).dispatch(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse(error.body, status=error.status)
+        except PermissionDenied:
+            return JsonResponse({"detail": "You do not have permission to perform this action."}, status=403)
+        except Http404 as error:
+            return JsonResponse({"detail": str(error) or "Not found."}, status=404)
+
+    def get_queryset(self):
+        return self.model.objects.for_tenant(self.request.tenant)
+
+    def get_fields(self):
+        """The fields to send, all of them or the ?fields= sparse fieldset."""
+        requested = self.request.GET.get("fields")
+        if not requested:
+            return list(self.fields)
+        names = [name.strip() for name in requested.split(",") if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise bad_request(f"Unknown fields: {', '.join(unknown)}.")
+        return names
+
+    def values(self, queryset, names):
+        """queryset.values() reading only names, each under its API name."""
+        plain = [name for name in names if self.fields[name] == name]
+        renamed = {name: F(self.fields[name]) for name in names if self.fields[name] != name}
+        return queryset.values(*plain, **renamed)
+
+
+class ResourceListView(ApiMixin, ConditionalGetMixin, generic.View):
+    """A page of rows, newest first or by id as paginator_class orders them, and batch writes."""
+
+    paginator_class = IdKeysetPaginator
+    #what the paginator makes its cursors from, read for every page even when fields= leaves them out
+    cursor_fields = ("id",)
+
+    def get_page_size(self):
+        try:
+            limit = int(self.request.GET.get("limit", settings.API_PAGE_SIZE))
+        except ValueError:
+            raise bad_request("limit must be a whole number.")
+        return min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+    def get(self, request, *args, **kwargs):
+        names = self.get_fields()
+        extra = [name for name in self.cursor_fields if name not in names]
+        queryset = self.values(self.get_queryset(), names + extra)
+        page = self.paginator_class(queryset, self.get_page_size()).page(request.GET.get("cursor") or None)
+        results = page.object_list
+        if extra:
+            results = [{name: row[name] for name in names} for row in results]
+        return JsonResponse({"results": results, "next_cursor": page.next_cursor})
+
+    def post(self, request, *args, **kwargs):
+        if not request.tenant.is_organizor:
+            raise PermissionDenied
+        names = self.get_fields()
+        batch = self.read_batch()
+        with transaction.atomic():
+            changes = self.clean_batch(batch)
+            objects = self.create_objects(changes)
+        return self.batch_response(names, [obj.pk for obj in objects], status=201)
+
+    def patch(self, request, *args, **kwargs):
+        names = self.get_fields()
+        batch = self.read_batch()
+        ids = self.read_row_ids(batch)
+        if not request.tenant.is_organizor:
+            allowed = set(self.agent_writable_fields) | {"id"}
+            if any(set(row) - allowed for row in batch):
+                raise PermissionDenied
+        with transaction.atomic():
+            #locked until the batch is written, so concurrent batches can't undo each other's changes
+            found = self.get_queryset().select_for_update().in_bulk(ids)
+            missing = {
+                str(position): {"id": ["Not found."]} for position, pk in enumerate(ids) if pk not in found
+            }
+            if missing:
+                raise ApiError(400, {"errors": missing})
+            objects = [found[pk] for pk in ids]
+            changes = self.clean_batch(batch, objects)
+            self.update_objects(objects, changes)
+        return self.batch_response(names, ids)
+
+    def delete(self, request, *args, **kwargs):
+        if not request.tenant.is_organizor:
+            raise PermissionDenied
+        ids = self.read_batch()
+        if not all(isinstance(pk, int) for pk in ids) or len(set(ids)) != len(ids):
+            raise bad_request("Send a JSON array of distinct ids.")
+        with transaction.atomic():
+            queryset = self.get_queryset().filter(pk__in=ids)
+            found = set(queryset.values_list("pk", flat=True))
+            missing = {str(position): ["Not found."] for position, pk in enumerate(ids) if pk not in found}
+            if missing:
+                raise ApiError(400, {"errors": missing})
+            #one at a time through the delete signals, which keep the rollups, event log and stamps right
+            queryset.delete()
+        return JsonResponse({"deleted": len(ids)})
+
+    def read_batch(self):
+        try:
+            batch = json.loads(self.request.body)
+        except ValueError:
+            raise bad_request("The body is not valid JSON.")
+        if not isinstance(batch, list) or not batch:
+            raise bad_request("Send a JSON array with at least one item.")
+        if len(batch) > settings.API_MAX_BATCH_SIZE:
+            raise bad_request(f"At most {settings.API_MAX_BATCH_SIZE} items per request.")
+        return batch
+
+    def read_row_ids(self, batch):
+        if not all(isinstance(row, dict) and isinstance(row.get("id"), int) for row in batch):
+            raise bad_request("Every object needs the id of the row it changes.")
+        ids = [row["id"] for row in batch]
+        if len(set(ids)) != len(ids):
+            raise bad_request("Each id can only be changed once per request.")
+        return ids
+
+    def clean_batch(self, batch, objects=None):
+        """[{field: value}] of the fields each row sets, raising ApiError with the errors of every bad row.
+
+        objects are the rows being updated, in the order of the batch, None for a create.
+        """
+        errors = {}
+        changes = []
+        for position, row in enumerate(batch):
+            if not isinstance(row, dict):
+                errors[str(position)] = {"__all__": ["Expected an object."]}
+                continue
+            row = {name: value for name, value in row.items() if name != "id"}
+            unknown = [name for name in row if name not in self.writable_fields]
+            if unknown:
+                errors[str(position)] = {name: ["This field can't be written."] for name in unknown}
+                continue
+            data = row
+            if objects is not None:
+                #the form sees the row as it will be once the change is made
+                data = {**self.current_values(objects[position]), **row}
+            form = self.form_class(data=data)
+            form.is_valid()
+            row_errors = form_errors(form)
+            if objects is not None:
+                #only what the change touches, rows saved before aren't held to today's rules
+                row_errors = {name: messages for name, messages in row_errors.items() if name in row}
+            if row_errors:
+                errors[str(position)] = row_errors
+                continue
+            #fields the form doesn't know, such as the foreign keys, are checked by check_batch
+            changes.append({name: form.cleaned_data.get(name, value) for name, value in row.items()})
+        if not errors:
+            self.check_batch(changes, errors, objects)
+        if errors:
+            raise ApiError(400, {"errors": errors})
+        return changes
+
+    def current_values(self, obj):
+        return {name: getattr(obj, self.model._meta.get_field(name).attname) for name in self.writable_fields}
+
+    def check_batch(self, changes, errors, objects=None):
+        """Checks that need the whole batch, adding {position: {field: [message]}} to errors."""
+
+    def create_objects(self, changes):
+        raise NotImplementedError
+
+    def update_objects(self, objects, changes):
+        raise NotImplementedError
+
+    def apply(self, obj, change):
+        for name, value in change.items():
+            setattr(obj, self.model._meta.get_field(name).attname, value)
+
+    def batch_response(self, names, ids, status=200):
+        """The rows of a batch in the order they were sent, read back in one query."""
+        extra = [] if "id" in names else ["id"]
+        rows = {row["id"]: row for row in self.values(self.get_queryset().filter(pk__in=ids), names + extra)}
+        results = [rows[pk] for pk in ids]
+        if extra:
+            results = [{name: row[name] for name in names} for row in results]
+        return JsonResponse({"results": results}, status=status)
+
+
+class ResourceDetailView(ApiMixin, ConditionalGetMixin, generic.View):
+    def get_change_stamp(self):
+        #every resource has an updated_at, a row the user can't see has no stamp and 404s
+        return self.get_queryset().filter(pk=self.kwargs["pk"]).values_list("updated_at", flat=True).first()
+
+    def get(self, request, *args, **kwargs):
+        row = self.values(self.get_queryset().filter(pk=self.kwargs["pk"]), self.get_fields()).first()
+        if row is None:
+            raise Http404
+        return JsonResponse(row)
+
+
+class LeadResourceMixin(ApiMixin):
+    model = Lead
+    fields = {
+        "id": "id",
+        "first_name": "first_name",
+        "last_name": "last_name",
+        "age": "age",
+        "email": "email",
+        "phone_number": "phone_number",
+        "description": "description",
+        #ids, null when there is none
+        "agent": "agent",
+        "category": "category",
+        "date_added": "date_added",
+        "updated_at": "updated_at",
+    }
+    writable_fields = (
+        "first_name", "last_name", "age", "email", "phone_number", "description", "agent", "category",
+    )
+    #like the category form on the lead page
+    agent_writable_fields = ("category",)
+    #agent and category are checked against the organization for the whole batch, not by the form
+    form_class = LeadImportRowForm
+
+    def check_batch(self, changes, errors, objects=None):
+        organization = self.request.tenant.organization
+        for name, model in (("agent", Agent), ("category", Category)):
+            ids = {change[name] for change in changes if change.get(name) is not None}
+            valid = set()
+            if all(isinstance(pk, int) for pk in ids):
+                valid = set(model.objects.filter(organization=organization, pk__in=ids).values_list("pk", flat=True))
+            for position, change in enumerate(changes):
+                if change.get(name) is not None and change[name] not in valid:
+                    errors.setdefault(str(position), {})[name] = [f"No {name} {change[name]!r} in this organization."]
+
+    def create_objects(self, changes):
+        organization = self.request.tenant.organization
+        leads = []
+        for change in changes:
+            lead = Lead(organization=organization)
+            self.apply(lead, change)
+            leads.append(lead)
+        Lead.objects.bulk_create(leads)
+        read_back_inserted_ids(Lead, leads)
+        return leads
+
+    def update_objects(self, objects, changes):
+        fields = set()
+        for lead, change in zip(objects, changes):
+            self.apply(lead, change)
+            fields.update(change)
+        if not fields:
+            return
+        Lead.objects.bulk_update(objects, fields)
+
+
+class LeadApiListView(LeadResourceMixin, ResourceListView):
+    query_budget = 4
+    sql_time_budget = 100
+    paginator_class = KeysetPaginator
+    cursor_fields = ("date_added", "id")
+
+
+class LeadApiDetailView(LeadResourceMixin, ResourceDetailView):
+    query_budget = 5
+    sql_time_budget = 50
+
+
+class CategoryResourceMixin(ApiMixin):
+    model = Category
+    fields = {
+        "id": "id",
+        "name": "name",
+        "updated_at": "updated_at",
+    }
+    writable_fields = ("name",)
+    form_class = CategoryModelForm
+
+    def create_objects(self, changes):
+        organization = self.request.tenant.organization
+        categories = [Category(organization=organization, **change) for change in changes]
+        Category.objects.bulk_create(categories)
+        read_back_inserted_ids(Category, categories)
+        touch_organizations(organization.pk)
+        return categories
+
+    def update_objects(self, objects, changes):
+        if not any(changes):
+            return
+        #auto_now is only applied by save()
+        timestamp = timezone.now()
+        for category, change in zip(objects, changes):
+            self.apply(category, change)
+            category.updated_at = timestamp
+        Category.objects.bulk_update(objects, ["name", "updated_at"])
+        touch_organizations(self.request.tenant.organization.pk)
+
+
+class CategoryApiListView(CategoryResourceMixin, ResourceListView):
+    query_budget = 4
+    sql_time_budget = 50
+    #deleting a category clears it from its leads one category at a time
+    query_max_repeats = None
+
+
+class CategoryApiDetailView(CategoryResourceMixin, ResourceDetailView):
+    query_budget = 5
+    sql_time_budget = 50
@@ -0,0 +1,16 @@
+from django.urls import path
+from .api import (
+    LeadApiListView,
+    LeadApiDetailView,
+    CategoryApiListView,
+    CategoryApiDetailView,
+)
+
+app_name = "leads-api"
+
+urlpatterns = [
+    path('', LeadApiListView.as_view(), name='lead-list'),
+    path('<int:pk>/', LeadApiDetailView.as_view(), name='lead-detail'),
+    path('categories/', CategoryApiListView.as_view(), name='category-list'),
+    path('categories/<int:pk>/', CategoryApiDetailView.as_view(), name='category-detail'),
+]
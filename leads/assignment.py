@@ -0,0 +1,167 @@
+import heapq
+from itertools import cycle
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .autocomplete import invalidate_autocomplete
+from .conditional import touch_organizations
+from .events import AGENT, leads_updated
+from .models import Agent, Lead
+from .rollups import NONE_KEY, rebuild_rollups_matching
+
+
+ROUND_ROBIN = "round_robin"
+LEAST_LOADED = "least_loaded"
+CATEGORY_AFFINITY = "category_affinity"
+STRATEGY_CHOICES = (
+    (ROUND_ROBIN, "Round robin"),
+    (LEAST_LOADED, "Least loaded"),
+    (CATEGORY_AFFINITY, "Category affinity"),
+)
+
+#leads in these categories are done with and don't count towards an agent's load
+CLOSED_CATEGORY_NAMES = ("Converted", "Unconverted")
+
+
+class AssignmentEngine:
+    """Spread unassigned leads of an organization across its agents.
+
+    plan() decides which agent gets which lead without touching the leads, apply() writes
+    the plan with one UPDATE (and one bulk insert into the event log) per agent and chunk of
+    leads, so assigning 50k leads is a few dozen statements instead of 50k saves.
+
+    round_robin    deals the leads out in turn, oldest lead first
+    least_loaded   always gives the next lead to the agent with the fewest open leads
+    category_affinity
+                   gives a lead to the least loaded agent among those already working
+                   leads of its category, falling back to least_loaded
+    """
+
+    #stays under SQLite's 999 bound parameters per statement
+    batch_size = 900
+
+    def __init__(self, organization, strategy=ROUND_ROBIN):
+        self.organization = organization
+        self.strategy = strategy
+        self.agent_ids = list(
+            Agent.objects.filter(organization=organization).order_by("id").values_list("id", flat=True)
+        )
+
+    def unassigned_leads(self, lead_ids=None):
+        """[(lead_id, category_id)] oldest first, of the selected unassigned leads or all of them."""
+        queryset = Lead.objects.filter(organization=self.organization, agent__isnull=True)
+        if lead_ids is None:
+            return list(queryset.order_by("date_added", "id").values_list("id", "category_id"))
+        lead_ids = list(lead_ids)
+        leads = []
+        for start in range(0, len(lead_ids), self.batch_size):
+            leads.extend(
+                queryset.filter(pk__in=lead_ids[start:start + self.batch_size])
+                .values_list("date_added", "id", "category_id")
+            )
+        return [(lead_id, category_id) for _, lead_id, category_id in sorted(leads)]
+
+    def open_lead_counts(self):
+        """{agent_id: open leads} for every agent, from one aggregate query."""
+        counts = dict.fromkeys(self.agent_ids, 0)
+        rows = (
+            Lead.objects.filter(organization=self.organization, agent__isnull=False)
+            .exclude(category__name__in=CLOSED_CATEGORY_NAMES)
+            .values_list("agent")
+            .annotate(Count("id"))
+            .order_by()
+        )
+        counts.update(rows)
+        return counts
+
+    def category_specialists(self):
+        """{category_id: {agent_id, ...}} of the agents already holding leads in each category."""
+        specialists = {}
+        rows = (
+            Lead.objects.filter(organization=self.organization, agent__isnull=False, category__isnull=False)
+            .values_list("category", "agent")
+            .distinct()
+        )
+        for category_id, agent_id in rows:
+            specialists.setdefault(category_id, set()).add(agent_id)
+        return specialists
+
+    def plan(self, lead_ids=None):
+        """Return {lead_id: agent_id} for the selected unassigned leads, or all of them."""
+        leads = self.unassigned_leads(lead_ids)
+        if not leads or not self.agent_ids:
+            return {}
+        if self.strategy == ROUND_ROBIN:
+            return self.plan_round_robin(leads)
+        if self.strategy == LEAST_LOADED:
+            return self.plan_least_loaded(leads)
+        if self.strategy == CATEGORY_AFFINITY:
+            return self.plan_category_affinity(leads)
+        raise ValueError(f"Unknown assignment strategy {self.strategy!r}")
+
+    def plan_round_robin(self, leads):
+        agents = cycle(self.agent_ids)
+        return {lead_id: next(agents) for lead_id, _ in leads}
+
+    def plan_least_loaded(self, leads):
+        #(load, agent_id) heap, the agent id breaks ties so the result is deterministic
+        heap = [(load, agent_id) for agent_id, load in self.open_lead_counts().items()]
+        heapq.heapify(heap)
+        plan = {}
+        for lead_id, _ in leads:
+            load, agent_id = heap[0]
+            plan[lead_id] = agent_id
+            heapq.heapreplace(heap, (load + 1, agent_id))
+        return plan
+
+    def plan_category_affinity(self, leads):
+        loads = self.open_lead_counts()
+        specialists = self.category_specialists()
+        plan = {}
+        for lead_id, category_id in leads:
+            #a linear scan over the candidates is fine, organizations have tens of agents not thousands
+            candidates = specialists.get(category_id) or loads
+            agent_id = min(candidates, key=lambda candidate: (loads[candidate], candidate))
+            plan[lead_id] = agent_id
+            loads[agent_id] += 1
+        return plan
+
+    def apply(self, plan):
+        """Write the plan and return how many leads were assigned.
+
+        Leads that got an agent since the plan was made are left alone.
+        """
+        by_agent = {}
+        for lead_id, agent_id in plan.items():
+            by_agent.setdefault(agent_id, []).append(lead_id)
+
+        assigned = 0
+        timestamp = timezone.now()
+        with transaction.atomic():
+            for agent_id, lead_ids in by_agent.items():
+                for start in range(0, len(lead_ids), self.batch_size):
+                    #the leads still unassigned, locked so the event log records exactly the ones updated
+                    unassigned = list(
+                        Lead.objects.select_for_update().filter(
+                            pk__in=lead_ids[start:start + self.batch_size],
+                            organization=self.organization,
+                            agent__isnull=True,
+                        ).values_list("pk", flat=True)
+                    )
+                    if not unassigned:
+                        continue
+                    assigned += Lead.objects.filter(pk__in=unassigned).update(agent_id=agent_id, updated_at=timestamp)
+                    leads_updated(self.organization.pk, unassigned, AGENT, None, agent_id, timestamp)
+            #the UPDATEs send no signals: the agents' autocomplete only lists their own leads, and
+            #the dashboard rollups count leads under their agent
+            if assigned:
+                invalidate_autocomplete(self.organization.pk)
+                touch_organizations(self.organization.pk)
+                #the assigned leads were counted as unassigned on the days they were added
+                rebuild_rollups_matching(self.organization.pk, agent_key=NONE_KEY)
+        return assigned
+
+    def assign(self, lead_ids=None):
+        return self.apply(self.plan(lead_ids))
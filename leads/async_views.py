@@ -0,0 +1,132 @@
+import asyncio
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+from .conditional import ConditionalGetMixin
+from .counters import category_counts
+from .pagination import KeysetPaginator
+from .views import AutocompleteView, CategoryListView, LeadDetailView, LeadListView
+
+
+#async variants of the read heavy pages, served under /leads/async/. Under ASGI they don't tie up a
+#worker thread while waiting on the database, and queries that don't depend on each other run at
+#the same time, each in its own thread with its own connection.
+#
+#the ORM is sync only (Django 3.1), so every query goes through run_in_thread or gather_queries.
+#the context and templates are the ones of the sync views.
+
+
+def run_query(func):
+    try:
+        return func()
+    finally:
+        #the worker threads never see request_finished, so they give back their connections here
+        #(closed, or returned to the pool with DB_POOL_MAX_SIZE) the way a request would
+        for connection in connections.all():
+            connection.close_if_unusable_or_obsolete()
+
+
+async def run_in_thread(func):
+    return await sync_to_async(run_query, thread_sensitive=False)(func)
+
+
+async def gather_queries(*funcs):
+    """Run each function in its own thread at the same time and return their results in order."""
+    return await asyncio.gather(*(run_in_thread(func) for func in funcs))
+
+
+def load_tenant(tenant):
+    #the cached properties query the first time, loading them up front keeps the concurrent queries
+    #from racing to fill them
+    tenant.organization
+    return tenant
+
+
+class AsyncViewMixin:
+    """Let a class based view have async handlers on Django 3.1.
+
+    Django 4.1 does this itself. Until then as_view() marks the view as a coroutine function so
+    the handler awaits it, and the sync mixins before it (LoginRequiredMixin) still get to run.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super(AsyncViewMixin, cls).as_view(**initkwargs)
+        view._is_coroutine = asyncio.coroutines._is_coroutine
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if (
+            isinstance(self, ConditionalGetMixin)
+            and request.method in self.conditional_methods
+            and request.user.is_authenticated
+        ):
+            #the stamp is read here, off the event loop, ConditionalGetMixin.dispatch reuses it
+            await run_in_thread(self.get_validators)
+        response = super(AsyncViewMixin, self).dispatch(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+
+class AsyncLeadListView(AsyncViewMixin, LeadListView):
+    async def get(self, request, *args, **kwargs):
+        tenant = await run_in_thread(partial(load_tenant, request.tenant))
+        queryset = self.get_queryset()
+        page_size = self.get_paginate_by(queryset)
+        #the assigned and unassigned pages don't depend on each other
+        pages = [partial(KeysetPaginator(queryset, page_size).page, self.get_cursor())]
+        if tenant.is_organizor:
+            unassigned = KeysetPaginator(self.get_unassigned_queryset(), page_size)
+            pages.append(partial(unassigned.page, self.get_cursor(self.unassigned_cursor_kwarg)))
+        page, *unassigned_page = await gather_queries(*pages)
+
+        self.object_list = page.object_list
+        context = {
+            "paginator": None,
+            "page_obj": page,
+            "is_paginated": page.has_next or not page.is_first,
+            "object_list": page.object_list,
+            self.context_object_name: page.object_list,
+            "view": self,
+        }
+        if unassigned_page:
+            context.update({
+                "unassigned_leads": unassigned_page[0].object_list,
+                "unassigned_page_obj": unassigned_page[0],
+            })
+        return self.render_to_response(context)
+
+
+class AsyncLeadDetailView(AsyncViewMixin, LeadDetailView):
+    async def get(self, request, *args, **kwargs):
+        await run_in_thread(partial(load_tenant, request.tenant))
+        #get_object raises Http404 inside the thread, it comes out of the await unchanged
+        self.object = await run_in_thread(self.get_object)
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+
+class AsyncCategoryListView(AsyncViewMixin, CategoryListView):
+    async def get(self, request, *args, **kwargs):
+        tenant = await run_in_thread(partial(load_tenant, request.tenant))
+        #the categories and their (usually cached) lead counts are independent
+        categories, counts = await gather_queries(
+            lambda: list(self.get_queryset()),
+            partial(category_counts, tenant.organization),
+        )
+        self.add_lead_counts(categories, counts)
+        self.object_list = categories
+        return self.render_to_response({
+            "object_list": categories,
+            self.context_object_name: categories,
+            "unassigned_lead_count": counts.get(None, 0),
+            "view": self,
+        })
+
+
+class AsyncAutocompleteView(AsyncViewMixin, AutocompleteView):
+    async def get(self, request, *args, **kwargs):
+        #resolving the tenant and building or reading the prefix index all happen off the event loop
+        return await run_in_thread(partial(AutocompleteView.get, self, request, *args, **kwargs))
@@ -0,0 +1,239 @@
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+#typeahead for the agent and lead pickers. Each organization gets an in-memory prefix index,
+#sorted lists of (word, id) entries searched with bisect, one for the agents, one for all leads and
+#one per agent for their own leads, so a lookup is a binary search plus a short scan of entries it
+#can return instead of a LIKE over the leads table.
+#
+#the indexes live in the worker process. Model signals patch the index of the process that made
+#the change, and bump a version number in the shared cache so other workers rebuild theirs lazily.
+
+AGENT = "agent"
+LEAD = "lead"
+KINDS = (AGENT, LEAD)
+
+
+def words(*values):
+    return {word for value in values if value for word in value.lower().split()}
+
+
+class PrefixIndex:
+    def __init__(self):
+        #scope -> sorted [(word, id)]. A scope is a kind, and (LEAD, agent id) for the leads of an agent,
+        #so a lookup only scans entries it can return however many other leads share the prefix
+        self.entries = {}
+        #(kind, id) -> (label, words, owner agent id of a lead)
+        self.items = {}
+
+    def scopes(self, kind, agent_id):
+        if kind == LEAD and agent_id is not None:
+            return [kind, (kind, agent_id)]
+        return [kind]
+
+    def add(self, kind, pk, label, keys, agent_id=None):
+        self.remove(kind, pk)
+        keys = frozenset(keys)
+        self.items[kind, pk] = (label, keys, agent_id)
+        for scope in self.scopes(kind, agent_id):
+            entries = self.entries.setdefault(scope, [])
+            for key in keys:
+                insort(entries, (key, pk))
+
+    def load(self, items):
+        """Add many (kind, id, label, words, agent_id) items at once, one sort instead of an insort each."""
+        for kind, pk, label, keys, agent_id in items:
+            keys = frozenset(keys)
+            self.items[kind, pk] = (label, keys, agent_id)
+            for scope in self.scopes(kind, agent_id):
+                self.entries.setdefault(scope, []).extend((key, pk) for key in keys)
+        for entries in self.entries.values():
+            entries.sort()
+
+    def remove(self, kind, pk):
+        item = self.items.pop((kind, pk), None)
+        if item is None:
+            return
+        for scope in self.scopes(kind, item[2]):
+            entries = self.entries[scope]
+            for key in item[1]:
+                position = bisect_left(entries, (key, pk))
+                if position < len(entries) and entries[position] == (key, pk):
+                    del entries[position]
+            if not entries:
+                del self.entries[scope]
+
+    def search(self, query, kind, limit=10, agent_id=None):
+        """[(id, label)] of the items of kind where every query term prefixes one of their words.
+
+        Pass agent_id to only get the leads of that agent.
+        """
+        terms = query.lower().split()
+        entries = self.entries.get((kind, agent_id) if agent_id is not None else kind)
+        if not terms or not entries:
+            return []
+        #scan the entries of the longest term, it has the fewest matches, and check the others per item
+        first = max(terms, key=len)
+        others = [term for term in terms if term is not first]
+        results = []
+        seen = set()
+        position = bisect_left(entries, (first,))
+        while position < len(entries) and len(results) < limit:
+            key, pk = entries[position]
+            position += 1
+            if not key.startswith(first):
+                break
+            if pk in seen:
+                continue
+            seen.add(pk)
+            label, keys, _ = self.items[kind, pk]
+            if all(any(key.startswith(term) for key in keys) for term in others):
+                results.append((pk, label))
+        return results
+
+    def __len__(self):
+        return len(self.items)
+
+
+def agent_label(first_name, last_name, email, username):
+    name = f"{first_name} {last_name}".strip()
+    return f"{name} <{email}>" if name and email else name or email or username
+
+
+def agent_item(pk, first_name, last_name, email, username):
+    label = agent_label(first_name, last_name, email, username)
+    return AGENT, pk, label, words(first_name, last_name, email, username), None
+
+
+def lead_item(pk, first_name, last_name, agent_id):
+    return LEAD, pk, f"{first_name} {last_name}", words(first_name, last_name), agent_id
+
+
+def add_agent(index, *row):
+    index.add(*agent_item(*row))
+
+
+def add_lead(index, *row):
+    index.add(*lead_item(*row))
+
+
+def build_index(organization_id):
+    from .models import Agent, Lead
+
+    agents = Agent.objects.filter(organization_id=organization_id).values_list(
+        "id", "user__first_name", "user__last_name", "user__email", "user__username"
+    )
+    leads = Lead.objects.filter(organization_id=organization_id).values_list(
+        "id", "first_name", "last_name", "agent_id"
+    )
+    index = PrefixIndex()
+    index.load([agent_item(*row) for row in agents] + [lead_item(*row) for row in leads.iterator()])
+    return index
+
+
+def version_cache_key(organization_id):
+    return f"leads:autocomplete-version:{organization_id}"
+
+
+class IndexCache:
+    """The prefix indexes of the most recently used organizations, least recently used evicted first."""
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.indexes = OrderedDict()
+        self.lock = threading.RLock()
+
+    def get_max_size(self):
+        return self.max_size or settings.AUTOCOMPLETE_MAX_ORGANIZATIONS
+
+    def get(self, organization_id):
+        version = cache.get(version_cache_key(organization_id), 0)
+        with self.lock:
+            cached = self.indexes.get(organization_id)
+            if cached is not None and cached[0] == version:
+                self.indexes.move_to_end(organization_id)
+                return cached[1]
+        #built outside the lock, a slow build for one organization shouldn't block the others
+        index = build_index(organization_id)
+        with self.lock:
+            self.indexes[organization_id] = (version, index)
+            self.indexes.move_to_end(organization_id)
+            while len(self.indexes) > self.get_max_size():
+                self.indexes.popitem(last=False)
+        return index
+
+    def bump_version(self, organization_id):
+        key = version_cache_key(organization_id)
+        cache.add(key, 0, None)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            #evicted between add and incr
+            cache.set(key, 1, None)
+            return 1
+
+    def update(self, organization_id, change):
+        """Apply change(index) to the local index, if this process has one, and tell the others to rebuild."""
+        version = self.bump_version(organization_id)
+        with self.lock:
+            cached = self.indexes.get(organization_id)
+            if cached is None:
+                return
+            if cached[0] == version - 1:
+                change(cached[1])
+                self.indexes[organization_id] = (version, cached[1])
+            else:
+                #another process changed it too, patching ours would skip their change
+                del self.indexes[organization_id]
+
+    def invalidate(self, *organization_ids):
+        for organization_id in organization_ids:
+            self.bump_version(organization_id)
+            with self.lock:
+                self.indexes.pop(organization_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.indexes.clear()
+
+
+indexes = IndexCache()
+
+
+def autocomplete(organization_id, query, kind, limit=10, agent_id=None):
+    return indexes.get(organization_id).search(query, kind, limit=limit, agent_id=agent_id)
+
+
+#the index is only touched once the transaction commits, a rolled back lead never shows up
+
+def lead_saved(lead):
+    pk, first_name, last_name, agent_id = lead.pk, lead.first_name, lead.last_name, lead.agent_id
+    transaction.on_commit(lambda: indexes.update(
+        lead.organization_id, lambda index: add_lead(index, pk, first_name, last_name, agent_id)
+    ))
+
+
+def lead_deleted(lead):
+    pk = lead.pk
+    transaction.on_commit(lambda: indexes.update(lead.organization_id, lambda index: index.remove(LEAD, pk)))
+
+
+def agent_saved(agent, user):
+    row = (agent.pk, user.first_name, user.last_name, user.email, user.username)
+    transaction.on_commit(lambda: indexes.update(agent.organization_id, lambda index: add_agent(index, *row)))
+
+
+def agent_deleted(agent):
+    pk = agent.pk
+    transaction.on_commit(lambda: indexes.update(agent.organization_id, lambda index: index.remove(AGENT, pk)))
+
+
+def invalidate_autocomplete(*organization_ids):
+    """For bulk writes that send no signals, the indexes are rebuilt on their next use."""
+    transaction.on_commit(lambda: indexes.invalidate(*organization_ids))
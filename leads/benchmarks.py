@@ -0,0 +1,199 @@
+import math
+import platform
+import statistics
+import time
+from contextlib import nullcontext
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.shortcuts import reverse
+from django.test import Client
+from django.template.loader import get_template
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .cards import render_cards
+from .models import Agent, Lead, UserProfile
+
+
+def percentile(values, percent):
+    """Nearest rank percentile of an unsorted list."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(timings, query_counts, status_codes):
+    milliseconds = [timing * 1000 for timing in timings]
+    summary = {
+        "requests": len(milliseconds),
+        "mean_ms": round(statistics.mean(milliseconds), 3),
+        "p50_ms": round(percentile(milliseconds, 50), 3),
+        "p90_ms": round(percentile(milliseconds, 90), 3),
+        "p95_ms": round(percentile(milliseconds, 95), 3),
+        "p99_ms": round(percentile(milliseconds, 99), 3),
+        "max_ms": round(max(milliseconds), 3),
+        "status_codes": sorted(set(status_codes)),
+    }
+    #load tests over HTTP can't see the queries
+    if query_counts:
+        #the query count should be the same on every request, max shows it if it isn't
+        summary["queries"] = max(query_counts)
+    return summary
+
+
+class Scenario:
+    def __init__(self, name, user, url, method="get", data=None, writes=False):
+        self.name = name
+        self.user = user
+        self.url = url
+        self.method = method
+        self.data = data
+        #requests that change data are rolled back so every iteration sees the same data set
+        self.writes = writes
+
+
+class ViewBenchmark:
+    """Drive the lead, category and agent views through the test client and time them.
+
+    Runs against whatever is in the database, normally the data set made by
+    `manage.py generate_leads`. Pass organization to pick a tenant, by default the
+    organization with the most leads is used.
+    """
+
+    def __init__(self, organization=None, iterations=50, warmup=5):
+        self.organization = organization or self.biggest_organization()
+        self.iterations = iterations
+        self.warmup = warmup
+
+    def biggest_organization(self):
+        return (
+            UserProfile.objects.filter(user__is_organizor=True)
+            .annotate(lead_count=Count("lead"))
+            .order_by("-lead_count")
+            .select_related("user")
+            .first()
+        )
+
+    def scenarios(self):
+        organizor = self.organization.user
+        leads = Lead.objects.filter(organization=self.organization)
+        agent = Agent.objects.filter(organization=self.organization).select_related("user").first()
+        lead = leads.filter(agent=agent).first() if agent else leads.first()
+        unassigned = leads.filter(agent__isnull=True).first()
+
+        scenarios = [
+            Scenario("lead_list", organizor, reverse("leads:lead-list")),
+            Scenario("category_list", organizor, reverse("leads:category-list")),
+            Scenario("agent_list", organizor, reverse("agents:agent-list")),
+            Scenario("lead_create", organizor, reverse("leads:lead-create"), method="post", writes=True, data={
+                "first_name": "Bench", "last_name": "Mark", "age": 30, "description": "benchmark",
+                "phone_number": "5550000000", "email": "bench@example.com",
+            }),
+        ]
+        if lead:
+            scenarios.append(Scenario("lead_detail", organizor, reverse("leads:lead-detail", kwargs={"pk": lead.pk})))
+        if agent:
+            scenarios.append(Scenario("agent_lead_list", agent.user, reverse("leads:lead-list")))
+            if unassigned:
+                scenarios.append(Scenario(
+                    "assign_agent", organizor, reverse("leads:assign-agent", kwargs={"pk": unassigned.pk}),
+                    method="post", writes=True, data={"agent": agent.pk},
+                ))
+        return scenarios
+
+    def request(self, client, scenario):
+        return getattr(client, scenario.method)(scenario.url, scenario.data)
+
+    def run_scenario(self, scenario):
+        client = Client()
+        client.force_login(scenario.user)
+        timings, query_counts, status_codes = [], [], []
+        for iteration in range(self.warmup + self.iterations):
+            with transaction.atomic() if scenario.writes else nullcontext():
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = self.request(client, scenario)
+                    elapsed = time.perf_counter() - start
+                if scenario.writes:
+                    transaction.set_rollback(True)
+            if iteration < self.warmup:
+                continue
+            timings.append(elapsed)
+            query_counts.append(len(queries.captured_queries))
+            status_codes.append(response.status_code)
+        return summarize(timings, query_counts, status_codes)
+
+    def run(self):
+        return {
+            "meta": {
+                "created": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "organization": self.organization.user.username,
+                "leads": Lead.objects.filter(organization=self.organization).count(),
+                "iterations": self.iterations,
+            },
+            "views": {scenario.name: self.run_scenario(scenario) for scenario in self.scenarios()},
+        }
+
+
+class CardBenchmark:
+    """Time rendering n lead cards without the fragment cache, into an empty cache and from a full one.
+
+    The leads are built in memory, nothing touches the database, so the numbers are the cost of the
+    templates and the cache alone. Each run gets its own local memory cache big enough to hold every
+    card, the default cache keeps only 300 entries.
+    """
+
+    template_name = "leads/lead_card.html"
+
+    def __init__(self, sizes=(1000, 10000, 100000), iterations=3):
+        self.sizes = sizes
+        self.iterations = iterations
+
+    def leads(self, count):
+        now = timezone.now()
+        return [
+            Lead(pk=pk, first_name=f"First{pk}", last_name=f"Last{pk}", age=30, updated_at=now)
+            for pk in range(1, count + 1)
+        ]
+
+    def uncached(self, leads):
+        template = get_template(self.template_name)
+        return "".join(template.render({"lead": lead}) for lead in leads)
+
+    def time(self, render):
+        start = time.perf_counter()
+        render()
+        return time.perf_counter() - start
+
+    def run_size(self, count):
+        leads = self.leads(count)
+        timings = {"uncached": [], "cold": [], "warm": []}
+        for _ in range(self.iterations):
+            cache = LocMemCache("cards-benchmark", {"OPTIONS": {"MAX_ENTRIES": count * 2}})
+            #local memory caches of the same name share their storage
+            cache.clear()
+            timings["uncached"].append(self.time(lambda: self.uncached(leads)))
+            timings["cold"].append(self.time(lambda: render_cards(leads, self.template_name, "lead", cache)))
+            timings["warm"].append(self.time(lambda: render_cards(leads, self.template_name, "lead", cache)))
+        #the best run, the others only add noise from the rest of the machine
+        return {
+            name: {
+                "total_ms": round(min(values) * 1000, 3),
+                "per_card_us": round(min(values) * 1e6 / count, 3),
+            }
+            for name, values in timings.items()
+        }
+
+    def run(self):
+        return {
+            "meta": {
+                "created": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "iterations": self.iterations,
+            },
+            "cards": {str(count): self.run_size(count) for count in self.sizes},
+        }
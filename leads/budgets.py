@@ -0,0 +1,146 @@
+import logging
+import sys
+import traceback
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+
+from . import profiling
+from .profiling import RequestProfile, milliseconds
+
+
+#query budgets. A view class declares the most queries (query_budget) and the most SQL time in
+#milliseconds (sql_time_budget) one GET or HEAD request to it may take, what a write costs depends on
+#what was sent. No SELECT of the same shape may run more than QUERY_BUDGET_MAX_REPEATS times in any
+#request, which is what an N+1 looks like. Writes are left out of that, bulk_create repeats its
+#INSERT once per batch.
+#
+#with QUERY_BUDGETS_ENABLED QueryBudgetMiddleware checks every request against the budgets of its
+#view and logs what went over on the leads.budgets logger, with the stack of the repeated queries
+#pointing at the template line or the view code that ran them. With QUERY_BUDGETS_STRICT it raises
+#QueryBudgetExceeded instead, QueryBudgetTestRunner turns that on so tests fail on it. The runner
+#leaves sql_time_budget out (QUERY_BUDGETS_CHECK_TIME), a loaded CI machine is slow on any view.
+
+logger = logging.getLogger(__name__)
+
+#how many stacks are kept per repeated query shape, they are nearly always the same line
+TRACES_PER_QUERY = 2
+#query_budget and sql_time_budget are for reads
+BUDGETED_METHODS = ("GET", "HEAD")
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran more queries, more SQL time or more repeated queries than its view allows."""
+
+
+def template_location():
+    """"template name:line" of the innermost template node being rendered, None outside rendering."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_name == "render_annotated":
+            node = frame.f_locals.get("self")
+            if isinstance(node, Node) and node.token is not None:
+                #the name it was loaded by, templates from strings only have "<unknown source>"
+                name = node.origin.template_name or node.origin.name
+                return f"{name}:{node.token.lineno}"
+        frame = frame.f_back
+    return None
+
+
+def project_stack():
+    """The frames of our own code on the current stack, outermost first."""
+    base_dir = str(settings.BASE_DIR)
+    #the middleware and the query wrappers are on every stack
+    skipped = {__file__, profiling.__file__, str(settings.BASE_DIR / "manage.py")}
+    return [
+        f"{frame.filename}:{frame.lineno} in {frame.name}"
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(base_dir)
+        and "site-packages" not in frame.filename
+        and frame.filename not in skipped
+    ]
+
+
+def is_read(sql):
+    return sql.lstrip().upper().startswith("SELECT")
+
+
+class BudgetProfile(RequestProfile):
+    """A RequestProfile that also remembers where the repeats of each query shape ran from."""
+
+    def __init__(self):
+        super(BudgetProfile, self).__init__()
+        #fingerprint -> [(template location, stack)]
+        self.traces = {}
+
+    def query_finished(self, shape):
+        super(BudgetProfile, self).query_finished(shape)
+        if self.queries[shape] > 1 and is_read(shape):
+            traces = self.traces.setdefault(shape, [])
+            if len(traces) < TRACES_PER_QUERY:
+                traces.append((template_location(), project_stack()))
+
+    def problems(self, view_class, method="GET"):
+        """What the request went over in the budgets of view_class, an empty list when nothing."""
+        problems = []
+        if method in BUDGETED_METHODS:
+            query_budget = getattr(view_class, "query_budget", None)
+            if query_budget is not None and self.query_count > query_budget:
+                problems.append(f"{self.query_count} queries, the budget is {query_budget}")
+            sql_time_budget = getattr(view_class, "sql_time_budget", None) if settings.QUERY_BUDGETS_CHECK_TIME else None
+            if sql_time_budget is not None and milliseconds(self.sql_time) > sql_time_budget:
+                problems.append(f"{milliseconds(self.sql_time)} ms of SQL, the budget is {sql_time_budget} ms")
+        #None switches the check off, for views that read in batches on purpose
+        max_repeats = getattr(view_class, "query_max_repeats", settings.QUERY_BUDGET_MAX_REPEATS)
+        for shape, count in self.queries.most_common():
+            if max_repeats is None or count <= max_repeats:
+                break
+            if is_read(shape):
+                problems.append(self.describe_repeats(shape, count, max_repeats))
+        return problems
+
+    def describe_repeats(self, shape, count, max_repeats):
+        lines = [f"the same query ran {count} times, at most {max_repeats} allowed (N+1?): {shape}"]
+        for location, stack in self.traces.get(shape, []):
+            lines.append(f"  from template {location}" if location else "  outside a template")
+            lines.extend(f"    {frame}" for frame in stack)
+        return "\n".join(lines)
+
+
+class QueryBudgetMiddleware:
+    """Check each request against the budgets of its view class, see the top of this module.
+
+    Views without budgets are still checked for repeated queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGETS_ENABLED:
+            return self.get_response(request)
+
+        profile = BudgetProfile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        profile.finish()
+
+        view_class = getattr(request, "budget_view_class", None)
+        if view_class is None:
+            return response
+        problems = profile.problems(view_class, request.method)
+        if problems:
+            message = f"{view_class.__name__} ({request.method} {request.get_full_path()}) went over its query budget:\n"
+            message += "\n".join(problems)
+            if settings.QUERY_BUDGETS_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        #class based views only, as_view() leaves the class on the function
+        request.budget_view_class = getattr(view_func, "view_class", None)
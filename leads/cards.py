@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+
+#fragment cache for the lead and agent cards of the list pages. A card's cache key holds the row's
+#updated_at, so a saved row simply misses and is rendered again, nothing has to be deleted. Writes
+#that bypass save() (queryset.update(), SET_NULL on delete) set updated_at themselves.
+#
+#all the cards of a page are fetched with one get_many and the misses stored with one set_many,
+#a page of 25 cards costs two cache round trips however many are cached.
+
+
+def card_cache_key(template_name, obj):
+    return f"leads:card:{template_name}:{obj.pk}:{obj.updated_at.timestamp()}"
+
+
+def render_cards(objects, template_name, context_name, cache=None):
+    """The concatenated cards of objects, each rendered with template_name as {context_name: obj}."""
+    cache = cache or default_cache
+    objects = list(objects)
+    keys = [card_cache_key(template_name, obj) for obj in objects]
+    cached = cache.get_many(keys)
+    template = None
+    missing = {}
+    cards = []
+    for key, obj in zip(keys, objects):
+        card = cached.get(key)
+        if card is None:
+            #loaded on the first miss only, a fully cached page doesn't touch the template
+            template = template or get_template(template_name)
+            card = missing[key] = template.render({context_name: obj})
+        cards.append(card)
+    if missing:
+        cache.set_many(missing, settings.CARD_CACHE_TIMEOUT)
+    return mark_safe("".join(cards))
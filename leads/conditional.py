@@ -0,0 +1,104 @@
+import asyncio
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+#conditional GET for the pages agents poll. Each organization has a change stamp,
+#UserProfile.changed_at, moved forward once a write to one of its leads, agents or categories
+#commits, and single leads and agents have their updated_at. A view answers GET and HEAD with
+#304 Not Modified while the stamp its page depends on is the one the client's copy was sent with.
+#
+#the organization stamp is read with the tenant, which the view looks up anyway, so a 304 of a
+#list page costs no query beyond that, and one of a detail page a single primary key lookup.
+#
+#the stamp is moved after the commit: a request in between sends the new rows with the old stamp,
+#which is only ever one extra full response once the stamp catches up, never a stale 304.
+
+
+def touch_organizations(*organization_ids):
+    """Move the change stamp of organizations forward once the current transaction commits."""
+    from .models import UserProfile
+
+    organization_ids = set(organization_ids)
+    transaction.on_commit(
+        lambda: UserProfile.objects.filter(pk__in=organization_ids).update(changed_at=timezone.now())
+    )
+
+
+def make_etag(request, stamp, *extra):
+    #the same url shows each user their own page, so the user is part of the tag, and the pages'
+    #forms carry the csrf token, which logging in again replaces, so a digest of that is too
+    csrf_digest = salted_hmac("leads.conditional.make_etag", request.META.get("CSRF_COOKIE", "")).hexdigest()[:12]
+    parts = [str(request.user.pk), csrf_digest, f"{int(stamp.timestamp() * 1000000):x}"]
+    parts.extend(str(part) for part in extra)
+    return quote_etag("-".join(parts))
+
+
+class ConditionalGetMixin:
+    """Answer GET and HEAD with 304 Not Modified until what the page shows changes.
+
+    get_change_stamp() returns when that last happened, by default the organization stamp, or
+    None to always send the page (e.g. the object doesn't exist and the view will 404). Goes
+    after the login mixins so the stamp is only read for users allowed to see the page.
+    """
+
+    conditional_methods = ("GET", "HEAD")
+
+    def get_change_stamp(self):
+        return self.request.tenant.organization.changed_at
+
+    def get_etag(self, stamp):
+        return make_etag(self.request, stamp)
+
+    def get_last_modified(self, stamp):
+        return stamp
+
+    def get_validators(self):
+        """(etag, last_modified) of the page, None for both without a stamp. The stamp is looked up once per request."""
+        if not hasattr(self, "_change_stamp"):
+            self._change_stamp = self.get_change_stamp()
+        stamp = self._change_stamp
+        if stamp is None:
+            return None, None
+        last_modified = self.get_last_modified(stamp)
+        return (
+            self.get_etag(stamp),
+            #whole seconds like the header, clients that send If-None-Match go by the exact etag
+            int(last_modified.timestamp()) if last_modified else None,
+        )
+
+    def add_validators(self, response):
+        #made again once the page is rendered, a page that handed out a new csrf token is tagged with that one
+        if getattr(response, "is_rendered", True) is False:
+            response.add_post_render_callback(self.add_validators)
+            return response
+        etag, last_modified = self.get_validators()
+        if response.status_code != 200 or etag is None:
+            return response
+        response.setdefault("ETag", etag)
+        if last_modified is not None:
+            response.setdefault("Last-Modified", http_date(last_modified))
+        #browsers would otherwise reuse the page for a while without asking
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in self.conditional_methods:
+            return super(ConditionalGetMixin, self).dispatch(request, *args, **kwargs)
+        etag, last_modified = self.get_validators()
+        if etag is not None:
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return response
+        response = super(ConditionalGetMixin, self).dispatch(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            #the async variants, their handler hasn't run yet
+            return self.add_validators_when_done(response)
+        return self.add_validators(response)
+
+    async def add_validators_when_done(self, coroutine):
+        return self.add_validators(await coroutine)
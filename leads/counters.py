@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+
+#per organization lead counts for the category list, cached so the page costs one
+#aggregate per organization until a lead changes instead of a COUNT over the leads table on every view
+
+
+def category_counts_cache_key(organization_id):
+    return f"leads:category-counts:{organization_id}"
+
+
+def category_counts(organization):
+    """Return {category_id: lead count} for an organization, unassigned leads are under None."""
+    key = category_counts_cache_key(organization.pk)
+    counts = cache.get(key)
+    if counts is None:
+        #one GROUP BY over the organization's leads gives every category count and the unassigned count
+        counts = dict(
+            organization.lead_set.values_list("category").annotate(Count("id")).order_by()
+        )
+        cache.set(key, counts, settings.CATEGORY_COUNTS_CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate_category_counts(*organization_ids):
+    keys = [category_counts_cache_key(organization_id) for organization_id in organization_ids]
+    cache.delete_many(keys)
+    #a request that read the old counts before this transaction commits could cache them again,
+    #so drop them once more after the commit
+    transaction.on_commit(lambda: cache.delete_many(keys))
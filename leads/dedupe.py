@@ -0,0 +1,212 @@
+from collections import namedtuple
+from difflib import SequenceMatcher
+from itertools import combinations, groupby
+
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .models import Lead
+
+
+#duplicate detection without comparing every lead with every other lead. Leads are only
+#compared inside a block, a group of leads that share a blocking key:
+#
+#email   same normalized email
+#phone   same normalized phone number
+#name    same last name and first initial, catches leads whose contact details were typed differently
+#
+#the leads are read ordered by the blocking key so every block comes out of one streaming scan,
+#a 1M lead organization costs three scans plus the pairwise scoring of the (small) blocks
+
+DuplicateCandidate = namedtuple("DuplicateCandidate", ["lead_id", "duplicate_id", "score", "reasons"])
+
+BLOCKING_KEYS = ("email", "phone", "name")
+
+#how much each kind of evidence adds to a pair's score, the name is always compared.
+#with the default threshold of 0.6 a near identical name is enough on its own, a shared email or phone is not.
+#a name is only enough to report a pair though, two John Smiths are often two people: see is_mergeable()
+NAME_WEIGHT = 0.7
+EMAIL_WEIGHT = 0.2
+PHONE_WEIGHT = 0.1
+
+
+def full_name(first_name, last_name):
+    return " ".join(f"{first_name} {last_name}".lower().split())
+
+
+def name_similarity(a, b):
+    """0..1 fuzzy similarity of two names, word order doesn't matter so "Smith John" matches "John Smith"."""
+    if a == b:
+        return 1.0
+    direct = SequenceMatcher(None, a, b).ratio()
+    swapped = SequenceMatcher(None, " ".join(sorted(a.split())), " ".join(sorted(b.split()))).ratio()
+    return max(direct, swapped)
+
+
+class LeadRow:
+    __slots__ = ("id", "name", "name_key", "email", "phone")
+
+    def __init__(self, id, first_name, last_name, email, phone):
+        self.id = id
+        self.name = full_name(first_name, last_name)
+        self.name_key = (last_name.lower(), first_name[:1].lower())
+        self.email = email
+        self.phone = phone
+
+
+class DuplicateFinder:
+    """Find likely duplicate leads of an organization.
+
+    Pairs scoring at least threshold are returned, best first. Blocks bigger than
+    max_block_size are skipped: a shared key that common (a team inbox, "Smith J")
+    says nothing about whether two leads are the same person, and comparing every
+    pair in it would bring back the O(n²) this is meant to avoid.
+    """
+
+    def __init__(self, organization, threshold=0.6, max_block_size=50, keys=BLOCKING_KEYS, chunk_size=5000):
+        self.organization = organization
+        self.threshold = threshold
+        self.max_block_size = max_block_size
+        self.keys = keys
+        self.chunk_size = chunk_size
+        self.skipped_blocks = 0
+
+    def rows(self, key):
+        fields = ("id", "first_name", "last_name", "email_normalized", "phone_normalized")
+        queryset = Lead.objects.filter(organization=self.organization)
+        if key == "email":
+            queryset = queryset.exclude(email_normalized="").order_by("email_normalized", "id")
+        elif key == "phone":
+            queryset = queryset.exclude(phone_normalized="").order_by("phone_normalized", "id")
+        elif key == "name":
+            queryset = queryset.order_by(Lower("last_name"), Lower("first_name"), "id")
+        else:
+            raise ValueError(f"Unknown blocking key {key!r}")
+        for row in queryset.values_list(*fields).iterator(chunk_size=self.chunk_size):
+            yield LeadRow(*row)
+
+    def block_key(self, key, row):
+        if key == "email":
+            return row.email
+        if key == "phone":
+            return row.phone
+        return row.name_key
+
+    def blocks(self, key):
+        for _, block in groupby(self.rows(key), key=lambda row: self.block_key(key, row)):
+            block = list(block)
+            if len(block) < 2:
+                continue
+            if len(block) > self.max_block_size:
+                self.skipped_blocks += 1
+                continue
+            yield block
+
+    def score(self, a, b):
+        reasons = []
+        score = NAME_WEIGHT * name_similarity(a.name, b.name)
+        if a.email and a.email == b.email:
+            score += EMAIL_WEIGHT
+            reasons.append("email")
+        if a.phone and a.phone == b.phone:
+            score += PHONE_WEIGHT
+            reasons.append("phone")
+        return round(score, 3), reasons
+
+    def find(self):
+        self.skipped_blocks = 0
+        candidates = {}
+        for key in self.keys:
+            for block in self.blocks(key):
+                for a, b in combinations(block, 2):
+                    pair = (a.id, b.id) if a.id < b.id else (b.id, a.id)
+                    #a pair sharing email and phone shows up in both blocks but only needs scoring once
+                    if pair in candidates:
+                        continue
+                    score, reasons = self.score(a, b)
+                    if score >= self.threshold:
+                        candidates[pair] = DuplicateCandidate(pair[0], pair[1], score, reasons)
+        return sorted(candidates.values(), key=lambda candidate: (-candidate.score, candidate.lead_id, candidate.duplicate_id))
+
+
+def is_mergeable(candidate):
+    """Whether a pair is safe to merge without a person looking at it, the name alone is not enough."""
+    return "email" in candidate.reasons or "phone" in candidate.reasons
+
+
+def group_duplicates(candidates):
+    """Turn candidate pairs into groups of lead ids that are all the same person, each sorted oldest first."""
+    parent = {}
+
+    def find(lead_id):
+        root = parent.setdefault(lead_id, lead_id)
+        while parent[root] != root:
+            root = parent[root]
+        while parent[lead_id] != root:
+            parent[lead_id], lead_id = root, parent[lead_id]
+        return root
+
+    for candidate in candidates:
+        a, b = find(candidate.lead_id), find(candidate.duplicate_id)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for lead_id in parent:
+        groups.setdefault(find(lead_id), []).append(lead_id)
+    return sorted(sorted(group) for group in groups.values())
+
+
+#fields merge() copies from a duplicate when the lead it's merged into has no value
+MERGE_FILL_FIELDS = ("email", "phone_number", "description", "agent_id", "category_id")
+#contact details of a duplicate that are kept in the description when they differ from the lead's
+MERGE_KEEP_FIELDS = (("email", "email_normalized"), ("phone_number", "phone_normalized"))
+
+
+def merged_contact_note(lead, duplicate):
+    """A line for lead's description with the contact details of duplicate that lead doesn't have."""
+    kept = [
+        getattr(duplicate, field)
+        for field, normalized in MERGE_KEEP_FIELDS
+        if getattr(duplicate, normalized) and getattr(duplicate, normalized) != getattr(lead, normalized)
+    ]
+    if not kept:
+        return ""
+    return f"Merged from lead {duplicate.pk}: {', '.join(kept)}"
+
+
+def merge_leads(lead, duplicates):
+    """Merge duplicates into lead and delete them.
+
+    Blank fields of lead are filled from the duplicates, an email or phone number of a
+    duplicate that differs from lead's is added to its description, and every row that
+    points at one of the duplicates is pointed at lead instead. All or nothing.
+    """
+    duplicates = [duplicate for duplicate in duplicates if duplicate.pk != lead.pk]
+    if any(duplicate.organization_id != lead.organization_id for duplicate in duplicates):
+        raise ValueError("Only leads of the same organization can be merged.")
+    duplicate_ids = [duplicate.pk for duplicate in duplicates]
+    with transaction.atomic():
+        for field in MERGE_FILL_FIELDS:
+            if getattr(lead, field):
+                continue
+            for duplicate in duplicates:
+                if getattr(duplicate, field):
+                    setattr(lead, field, getattr(duplicate, field))
+                    break
+        #after the blanks are filled, so a filled in email isn't noted again
+        lead.normalize_contact()
+        notes = [note for note in (merged_contact_note(lead, duplicate) for duplicate in duplicates) if note]
+        if notes:
+            lead.description = "\n".join([lead.description] + notes if lead.description else notes)
+        lead.save()
+        #every foreign key to Lead, so models added later are re-pointed without touching this
+        for relation in Lead._meta.related_objects:
+            if relation.many_to_many or not relation.field.concrete:
+                continue
+            relation.related_model._base_manager.filter(
+                **{f"{relation.field.name}__in": duplicate_ids}
+            ).update(**{relation.field.name: lead})
+        #deleted one by one through the collector, so the post_delete signals keep the caches right
+        Lead.objects.filter(pk__in=duplicate_ids).delete()
+    return lead
@@ -0,0 +1,230 @@
+import gzip
+import json
+import os
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+
+#append-only history of the agent and category of every lead. Saves overwrite Lead.agent and
+#Lead.category in place, the event log keeps each change as a LeadEvent row holding the old and
+#the new value, written in the transaction of the change.
+#
+#leads start without events, a lead's first agent or category is on the lead itself. Keeping the
+#old value on every event is what makes that work: the value of a field at any moment is the new
+#value of the last event before it, or the old value of the first event after it, or, with no
+#events at all, the current value. Each of those is one indexed (organization, lead, timestamp)
+#lookup, however long the log is.
+#
+#old events are moved to compressed files with the archive_lead_events command, one file per
+#month, see archive_events.
+
+AGENT = 1
+CATEGORY = 2
+FIELD_CHOICES = ((AGENT, "Agent"), (CATEGORY, "Category"))
+#LeadEvent.field and the attribute of Lead (and LeadSnapshot) it tracks
+TRACKED_FIELDS = ((AGENT, "agent_id"), (CATEGORY, "category_id"))
+
+LeadSnapshot = namedtuple("LeadSnapshot", ["agent_id", "category_id"])
+
+
+class ArchivedHistory(Exception):
+    """The part of the log a question needs was moved out to an archive file."""
+
+
+def changed_events(lead, old, new, timestamp=None):
+    """Unsaved LeadEvents for the tracked fields that differ between two LeadStates of a lead."""
+    from .models import LeadEvent
+
+    timestamp = timestamp or timezone.now()
+    return [
+        LeadEvent(
+            organization_id=lead.organization_id,
+            lead_id=lead.pk,
+            timestamp=timestamp,
+            field=field,
+            old_value=getattr(old, attname),
+            new_value=getattr(new, attname),
+        )
+        for field, attname in TRACKED_FIELDS
+        if getattr(old, attname) != getattr(new, attname)
+    ]
+
+
+def lead_saved(lead, created, update_fields=None):
+    from .models import LeadEvent
+    from .rollups import saved_state
+
+    old = getattr(lead, "_loaded_state", None)
+    if created or old is None:
+        #a new lead's values are on the lead, and a lead read with deferred fields can't tell what changed
+        return
+    events = changed_events(lead, old, saved_state(lead, update_fields))
+    if events:
+        LeadEvent.objects.bulk_create(events)
+
+
+def leads_updated(organization_id, lead_ids, field, old_value, new_value, timestamp=None):
+    """Record one change made to many leads by an UPDATE that sends no signals."""
+    from .models import LeadEvent
+
+    timestamp = timestamp or timezone.now()
+    LeadEvent.objects.bulk_create(
+        [
+            LeadEvent(
+                organization_id=organization_id,
+                lead_id=lead_id,
+                timestamp=timestamp,
+                field=field,
+                old_value=old_value,
+                new_value=new_value,
+            )
+            for lead_id in lead_ids
+        ],
+        batch_size=500,
+    )
+
+
+def leads_bulk_updated(leads, update_fields, timestamp=None):
+    """Record the agent and category changes of leads written by bulk_update, which sends no signals.
+
+    Called before the rollups move the leads' _loaded_state on to what was written.
+    """
+    from .models import LeadEvent
+    from .rollups import saved_state
+
+    timestamp = timestamp or timezone.now()
+    events = []
+    for lead in leads:
+        events.extend(changed_events(lead, lead._loaded_state, saved_state(lead, update_fields), timestamp))
+    LeadEvent.objects.bulk_create(events, batch_size=500)
+
+
+def value_cleared(instance, field, lookup):
+    """An agent or category is about to be deleted, its leads lose it with an UPDATE."""
+    from .models import Lead
+
+    lead_ids = list(Lead.objects.filter(**{lookup: instance}).values_list("pk", flat=True))
+    leads_updated(instance.organization_id, lead_ids, field, instance.pk, None)
+
+
+def check_not_archived(when):
+    from .models import LeadEventArchive
+
+    archive = LeadEventArchive.objects.filter(end__gt=when).order_by("start").first()
+    if archive is not None:
+        raise ArchivedHistory(f"The lead events from {archive.start} to {archive.end} are archived in {archive.path}")
+
+
+def state_at(lead, when):
+    """The LeadSnapshot of lead at the moment when, None if it didn't exist yet.
+
+    Raises ArchivedHistory for moments whose events were archived.
+    """
+    from .models import LeadEvent
+
+    if when < lead.date_added:
+        return None
+    check_not_archived(when)
+    events = LeadEvent.objects.filter(organization_id=lead.organization_id, lead_id=lead.pk)
+    values = {}
+    for field, attname in TRACKED_FIELDS:
+        field_events = events.filter(field=field)
+        before = field_events.filter(timestamp__lte=when).order_by("-timestamp", "-id").values_list("new_value")[:1]
+        after = field_events.filter(timestamp__gt=when).order_by("timestamp", "id").values_list("old_value")[:1]
+        if before:
+            values[attname] = before[0][0]
+        elif after:
+            values[attname] = after[0][0]
+        else:
+            values[attname] = getattr(lead, attname)
+    return LeadSnapshot(**values)
+
+
+def category_periods(lead, until=None):
+    """[(category_id, start, end)] of the categories a lead went through, for time in stage figures.
+
+    The last period ends at until, now by default.
+    """
+    from .models import LeadEvent
+
+    until = until or timezone.now()
+    check_not_archived(lead.date_added)
+    changes = list(
+        LeadEvent.objects.filter(organization_id=lead.organization_id, lead_id=lead.pk, field=CATEGORY)
+        .order_by("timestamp", "id")
+        .values_list("timestamp", "old_value", "new_value")
+    )
+    periods = []
+    start, category_id = lead.date_added, changes[0][1] if changes else lead.category_id
+    for timestamp, _, new_value in changes:
+        periods.append((category_id, start, timestamp))
+        start, category_id = timestamp, new_value
+    periods.append((category_id, start, until))
+    return periods
+
+
+def archive_path(directory, start, end):
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    return os.path.join(directory, f"lead-events-{start:%Y%m%d%H%M}-{end:%Y%m%d%H%M}.jsonl.gz")
+
+
+def archive_range(start, end, directory, chunk_size=5000):
+    """Write the events of [start, end) to a gzipped JSON lines file, then delete them from the table."""
+    from .models import LeadEvent, LeadEventArchive
+
+    events = LeadEvent.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    path = archive_path(directory, start, end)
+    count = 0
+    last_id = 0
+    rows = events.order_by("timestamp", "id").values_list(
+        "id", "organization_id", "lead_id", "timestamp", "field", "old_value", "new_value"
+    )
+    with gzip.open(path, "wt", encoding="utf-8") as archive_file:
+        for pk, organization_id, lead_id, timestamp, field, old_value, new_value in rows.iterator(chunk_size=chunk_size):
+            archive_file.write(json.dumps({
+                "id": pk,
+                "organization_id": organization_id,
+                "lead_id": lead_id,
+                "timestamp": timestamp.isoformat(),
+                "field": field,
+                "old_value": old_value,
+                "new_value": new_value,
+            }) + "\n")
+            count += 1
+            last_id = max(last_id, pk)
+    with transaction.atomic():
+        archive = LeadEventArchive.objects.create(start=start, end=end, path=path, events=count)
+        #only what made it into the file, a row written since then with an old timestamp stays
+        events.filter(pk__lte=last_id).delete()
+    return archive
+
+
+def archive_events(before, directory, chunk_size=5000):
+    """Move the events older than before out to one file per calendar month (or part of one) in directory.
+
+    Returns the LeadEventArchive of every file written. After this state_at() answers for moments
+    from before on, older ones raise ArchivedHistory.
+    """
+    from .models import LeadEvent, LeadEventArchive
+    from .rollups import day_start
+
+    first = LeadEvent.objects.order_by("timestamp").values_list("timestamp", flat=True).first()
+    if first is None or first >= before:
+        return []
+    archived_until = LeadEventArchive.objects.order_by("-end").values_list("end", flat=True).first()
+    os.makedirs(directory, exist_ok=True)
+    archives = []
+    start = first
+    while start < before:
+        month = timezone.localdate(start).replace(day=1)
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        start = max(day_start(month), archived_until or start)
+        end = min(day_start(next_month), before)
+        if start < end:
+            archives.append(archive_range(start, end, directory, chunk_size))
+        #months already archived are skipped, an event backdated into one of them stays in the table
+        start = end
+    return archives
@@ -0,0 +1,60 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+EXPORT_FIELDS = (
+    "id",
+    "first_name",
+    "last_name",
+    "age",
+    "email",
+    "phone_number",
+    "description",
+    "date_added",
+    "agent",
+    "category",
+)
+
+
+class Echo:
+    """A file-like object that hands back what is written to it instead of keeping it,
+    so csv.writer can be used to format rows for a StreamingHttpResponse."""
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, chunk_size=None):
+    #iterator() streams the rows from the database in chunks instead of caching the whole queryset
+    queryset = queryset.select_related("agent__user", "category").order_by("id")
+    for lead in queryset.iterator(chunk_size=chunk_size or settings.LEADS_EXPORT_CHUNK_SIZE):
+        yield (
+            lead.id,
+            lead.first_name,
+            lead.last_name,
+            lead.age,
+            lead.email,
+            lead.phone_number,
+            lead.description,
+            lead.date_added,
+            lead.agent.user.email if lead.agent else "",
+            lead.category.name if lead.category else "",
+        )
+
+
+def stream_csv(queryset, chunk_size=None):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in export_rows(queryset, chunk_size):
+        yield writer.writerow(row)
+
+
+def stream_json(queryset, chunk_size=None):
+    yield "["
+    separator = ""
+    for row in export_rows(queryset, chunk_size):
+        yield separator + json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder)
+        separator = ","
+    yield "]"
@@ -1,13 +1,47 @@
 from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm, UsernameField
-from .models import Lead, Agent
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from django.utils.http import urlencode
+from .models import Lead, Agent, Category
+from .assignment import STRATEGY_CHOICES
+from .autocomplete import AGENT
 
 #specifying our own user model instead of default one from django
 User = get_user_model()
 
 
 
+class AutocompleteSelect(forms.Widget):
+    """A text box that suggests choices from the autocomplete endpoint as you type.
+
+    Unlike a <select> it doesn't render every choice, only the selected one is looked up.
+    """
+    template_name = "leads/widgets/autocomplete.html"
+
+    def __init__(self, kind, attrs=None):
+        self.kind = kind
+        super(AutocompleteSelect, self).__init__(attrs)
+
+    def label_for(self, value):
+        #ModelChoiceField hands its ModelChoiceIterator to the widget as choices
+        choices = getattr(self, "choices", None)
+        if not value or choices is None:
+            return ""
+        try:
+            instance = choices.queryset.filter(pk=value).first()
+        except (ValueError, ValidationError):
+            return ""
+        return choices.field.label_from_instance(instance) if instance else ""
+
+    def get_context(self, name, value, attrs):
+        context = super(AutocompleteSelect, self).get_context(name, value, attrs)
+        context["widget"]["label"] = self.label_for(value)
+        context["widget"]["url"] = reverse("leads:autocomplete") + "?" + urlencode({"type": self.kind})
+        return context
+
+
 class LeadModelForm(forms.ModelForm):
     class Meta:
         model = Lead
@@ -20,6 +54,34 @@ class LeadModelForm(forms.ModelForm):
             'phone_number',
             'email',
         )
+        widgets = {
+            'agent': AutocompleteSelect(AGENT),
+        }
+
+    def __init__(self, *args, **kwargs):
+        request = kwargs.pop("request", None)
+        super(LeadModelForm, self).__init__(*args, **kwargs)
+        #only the agents of the organization can be picked
+        if request is not None and "agent" in self.fields:
+            self.fields["agent"].queryset = Agent.objects.for_tenant(request.tenant).select_related("user")
+
+
+#validates a single row of a csv import with the LeadModelForm rules,
+#agent and category are resolved by the importer so the form doesn't query them per row
+class LeadImportRowForm(LeadModelForm):
+    class Meta(LeadModelForm.Meta):
+        fields = (
+            'first_name',
+            'last_name',
+            'age',
+            'description',
+            'phone_number',
+            'email',
+        )
+
+
+class LeadImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header row: first_name, last_name, age, description, phone_number, email, agent, category")
 
 
 #inheriting from django forms module with forms.Form
@@ -37,15 +99,49 @@ class CustomUserCreationForm(UserCreationForm):
 
 
 class AssignAgentForm(forms.Form):
-    agent = forms.ModelChoiceField(queryset=Agent.objects.none())
+    agent = forms.ModelChoiceField(queryset=Agent.objects.none(), widget=AutocompleteSelect(AGENT))
 
     def __init__(self, *args, **kwargs):
         request = kwargs.pop("request")
-        agents = Agent.objects.filter(organization=request.user.userprofile)
+        agents = Agent.objects.for_tenant(request.tenant).select_related("user")
         super(AssignAgentForm, self).__init__(*args, **kwargs)
         self.fields["agent"].queryset = agents
 
 
+class CategoryModelForm(forms.ModelForm):
+    class Meta:
+        model = Category
+        fields = (
+            'name',
+        )
+
+
+class LeadIdsField(forms.Field):
+    #the ids come from the checkboxes in the unassigned leads block, there can be too many leads for a <select>
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            return [int(lead_id) for lead_id in value]
+        except (TypeError, ValueError):
+            raise ValidationError("Select valid leads.")
+
+
+class BulkAssignAgentForm(forms.Form):
+    strategy = forms.ChoiceField(choices=STRATEGY_CHOICES)
+    leads = LeadIdsField(required=False)
+    #has to be asked for, an empty selection is an error rather than every lead
+    all_unassigned = forms.BooleanField(required=False, label="Assign every unassigned lead")
+
+    def clean(self):
+        cleaned_data = super(BulkAssignAgentForm, self).clean()
+        if not cleaned_data.get("leads") and not cleaned_data.get("all_unassigned") and "leads" not in self.errors:
+            raise ValidationError("Select the leads to assign, or choose to assign every unassigned lead.")
+        return cleaned_data
+
+
 class LeadCategoryUpdateForm(forms.ModelForm):
     class Meta:
         model = Lead
@@ -0,0 +1,141 @@
+import csv
+
+from django.conf import settings
+from django.db import transaction
+
+from .forms import LeadImportRowForm
+from .mail import queue_mail
+from .models import Agent, Category, Lead
+
+
+#what reading an upload can raise besides the rows themselves: a file that isn't UTF-8 or that the
+#csv module can't parse. The import views report these on the form
+CSV_READ_ERRORS = (UnicodeDecodeError, csv.Error)
+
+
+def csv_read_error(error):
+    """The form error for one of CSV_READ_ERRORS."""
+    if isinstance(error, UnicodeDecodeError):
+        return 'The file isn\'t UTF-8 encoded, save it as "CSV UTF-8" and upload it again.'
+    return f"The file isn't a valid CSV file: {error}."
+
+
+class ImportResult:
+    #keeping every error of a 200k row file in memory would defeat streaming the file,
+    #so only the first few are kept for the report and the rest are only counted
+    max_reported_errors = 1000
+
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line_number, messages):
+        self.error_count += 1
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append((line_number, messages))
+
+
+class LeadCSVImporter:
+    """Stream leads out of a CSV file into an organization.
+
+    Each row is validated with the same rules as LeadModelForm, the agent and category
+    columns are resolved by name against a lookup cache that is filled once per import,
+    and valid rows are written with bulk_create, one transaction per batch. Rows that
+    fail validation are reported in the ImportResult and skipped.
+
+    Expected columns: first_name, last_name, age, description, phone_number, email and
+    optionally agent (email or username) and category (name).
+    """
+
+    def __init__(self, organization, batch_size=None, notify=True):
+        self.organization = organization
+        self.batch_size = batch_size or settings.LEADS_IMPORT_BATCH_SIZE
+        self.notify = notify
+        #the result so far, batches are committed as they are written so a file that
+        #can't be read to the end has still imported the leads before that point
+        self.result = None
+        self._agents = None
+        self._categories = None
+
+    def run(self, lines):
+        result = self.result = ImportResult()
+        batch = []
+        #line 1 is the header
+        for line_number, row in enumerate(csv.DictReader(lines), start=2):
+            lead, errors = self.build_lead(row)
+            if errors:
+                result.add_error(line_number, errors)
+                continue
+            batch.append(lead)
+            if len(batch) >= self.batch_size:
+                result.created += self.write_batch(batch)
+                batch = []
+        if batch:
+            result.created += self.write_batch(batch)
+        if self.notify:
+            self.send_summary(result)
+        return result
+
+    def build_lead(self, row):
+        form = LeadImportRowForm(data=row)
+        errors = [] if form.is_valid() else [
+            f"{field}: {message}" for field, messages in form.errors.items() for message in messages
+        ]
+        agent = self.lookup(self.agents, row.get("agent"), "agent", errors)
+        category = self.lookup(self.categories, row.get("category"), "category", errors)
+        if errors:
+            return None, errors
+        lead = form.save(commit=False)
+        lead.organization = self.organization
+        lead.agent = agent
+        lead.category = category
+        return lead, []
+
+    def lookup(self, cache, value, field, errors):
+        value = (value or "").strip()
+        if not value:
+            return None
+        found = cache.get(value.lower())
+        if found is None:
+            errors.append(f"{field}: {value} does not exist in this organization")
+        return found
+
+    @property
+    def agents(self):
+        #one query for the whole import, agents can be referred to by email or username
+        if self._agents is None:
+            self._agents = {}
+            for agent in Agent.objects.filter(organization=self.organization).select_related("user"):
+                if agent.user.email:
+                    self._agents[agent.user.email.lower()] = agent
+                self._agents[agent.user.username.lower()] = agent
+        return self._agents
+
+    @property
+    def categories(self):
+        if self._categories is None:
+            self._categories = {
+                category.name.lower(): category
+                for category in Category.objects.filter(organization=self.organization)
+            }
+        return self._categories
+
+    def write_batch(self, batch):
+        with transaction.atomic():
+            Lead.objects.bulk_create(batch, batch_size=self.batch_size)
+        return len(batch)
+
+    def send_summary(self, result):
+        email = self.organization.user.email
+        if not email:
+            return
+        queue_mail(
+            subject="Your lead import has finished",
+            message=(
+                f"{result.created} leads were imported and {result.error_count} rows were skipped. "
+                "Go to the site to see the new leads."
+            ),
+            from_email="test@test.com",
+            recipient_list=[email]
+        )
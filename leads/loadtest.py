@@ -0,0 +1,134 @@
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.test import Client
+
+from .benchmarks import summarize
+
+
+#the test client used by ViewBenchmark skips what happens between requests, including Django closing
+#or reusing database connections. These load tests go through a real server over HTTP instead.
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class WorkerPoolWSGIServer(WSGIServer):
+    """A WSGI server with a fixed number of worker threads, like gunicorn's gthread workers.
+
+    Threads that live across requests are what lets persistent connections be reused,
+    a thread per request server would open a new connection every time regardless.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, app, threads=8):
+        super(WorkerPoolWSGIServer, self).__init__(address, QuietHandler)
+        self.set_app(app)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super(WorkerPoolWSGIServer, self).server_close()
+        self.executor.shutdown(wait=True)
+
+
+class running_server:
+    """with running_server(app) as base_url: serve app on a free local port in a background thread."""
+
+    def __init__(self, app, threads=8):
+        self.server = WorkerPoolWSGIServer(("127.0.0.1", 0), app, threads=threads)
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class running_asgi_server:
+    """with running_asgi_server(app) as base_url: serve an ASGI app with uvicorn in a background thread.
+
+    uvicorn is only needed for this, pip install uvicorn.
+    """
+
+    def __init__(self, app):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=free_port(), log_level="warning", lifespan="off"))
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("uvicorn didn't start")
+            time.sleep(0.01)
+        return f"http://{self.server.config.host}:{self.server.config.port}"
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def session_cookie(user):
+    """A Cookie header logging the user in, made without going through the login view."""
+    client = Client()
+    client.force_login(user)
+    return f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+
+def load_test(base_url, paths, requests=1000, concurrency=16, cookie=None, warmup=20):
+    """GET the paths round robin from concurrency client threads and summarize the latencies."""
+    headers = {"Cookie": cookie} if cookie else {}
+
+    def fetch(path):
+        request = urllib.request.Request(base_url + path, headers=headers)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            status = error.code
+        return time.perf_counter() - start, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        list(clients.map(fetch, [path for path, _ in zip(cycle(paths), range(warmup))]))
+        start = time.perf_counter()
+        results = list(clients.map(fetch, [path for path, _ in zip(cycle(paths), range(requests))]))
+        elapsed = time.perf_counter() - start
+
+    summary = summarize([timing for timing, _ in results], None, [status for _, status in results])
+    summary["requests_per_second"] = round(requests / elapsed, 1)
+    return summary
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import QueuedEmail
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """Same arguments as django.core.mail.send_mail, but the email is stored and sent later by the worker."""
+    return QueuedEmail.objects.create(
+        subject=subject,
+        message=message,
+        from_email=from_email,
+        recipients=",".join(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    #exponential backoff: 1x, 2x, 4x ... the configured delay
+    return timedelta(seconds=settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def send_queued_mail(batch_size=None, max_attempts=None):
+    """Send one batch of due emails over a single connection and return how many were sent.
+
+    Rows are locked with SKIP LOCKED (where the database supports it) so several workers can
+    drain the queue at the same time without sending an email twice.
+    """
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    max_attempts = max_attempts or settings.EMAIL_QUEUE_MAX_ATTEMPTS
+    sent = 0
+
+    with transaction.atomic():
+        batch = list(
+            QueuedEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=QueuedEmail.PENDING, next_attempt_at__lte=timezone.now())
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as error:
+            #the mail server is unreachable, the whole batch goes back in the queue
+            for email in batch:
+                record_failure(email, error, max_attempts)
+        else:
+            try:
+                for email in batch:
+                    message = EmailMessage(
+                        subject=email.subject,
+                        body=email.message,
+                        from_email=email.from_email,
+                        to=email.recipient_list,
+                        connection=connection,
+                    )
+                    #sending one message at a time over the open connection means one bad
+                    #address doesn't fail the rest of the batch
+                    try:
+                        connection.send_messages([message])
+                    except Exception as error:
+                        record_failure(email, error, max_attempts)
+                    else:
+                        email.status = QueuedEmail.SENT
+                        email.attempts += 1
+                        email.sent_at = timezone.now()
+                        email.last_error = ""
+                        sent += 1
+            finally:
+                connection.close()
+
+        QueuedEmail.objects.bulk_update(
+            batch, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+        )
+    return sent
+
+
+def record_failure(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = repr(error)
+    if email.attempts >= max_attempts:
+        email.status = QueuedEmail.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
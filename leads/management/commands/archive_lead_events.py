@@ -0,0 +1,41 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from leads.events import archive_events
+from leads.rollups import day_start
+
+
+class Command(BaseCommand):
+    help = (
+        "Move lead events older than a date out of the database into gzipped JSON lines files, "
+        "one per month. Lead states from before that date can't be reconstructed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", help="archive events before this date (YYYY-MM-DD)")
+        parser.add_argument("--older-than-days", type=int, help="archive events older than this many days")
+        parser.add_argument("--output-dir", default="lead-event-archive", help="directory the files are written to")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="rows read from the database at a time")
+
+    def handle(self, *args, **options):
+        if bool(options["before"]) == (options["older_than_days"] is not None):
+            raise CommandError("Pass either --before or --older-than-days")
+        if options["before"]:
+            try:
+                before = date.fromisoformat(options["before"])
+            except ValueError:
+                raise CommandError(f"--before must be a YYYY-MM-DD date, not {options['before']}")
+        else:
+            before = timezone.localdate() - timedelta(days=options["older_than_days"])
+
+        start = time.perf_counter()
+        archives = archive_events(day_start(before), options["output_dir"], chunk_size=options["chunk_size"])
+        for archive in archives:
+            self.stdout.write(f"{archive.path}: {archive.events} events")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {sum(archive.events for archive in archives)} events into {len(archives)} files "
+            f"in {time.perf_counter() - start:.1f}s."
+        ))
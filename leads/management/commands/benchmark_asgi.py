@@ -0,0 +1,82 @@
+import json
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.shortcuts import reverse
+from django.test.utils import override_settings
+
+from leads.benchmarks import ViewBenchmark
+from leads.loadtest import load_test, running_asgi_server, running_server, session_cookie
+from leads.models import Lead, UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput and tail latency of the lead and category pages served by a threaded WSGI "
+        "server, by uvicorn with the sync views and by uvicorn with the async views. Needs uvicorn."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organizor", help="username of the organization to log in as, defaults to the one with the most leads")
+        parser.add_argument("--requests", type=int, default=1000, help="requests per server")
+        parser.add_argument("--concurrency", type=int, default=32, help="client threads")
+        parser.add_argument("--threads", type=int, default=8, help="worker threads of the WSGI server")
+        parser.add_argument("--output", help="write the report here instead of stdout")
+
+    def paths(self, organization, suffix=""):
+        lead = Lead.objects.filter(organization=organization).first()
+        paths = [reverse(f"leads:lead-list{suffix}"), reverse(f"leads:category-list{suffix}")]
+        if lead:
+            paths.append(reverse(f"leads:lead-detail{suffix}", kwargs={"pk": lead.pk}))
+        paths.append(reverse(f"leads:autocomplete{suffix}") + "?q=a")
+        return paths
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise CommandError("benchmark_asgi needs uvicorn, pip install uvicorn")
+
+        if options["organizor"]:
+            try:
+                organization = UserProfile.objects.select_related("user").get(user__username=options["organizor"])
+            except UserProfile.DoesNotExist:
+                raise CommandError(f"No organizor called {options['organizor']}")
+        else:
+            organization = ViewBenchmark(iterations=0).organization
+        if organization is None:
+            raise CommandError("No organizations to benchmark, run generate_leads first")
+
+        cookie = session_cookie(organization.user)
+        servers = {
+            "wsgi": (lambda: running_server(get_wsgi_application(), threads=options["threads"]), self.paths(organization)),
+            "asgi_sync_views": (lambda: running_asgi_server(get_asgi_application()), self.paths(organization)),
+            "asgi_async_views": (lambda: running_asgi_server(get_asgi_application()), self.paths(organization, "-async")),
+        }
+        report = {
+            "meta": {
+                "organization": organization.user.username,
+                "requests": options["requests"],
+                "concurrency": options["concurrency"],
+                "wsgi_threads": options["threads"],
+            },
+            "servers": {},
+        }
+        with override_settings(ALLOWED_HOSTS=["127.0.0.1"]):
+            for name, (server, paths) in servers.items():
+                with server() as base_url:
+                    report["servers"][name] = load_test(
+                        base_url, paths, requests=options["requests"],
+                        concurrency=options["concurrency"], cookie=cookie,
+                    )
+                result = report["servers"][name]
+                self.stderr.write(f"{name}: {result['requests_per_second']} req/s, p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms")
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                report_file.write(output + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,27 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from leads.benchmarks import CardBenchmark
+
+
+class Command(BaseCommand):
+    help = "Time rendering the lead cards with and without the fragment cache and write a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="numbers of cards to render")
+        parser.add_argument("--iterations", type=int, default=3)
+        parser.add_argument("--output", help="write the report here instead of stdout")
+
+    def handle(self, *args, **options):
+        if any(size < 1 for size in options["sizes"]):
+            raise CommandError("--sizes must be positive")
+
+        benchmark = CardBenchmark(options["sizes"], iterations=options["iterations"])
+        report = json.dumps(benchmark.run(), indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(report)
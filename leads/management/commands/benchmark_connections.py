@@ -0,0 +1,108 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.shortcuts import reverse
+from django.test.utils import override_settings
+
+from leads.benchmarks import ViewBenchmark
+from leads.loadtest import load_test, running_server, session_cookie
+from leads.models import Lead, UserProfile
+
+
+#how the default database connection is handled in each mode, on top of its configured settings
+MODES = {
+    #a new connection for every request, what CONN_MAX_AGE = 0 gives you
+    "close": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "POOL": None},
+    #one connection per worker thread, checked at the start of each request
+    "persistent": {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True, "POOL": None},
+    #connections shared by the worker threads through the pool, max_size is set to --threads
+    "pool": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": True, "POOL": {}},
+}
+
+
+def close_pools():
+    #only the djcrm.db.postgresql engine has pools, importing it needs psycopg2
+    if connections.databases["default"]["ENGINE"] == "djcrm.db.postgresql":
+        from djcrm.db.postgresql.base import close_pools
+        close_pools()
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the app from a local multi-threaded WSGI server and compare request latency under "
+        "concurrent load with new, persistent and pooled database connections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organizor", help="username of the organization to log in as, defaults to the one with the most leads")
+        parser.add_argument("--modes", default=",".join(MODES), help="comma separated connection modes to compare")
+        parser.add_argument("--requests", type=int, default=1000, help="requests per mode")
+        parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+        parser.add_argument("--threads", type=int, default=8, help="server worker threads")
+        parser.add_argument("--output", help="write the report here instead of stdout")
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options["modes"].split(",") if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+        if options["organizor"]:
+            try:
+                organization = UserProfile.objects.select_related("user").get(user__username=options["organizor"])
+            except UserProfile.DoesNotExist:
+                raise CommandError(f"No organizor called {options['organizor']}")
+        else:
+            organization = ViewBenchmark(iterations=0).organization
+        if organization is None:
+            raise CommandError("No organizations to benchmark, run generate_leads first")
+
+        paths = [reverse("leads:lead-list"), reverse("leads:category-list")]
+        lead = Lead.objects.filter(organization=organization).first()
+        if lead:
+            paths.append(reverse("leads:lead-detail", kwargs={"pk": lead.pk}))
+        cookie = session_cookie(organization.user)
+
+        database = connections.databases["default"]
+        original = {key: database.get(key) for key in ("CONN_MAX_AGE", "CONN_HEALTH_CHECKS", "POOL")}
+        report = {
+            "meta": {
+                "engine": database["ENGINE"],
+                "organization": organization.user.username,
+                "paths": paths,
+                "requests": options["requests"],
+                "concurrency": options["concurrency"],
+                "threads": options["threads"],
+            },
+            "modes": {},
+        }
+        app = get_wsgi_application()
+        try:
+            for mode in modes:
+                if mode == "pool" and database["ENGINE"] != "djcrm.db.postgresql":
+                    self.stderr.write(f"Skipping pool, it needs the djcrm.db.postgresql engine not {database['ENGINE']}")
+                    continue
+                database.update(MODES[mode])
+                if mode == "pool":
+                    database["POOL"] = {"max_size": options["threads"]}
+                close_pools()
+                with override_settings(ALLOWED_HOSTS=["127.0.0.1"]):
+                    with running_server(app, threads=options["threads"]) as base_url:
+                        report["modes"][mode] = load_test(
+                            base_url, paths, requests=options["requests"],
+                            concurrency=options["concurrency"], cookie=cookie,
+                        )
+                self.stderr.write(f"{mode}: p50 {report['modes'][mode]['p50_ms']}ms, p99 {report['modes'][mode]['p99_ms']}ms")
+        finally:
+            database.update(original)
+            close_pools()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                report_file.write(output + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+
+from leads.benchmarks import ViewBenchmark
+from leads.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Time the lead, category and agent views through the test client and write a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organizor", help="username of the organization to benchmark, defaults to the one with the most leads")
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--output", help="write the report here instead of stdout")
+
+    def handle(self, *args, **options):
+        #lets the test client through ALLOWED_HOSTS and keeps email in memory
+        setup_test_environment()
+
+        organization = None
+        if options["organizor"]:
+            try:
+                organization = UserProfile.objects.select_related("user").get(user__username=options["organizor"])
+            except UserProfile.DoesNotExist:
+                raise CommandError(f"No organizor called {options['organizor']}")
+
+        benchmark = ViewBenchmark(organization, iterations=options["iterations"], warmup=options["warmup"])
+        if benchmark.organization is None:
+            raise CommandError("No organizations to benchmark, run generate_leads first")
+
+        report = json.dumps(benchmark.run(), indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(report)
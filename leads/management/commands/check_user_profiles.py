@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from leads.provisioning import backfill_profiles, users_without_profiles
+
+
+class Command(BaseCommand):
+    help = "Find users without a UserProfile (e.g. created with bulk_create) and create the missing profiles in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="users checked and fixed per query")
+        parser.add_argument("--dry-run", action="store_true", help="only report the users without a profile")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        missing = 0
+        for user_ids in users_without_profiles(options["batch_size"]):
+            missing += len(user_ids)
+            if options["dry_run"]:
+                self.stdout.write(f"No profile: user ids {', '.join(map(str, user_ids))}")
+            else:
+                backfill_profiles(user_ids)
+        action = "found" if options["dry_run"] else "backfilled"
+        self.stdout.write(self.style.SUCCESS(
+            f"{missing} users without a profile {action} in {time.perf_counter() - start:.1f}s."
+        ))
@@ -0,0 +1,62 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from leads.dedupe import BLOCKING_KEYS, DuplicateFinder, group_duplicates, is_mergeable, merge_leads
+from leads.models import Lead, UserProfile
+
+
+class Command(BaseCommand):
+    help = "Find likely duplicate leads of an organization and optionally merge them into the oldest lead."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organizor", required=True, help="username of the organizor that owns the leads")
+        parser.add_argument("--threshold", type=float, default=0.6, help="minimum score (0-1) of a duplicate pair")
+        parser.add_argument("--max-block-size", type=int, default=50, help="skip blocking keys shared by more leads than this")
+        parser.add_argument("--keys", default=",".join(BLOCKING_KEYS), help="comma separated blocking keys")
+        parser.add_argument(
+            "--merge", action="store_true",
+            help="merge every group of duplicates sharing an email or phone into its oldest lead, pairs matched on the name alone are only reported",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            organization = UserProfile.objects.select_related("user").get(user__username=options["organizor"])
+        except UserProfile.DoesNotExist:
+            raise CommandError(f"No organizor called {options['organizor']}")
+        keys = tuple(key.strip() for key in options["keys"].split(",") if key.strip())
+        unknown = set(keys) - set(BLOCKING_KEYS)
+        if unknown:
+            raise CommandError(f"Unknown blocking keys: {', '.join(sorted(unknown))}")
+
+        start = time.perf_counter()
+        finder = DuplicateFinder(
+            organization,
+            threshold=options["threshold"],
+            max_block_size=options["max_block_size"],
+            keys=keys,
+        )
+        candidates = finder.find()
+
+        #the pairs go to stdout as csv so they can be reviewed or piped somewhere, the summary to stderr
+        writer = csv.writer(self.stdout)
+        writer.writerow(["lead_id", "duplicate_id", "score", "reasons"])
+        for candidate in candidates:
+            writer.writerow([candidate.lead_id, candidate.duplicate_id, candidate.score, "+".join(candidate.reasons)])
+
+        merged = 0
+        if options["merge"]:
+            for group in group_duplicates(filter(is_mergeable, candidates)):
+                leads = Lead.objects.in_bulk(group)
+                if len(leads) < 2:
+                    continue
+                lead, *duplicates = [leads[lead_id] for lead_id in sorted(leads)]
+                merge_leads(lead, duplicates)
+                merged += len(duplicates)
+
+        name_only = sum(1 for candidate in candidates if not is_mergeable(candidate))
+        self.stderr.write(self.style.SUCCESS(
+            f"Found {len(candidates)} duplicate pairs ({name_only} on the name alone, not merged) "
+            f"in {time.perf_counter() - start:.1f}s, skipped {finder.skipped_blocks} oversized blocks, merged {merged} leads."
+        ))
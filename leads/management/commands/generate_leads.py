@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from leads.models import User
+from leads.synthetic import SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic multi-tenant data set (organizations, agents, categories and leads) for benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organizations", type=int, default=10)
+        parser.add_argument("--agents", type=int, default=5, help="agents per organization")
+        parser.add_argument("--leads", type=int, default=10000, help="leads across all organizations")
+        parser.add_argument("--skew", type=float, default=1.0, help="0 spreads leads evenly, higher values favour the first organizations")
+        parser.add_argument("--unassigned", type=float, default=0.2, help="share of leads without an agent")
+        parser.add_argument("--uncategorized", type=float, default=0.3, help="share of leads without a category")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--prefix", default="bench", help="username prefix of the generated users")
+        parser.add_argument("--password", default="password", help="password of every generated user")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options["organizations"] < 1:
+            raise CommandError("--organizations must be at least 1")
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Users prefixed {options['prefix']}- already exist, pick another --prefix")
+
+        summary = SyntheticDataGenerator(
+            organizations=options["organizations"],
+            agents=options["agents"],
+            leads=options["leads"],
+            skew=options["skew"],
+            unassigned=options["unassigned"],
+            uncategorized=options["uncategorized"],
+            batch_size=options["batch_size"],
+            prefix=options["prefix"],
+            password=options["password"],
+            seed=options["seed"],
+        ).generate()
+        self.stdout.write(self.style.SUCCESS(
+            "Created {organizations} organizations, {agents} agents, {categories} categories and {leads} leads.".format(**summary)
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from leads.importers import CSV_READ_ERRORS, LeadCSVImporter, csv_read_error
+from leads.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Stream leads from a CSV file into an organization with batched inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file with a header row")
+        parser.add_argument("--organizor", required=True, help="username of the organizor that owns the leads")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--no-notify", action="store_true", help="don't email the import summary")
+
+    def handle(self, *args, **options):
+        try:
+            organization = UserProfile.objects.select_related("user").get(user__username=options["organizor"])
+        except UserProfile.DoesNotExist:
+            raise CommandError(f"No organizor called {options['organizor']}")
+
+        importer = LeadCSVImporter(
+            organization,
+            batch_size=options["batch_size"],
+            notify=not options["no_notify"],
+        )
+        with open(options["path"], encoding="utf-8-sig", newline="") as lines:
+            try:
+                result = importer.run(lines)
+            except CSV_READ_ERRORS as error:
+                raise CommandError(f"{csv_read_error(error)} {importer.result.created} leads were imported before it.")
+
+        for line_number, messages in result.errors:
+            self.stderr.write(f"line {line_number}: {'; '.join(messages)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} leads, skipped {result.error_count} rows."
+        ))
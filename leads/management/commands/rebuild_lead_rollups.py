@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from leads.models import UserProfile
+from leads.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily lead rollups the dashboard reads from the leads. Saves keep them up to date, "
+        "run this periodically (e.g. nightly with --days 2) to catch writes that bypassed the model."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organizor", help="username of the organizor to rebuild, every organization by default")
+        parser.add_argument("--days", type=int, help="only rebuild the last N days, all of them by default")
+
+    def handle(self, *args, **options):
+        organizations = UserProfile.objects.filter(user__is_organizor=True).order_by("pk")
+        if options["organizor"]:
+            organizations = organizations.filter(user__username=options["organizor"])
+            if not organizations.exists():
+                raise CommandError(f"No organizor called {options['organizor']}")
+        start = None
+        if options["days"] is not None:
+            if options["days"] < 1:
+                raise CommandError("--days must be at least 1")
+            start = timezone.localdate() - timedelta(days=options["days"] - 1)
+
+        began = time.perf_counter()
+        rows = 0
+        count = 0
+        for organization_id in organizations.values_list("pk", flat=True).iterator():
+            rows += rebuild_rollups(organization_id, start=start)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {rows} rollup rows of {count} organizations in {time.perf_counter() - began:.1f}s."
+        ))
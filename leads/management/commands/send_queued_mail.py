@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from leads.mail import send_queued_mail
+
+
+class Command(BaseCommand):
+    help = "Send the emails waiting in the outbox, one connection per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--loop", action="store_true", help="keep polling the outbox instead of exiting when it is empty")
+        parser.add_argument("--interval", type=float, default=5, help="seconds to sleep between polls with --loop")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            sent = send_queued_mail(batch_size=options["batch_size"])
+            total += sent
+            if sent:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Sent {total} emails."))
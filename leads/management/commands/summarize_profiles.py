@@ -0,0 +1,31 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from leads.profiling import summarize_samples
+
+
+class Command(BaseCommand):
+    help = "Aggregate the request profiles sampled by ProfilingMiddleware per view and write a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", help="the sample file, defaults to PROFILE_SAMPLE_FILE")
+        parser.add_argument("--top", type=int, default=5, help="how many repeated queries to list per view")
+        parser.add_argument("--output", help="write the report here instead of stdout")
+
+    def handle(self, *args, **options):
+        path = options["file"] or settings.PROFILE_SAMPLE_FILE
+        try:
+            with open(path, encoding="utf-8") as sample_file:
+                report = summarize_samples(sample_file, top=options["top"])
+        except FileNotFoundError:
+            raise CommandError(f"No profile samples at {path}, set PROFILE_SAMPLE_RATE to collect some")
+
+        report = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,67 @@
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import events, rollups
+from .autocomplete import invalidate_autocomplete
+from .conditional import touch_organizations
+from .counters import invalidate_category_counts
+
+
+class TenantQuerySet(models.QuerySet):
+    def for_tenant(self, tenant):
+        """Only the rows that belong to the tenant's organization."""
+        return self.filter(organization=tenant.organization)
+
+
+class LeadQuerySet(TenantQuerySet):
+    def for_tenant(self, tenant):
+        """Every lead of the organization for organizors, only their own leads for agents."""
+        queryset = super(LeadQuerySet, self).for_tenant(tenant)
+        if not tenant.is_organizor:
+            queryset = queryset.filter(agent=tenant.agent)
+        return queryset
+
+    def bulk_create(self, objs, *args, **kwargs):
+        #bulk_create skips save() and post_save, the normalized contact columns, conversion stamp,
+        #dashboard rollups, organization change stamps, category counts and autocomplete indexes are
+        #taken care of here instead
+        objs = list(objs)
+        for lead in objs:
+            lead.normalize_contact()
+        rollups.track_bulk_conversions(objs)
+        objs = super(LeadQuerySet, self).bulk_create(objs, *args, **kwargs)
+        rollups.leads_created(objs)
+        organization_ids = {lead.organization_id for lead in objs}
+        touch_organizations(*organization_ids)
+        invalidate_category_counts(*organization_ids)
+        invalidate_autocomplete(*organization_ids)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        """Update leads read from the database (the event log and rollups compare against how they
+        were read) with the side effects of save() that bulk_update skips, like bulk_create."""
+        objs = list(objs)
+        fields = set(fields)
+        if {"email", "phone_number"} & fields:
+            for lead in objs:
+                lead.normalize_contact()
+            fields |= {"email_normalized", "phone_normalized"}
+        if "category" in fields:
+            rollups.track_bulk_conversions(objs)
+            fields.add("converted_at")
+        #auto_now is only applied by save()
+        timestamp = timezone.now()
+        for lead in objs:
+            lead.updated_at = timestamp
+        fields.add("updated_at")
+        with transaction.atomic():
+            super(LeadQuerySet, self).bulk_update(objs, fields, *args, **kwargs)
+            events.leads_bulk_updated(objs, fields, timestamp)
+            rollups.leads_updated(objs, fields)
+        organization_ids = {lead.organization_id for lead in objs}
+        touch_organizations(*organization_ids)
+        if "category" in fields:
+            invalidate_category_counts(*organization_ids)
+        #what the autocomplete index keeps of a lead
+        if {"first_name", "last_name", "agent"} & fields:
+            invalidate_autocomplete(*organization_ids)
@@ -0,0 +1,50 @@
+from django.utils.functional import cached_property
+
+from .models import Agent
+
+
+class Tenant:
+    """The organization and role of the logged in user, looked up at most once per request.
+
+    Organizors own the organization through their UserProfile, agents belong to the
+    organization of their Agent row, which is fetched together with it in one joined query.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def is_organizor(self):
+        return self.user.is_organizor
+
+    @cached_property
+    def agent(self):
+        if self.is_organizor:
+            return None
+        agent = Agent.objects.select_related("organization").get(user=self.user)
+        #caching it on the user so code that still reads user.agent doesn't query again
+        self.user.agent = agent
+        return agent
+
+    @cached_property
+    def organization(self):
+        if self.is_organizor:
+            return self.user.userprofile
+        return self.agent.organization
+
+
+class TenantMiddleware:
+    """Attach request.tenant, must come after AuthenticationMiddleware.
+
+    Nothing is queried until a view reads request.tenant.organization or request.tenant.agent.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.user.is_authenticated:
+            request.tenant = Tenant(request.user)
+        else:
+            request.tenant = None
+        return self.get_response(request)
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0011_auto_20230102_2314'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['organization', 'agent'], name='lead_org_agent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['organization', 'category'], name='lead_org_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['organization', 'date_added', 'id'], name='lead_org_date_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(condition=models.Q(agent__isnull=True), fields=['organization', 'date_added', 'id'], name='lead_org_unassigned_idx'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+from django.db import migrations
+
+
+#the search index lives outside the Lead model on purpose: a tsvector column on the model would be
+#loaded by every lead query, and the sqlite fts5 table isn't a table django can model at all.
+#both are kept up to date by triggers, so bulk_create and queryset.update() are covered too.
+
+POSTGRES_FORWARDS = [
+    "ALTER TABLE leads_lead ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION leads_lead_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.first_name, '') || ' ' || coalesce(NEW.last_name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.email, '') || ' ' || coalesce(NEW.phone_number, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER leads_lead_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF first_name, last_name, email, phone_number, description ON leads_lead
+    FOR EACH ROW EXECUTE PROCEDURE leads_lead_search_vector_update()
+    """,
+    #fires the trigger for the existing rows
+    "UPDATE leads_lead SET first_name = first_name",
+    "CREATE INDEX lead_search_vector_idx ON leads_lead USING gin (search_vector)",
+]
+
+POSTGRES_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS leads_lead_search_vector_trigger ON leads_lead",
+    "DROP FUNCTION IF EXISTS leads_lead_search_vector_update()",
+    "ALTER TABLE leads_lead DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE leads_lead_fts USING fts5(
+        first_name, last_name, email, phone_number, description,
+        content='leads_lead', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER leads_lead_fts_insert AFTER INSERT ON leads_lead BEGIN
+        INSERT INTO leads_lead_fts(rowid, first_name, last_name, email, phone_number, description)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER leads_lead_fts_delete AFTER DELETE ON leads_lead BEGIN
+        INSERT INTO leads_lead_fts(leads_lead_fts, rowid, first_name, last_name, email, phone_number, description)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER leads_lead_fts_update AFTER UPDATE OF first_name, last_name, email, phone_number, description ON leads_lead BEGIN
+        INSERT INTO leads_lead_fts(leads_lead_fts, rowid, first_name, last_name, email, phone_number, description)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number, old.description);
+        INSERT INTO leads_lead_fts(rowid, first_name, last_name, email, phone_number, description)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number, new.description);
+    END
+    """,
+    "INSERT INTO leads_lead_fts(leads_lead_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS leads_lead_fts_insert",
+    "DROP TRIGGER IF EXISTS leads_lead_fts_delete",
+    "DROP TRIGGER IF EXISTS leads_lead_fts_update",
+    "DROP TABLE IF EXISTS leads_lead_fts",
+]
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        statements = {"postgresql": postgres, "sqlite": sqlite}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0013_queuedemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARDS, SQLITE_FORWARDS),
+            run_for_vendor(POSTGRES_BACKWARDS, SQLITE_BACKWARDS),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+from leads.normalize import normalize_email, normalize_phone
+from leads.search import install_sqlite_search_triggers
+
+
+def normalize_existing_leads(apps, schema_editor):
+    Lead = apps.get_model('leads', 'Lead')
+    batch = []
+    for lead in Lead.objects.only('id', 'email', 'phone_number').iterator(chunk_size=2000):
+        lead.email_normalized = normalize_email(lead.email)
+        lead.phone_normalized = normalize_phone(lead.phone_number)
+        batch.append(lead)
+        if len(batch) >= 2000:
+            Lead.objects.bulk_update(batch, ['email_normalized', 'phone_normalized'])
+            batch = []
+    if batch:
+        Lead.objects.bulk_update(batch, ['email_normalized', 'phone_normalized'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0014_lead_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='email_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        #the sqlite table rebuild above dropped the search index triggers
+        migrations.RunPython(install_sqlite_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(normalize_existing_leads, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['organization', 'email_normalized'], name='lead_org_email_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['organization', 'phone_normalized'], name='lead_org_phone_norm_idx'),
+        ),
+    ]
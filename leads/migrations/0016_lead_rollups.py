@@ -0,0 +1,54 @@
+# Generated by Django 3.1.4 on 2026-10-18 17:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from leads.search import install_sqlite_search_triggers
+
+
+def stamp_converted_leads(apps, schema_editor):
+    #when existing leads were converted isn't known, the day they were added is the closest guess
+    Lead = apps.get_model('leads', 'Lead')
+    Lead.objects.filter(category__name='Converted').update(converted_at=models.F('date_added'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0015_lead_normalized_contact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLeadRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('agent_key', models.PositiveIntegerField(default=0)),
+                ('category_key', models.PositiveIntegerField(default=0)),
+                ('created', models.IntegerField(default=0)),
+                ('converted', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='converted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        #the sqlite table rebuild above dropped the search index triggers
+        migrations.RunPython(install_sqlite_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(stamp_converted_leads, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['organization', 'converted_at'], name='lead_org_converted_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyleadrollup',
+            name='organization',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='leads.userprofile'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyleadrollup',
+            constraint=models.UniqueConstraint(fields=('organization', 'day', 'agent_key', 'category_key'), name='dailyleadrollup_unique_key'),
+        ),
+    ]
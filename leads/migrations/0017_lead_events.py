@@ -0,0 +1,46 @@
+# Generated by Django 3.1.4 on 2026-10-18 17:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0016_lead_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadEventArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('path', models.CharField(max_length=500)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LeadEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('field', models.PositiveSmallIntegerField(choices=[(1, 'Agent'), (2, 'Category')])),
+                ('old_value', models.PositiveIntegerField(blank=True, null=True)),
+                ('new_value', models.PositiveIntegerField(blank=True, null=True)),
+                ('lead', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='leads.lead')),
+                ('organization', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='leads.userprofile')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='leadevent',
+            index=models.Index(fields=['organization', 'lead', 'timestamp'], name='leadevent_org_lead_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leadevent',
+            index=models.Index(fields=['timestamp'], name='leadevent_time_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.4 on 2026-10-18 19:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+from leads.search import install_sqlite_search_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0017_lead_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        #the sqlite table rebuild above dropped the search index triggers
+        migrations.RunPython(install_sqlite_search_triggers, migrations.RunPython.noop),
+    ]
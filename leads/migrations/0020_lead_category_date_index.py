@@ -0,0 +1,22 @@
+# Generated by Django 3.1.4 on 2026-10-18 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0019_userprofile_changed_at'),
+    ]
+
+    operations = [
+        #the new index first, category lookups always have one to use
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['organization', 'category', 'date_added', 'id'], name='lead_org_category_date_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='lead',
+            name='lead_org_category_idx',
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations
+
+
+#the default parser keeps "joe@test.com" as one email lexeme and reads "555-1234" as the signed
+#number "-1234", while search_terms() splits a query into plain letters and digits, so full
+#emails, domains and dashed phone numbers never matched. The text is now split the same way
+#before it is parsed: every run of characters that aren't letters or digits becomes a space.
+
+SPLIT_TERMS_FUNCTION = """
+    CREATE OR REPLACE FUNCTION leads_lead_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', regexp_replace(
+                coalesce(NEW.first_name, '') || ' ' || coalesce(NEW.last_name, ''), '[^[:alnum:]]+', ' ', 'g'
+            )), 'A') ||
+            setweight(to_tsvector('simple', regexp_replace(
+                coalesce(NEW.email, '') || ' ' || coalesce(NEW.phone_number, ''), '[^[:alnum:]]+', ' ', 'g'
+            )), 'B') ||
+            setweight(to_tsvector('simple', regexp_replace(
+                coalesce(NEW.description, ''), '[^[:alnum:]]+', ' ', 'g'
+            )), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+PARSER_FUNCTION = """
+    CREATE OR REPLACE FUNCTION leads_lead_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.first_name, '') || ' ' || coalesce(NEW.last_name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.email, '') || ' ' || coalesce(NEW.phone_number, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+#fires the trigger for the existing rows
+REINDEX = "UPDATE leads_lead SET first_name = first_name"
+
+
+def run_on_postgres(*statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0020_lead_category_date_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgres(SPLIT_TERMS_FUNCTION, REINDEX),
+            run_on_postgres(PARSER_FUNCTION, REINDEX),
+        ),
+    ]
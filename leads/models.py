@@ -25,8 +25,14 @@
 
 
 
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.utils import timezone
+from .counters import invalidate_category_counts
+from . import autocomplete, events, rollups
+from .conditional import touch_organizations
+from .managers import LeadQuerySet, TenantQuerySet
+from .normalize import normalize_email, normalize_phone
 from django.contrib.auth.models import AbstractUser
 # Create your models here.
 
@@ -43,6 +49,9 @@ class User(AbstractUser):
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
+    #moved forward after every write to the organization's leads, agents or categories, pages
+    #answer 304 Not Modified while it stays the same, see conditional.py
+    changed_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return self.user.username
@@ -65,7 +74,71 @@ class Lead(models.Model):
     date_added = models.DateTimeField(auto_now_add=True)
     phone_number = models.CharField(max_length=20)
     email = models.EmailField()
+    #lowercased email and E.164 style phone number, kept up to date by save() and bulk_create()
+    #so duplicates can be found with an indexed equality lookup
+    email_normalized = models.CharField(max_length=254, blank=True, editable=False)
+    phone_normalized = models.CharField(max_length=16, blank=True, editable=False)
+    #when the lead moved into the "Converted" category, kept by save() for the dashboard rollups
+    converted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    #part of the card fragment cache keys, bulk updates set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
 
+    #Lead.objects.for_tenant(request.tenant) scopes leads to what the logged in user may see
+    objects = LeadQuerySet.as_manager()
+
+    class Meta:
+        #every lead query is scoped to an organization first, so each index leads with it
+        indexes = [
+            #agent__isnull / agent__user lookups
+            models.Index(fields=["organization", "agent"], name="lead_org_agent_idx"),
+            #category__isnull / category lookups, and a category's leads newest first a page at a time
+            models.Index(fields=["organization", "category", "date_added", "id"], name="lead_org_category_date_idx"),
+            #newest first keyset pagination on (date_added, id)
+            models.Index(fields=["organization", "date_added", "id"], name="lead_org_date_added_idx"),
+            #the unassigned leads block only ever reads rows with no agent
+            models.Index(
+                fields=["organization", "date_added", "id"],
+                condition=models.Q(agent__isnull=True),
+                name="lead_org_unassigned_idx",
+            ),
+            #blocking keys of the duplicate finder
+            models.Index(fields=["organization", "email_normalized"], name="lead_org_email_norm_idx"),
+            models.Index(fields=["organization", "phone_normalized"], name="lead_org_phone_norm_idx"),
+            #the conversions side of a rollup rebuild
+            models.Index(fields=["organization", "converted_at"], name="lead_org_converted_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        lead = super(Lead, cls).from_db(db, field_names, values)
+        #the row as it was read, the rollups and event log work out what a save() changed from it
+        lead._loaded_state = rollups.lead_state(lead)
+        return lead
+
+    def refresh_from_db(self, *args, **kwargs):
+        super(Lead, self).refresh_from_db(*args, **kwargs)
+        self._loaded_state = rollups.lead_state(self)
+
+    def normalize_contact(self):
+        self.email_normalized = normalize_email(self.email)
+        self.phone_normalized = normalize_phone(self.phone_number)
+
+    def save(self, *args, **kwargs):
+        self.normalize_contact()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"email", "phone_number"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"email_normalized", "phone_normalized"}
+        update_fields = kwargs.get("update_fields")
+        if rollups.track_conversion(self) and update_fields is not None:
+            kwargs["update_fields"] = set(update_fields) | {"converted_at"}
+        if kwargs.get("update_fields") is not None:
+            #auto_now only reaches the database when it is in update_fields
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"updated_at"}
+        #the lead, its rollups and its event log entries are written together or not at all
+        with transaction.atomic():
+            super(Lead, self).save(*args, **kwargs)
+        #what the post_save receivers compared against until now, the next save compares against this
+        self._loaded_state = rollups.saved_state(self, kwargs.get("update_fields"))
 
 
     def __str__(self):
@@ -74,6 +147,10 @@ class Lead(models.Model):
 class Agent(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    #also bumped when the agent's user changes, the agent card shows the username
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantQuerySet.as_manager()
 
     #string representation of user in agent
     def __str__(self):
@@ -84,11 +161,122 @@ class Agent(models.Model):
 class Category(models.Model):
     name = models.CharField(max_length=30)  #Our 4 categories: New, Contacted, Converted, Unconverted
     organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        category = super(Category, cls).from_db(db, field_names, values)
+        #the name as it was read, renaming a category into or out of "Converted" restamps its leads
+        category._loaded_name = category.__dict__.get("name")
+        return category
 
     def __str__(self):
         return self.name
 
 
+#one change of a lead's agent or category, rows are only ever added (and archived), see events.py
+class LeadEvent(models.Model):
+    AGENT = events.AGENT
+    CATEGORY = events.CATEGORY
+
+    #the (organization, lead, timestamp) index covers organization lookups
+    organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE, db_index=False)
+    lead = models.ForeignKey(Lead, related_name="events", on_delete=models.CASCADE)
+    timestamp = models.DateTimeField(default=timezone.now)
+    field = models.PositiveSmallIntegerField(choices=events.FIELD_CHOICES)
+    #agent or category ids rather than foreign keys, the history outlives a deleted agent or category
+    old_value = models.PositiveIntegerField(null=True, blank=True)
+    new_value = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            #a lead's history and state_at() lookups
+            models.Index(fields=["organization", "lead", "timestamp"], name="leadevent_org_lead_time_idx"),
+            #archival reads and deletes time ranges across organizations
+            models.Index(fields=["timestamp"], name="leadevent_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_field_display()} of lead {self.lead_id}: {self.old_value} -> {self.new_value}"
+
+
+#a time range of lead events moved out of the table into a file by archive_lead_events
+class LeadEventArchive(models.Model):
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    path = models.CharField(max_length=500)
+    events = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.start} - {self.end}: {self.path}"
+
+
+#the sales dashboard reads these instead of the leads, see rollups.py
+class DailyLeadRollup(models.Model):
+    organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    day = models.DateField()
+    #plain ids rather than foreign keys, 0 for none. A deleted agent or category moves its counts
+    #to 0 in a rebuild instead of leaving NULL rows that clash with the existing ones
+    agent_key = models.PositiveIntegerField(default=0)
+    category_key = models.PositiveIntegerField(default=0)
+    #leads added that day
+    created = models.IntegerField(default=0)
+    #leads that moved into the "Converted" category that day
+    converted = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            #also the index the dashboard reads a range of days through
+            models.UniqueConstraint(
+                fields=["organization", "day", "agent_key", "category_key"], name="dailyleadrollup_unique_key"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} agent {self.agent_key} category {self.category_key}"
+
+
+#outgoing email waits here until the send_queued_mail worker picks it up,
+#so requests never block on the mail server
+class QueuedEmail(models.Model):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    )
+
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    from_email = models.CharField(max_length=254)
+    #comma separated list of addresses
+    recipients = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    #the worker only picks up pending emails that are due, failed sends are pushed back with a backoff
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="queuedemail_due_idx"),
+        ]
+
+    @property
+    def recipient_list(self):
+        return [address for address in self.recipients.split(",") if address]
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipients}"
+
+
 #creating a user profile
 def post_user_created_signal(sender, instance, created, **kwargs):
     #tells us what user was actually saved
@@ -97,4 +285,128 @@ def post_user_created_signal(sender, instance, created, **kwargs):
 
 
 #calling this function when we recieve the post save event
-post_save.connect(post_user_created_signal, sender=User)
\ No newline at end of file
+post_save.connect(post_user_created_signal, sender=User)
+
+
+#the cached category counts of an organization are stale as soon as one of its leads changes
+def post_lead_changed_signal(sender, instance, **kwargs):
+    invalidate_category_counts(instance.organization_id)
+
+
+post_save.connect(post_lead_changed_signal, sender=Lead)
+post_delete.connect(post_lead_changed_signal, sender=Lead)
+#deleting a category moves its leads to unassigned with an UPDATE that sends no lead signals
+post_delete.connect(post_lead_changed_signal, sender=Category)
+
+
+#recording agent and category changes in the lead event log
+def post_lead_saved_event_signal(sender, instance, created, update_fields=None, **kwargs):
+    events.lead_saved(instance, created, update_fields)
+
+
+#their leads lose them with an UPDATE that sends no lead signals
+def pre_agent_deleted_event_signal(sender, instance, **kwargs):
+    events.value_cleared(instance, events.AGENT, "agent")
+
+
+def pre_category_deleted_event_signal(sender, instance, **kwargs):
+    events.value_cleared(instance, events.CATEGORY, "category")
+
+
+#SET_NULL moves their leads with an UPDATE that bypasses save(), so their updated_at is bumped here
+def pre_agent_deleted_touch_signal(sender, instance, **kwargs):
+    Lead.objects.filter(agent=instance).update(updated_at=timezone.now())
+
+
+def pre_category_deleted_touch_signal(sender, instance, **kwargs):
+    Lead.objects.filter(category=instance).update(updated_at=timezone.now())
+
+
+#an agent card shows its user's username
+def post_user_saved_touch_signal(sender, instance, created, **kwargs):
+    if not created and instance.is_agent:
+        agents = Agent.objects.filter(user=instance)
+        touch_organizations(*agents.values_list("organization_id", flat=True))
+        agents.update(updated_at=timezone.now())
+
+
+post_save.connect(post_lead_saved_event_signal, sender=Lead)
+pre_delete.connect(pre_agent_deleted_event_signal, sender=Agent)
+pre_delete.connect(pre_category_deleted_event_signal, sender=Category)
+pre_delete.connect(pre_agent_deleted_touch_signal, sender=Agent)
+pre_delete.connect(pre_category_deleted_touch_signal, sender=Category)
+post_save.connect(post_user_saved_touch_signal, sender=User)
+
+
+#every page of an organization shows some of its leads, agents or categories
+def post_organization_changed_signal(sender, instance, **kwargs):
+    touch_organizations(instance.organization_id)
+
+
+post_save.connect(post_organization_changed_signal, sender=Lead)
+post_delete.connect(post_organization_changed_signal, sender=Lead)
+post_save.connect(post_organization_changed_signal, sender=Agent)
+post_delete.connect(post_organization_changed_signal, sender=Agent)
+post_save.connect(post_organization_changed_signal, sender=Category)
+post_delete.connect(post_organization_changed_signal, sender=Category)
+
+
+#keeping the dashboard rollups in step with the leads they count
+def post_lead_saved_rollup_signal(sender, instance, created, update_fields=None, **kwargs):
+    rollups.lead_saved(instance, created, update_fields)
+
+
+def post_lead_deleted_rollup_signal(sender, instance, **kwargs):
+    rollups.lead_deleted(instance)
+
+
+def post_agent_deleted_rollup_signal(sender, instance, **kwargs):
+    rollups.key_deleted(instance.organization_id, agent_key=instance.pk)
+
+
+def post_category_deleted_rollup_signal(sender, instance, **kwargs):
+    rollups.key_deleted(instance.organization_id, category_key=instance.pk)
+
+
+def post_category_saved_rollup_signal(sender, instance, created, **kwargs):
+    rollups.category_saved(instance, created)
+
+
+post_save.connect(post_lead_saved_rollup_signal, sender=Lead)
+post_delete.connect(post_lead_deleted_rollup_signal, sender=Lead)
+post_delete.connect(post_agent_deleted_rollup_signal, sender=Agent)
+post_delete.connect(post_category_deleted_rollup_signal, sender=Category)
+post_save.connect(post_category_saved_rollup_signal, sender=Category)
+
+
+#keeping the autocomplete prefix indexes in step with the leads and agents they list
+def post_lead_saved_autocomplete_signal(sender, instance, **kwargs):
+    autocomplete.lead_saved(instance)
+
+
+def post_lead_deleted_autocomplete_signal(sender, instance, **kwargs):
+    autocomplete.lead_deleted(instance)
+
+
+def post_agent_saved_autocomplete_signal(sender, instance, **kwargs):
+    autocomplete.agent_saved(instance, instance.user)
+
+
+def post_agent_deleted_autocomplete_signal(sender, instance, **kwargs):
+    autocomplete.agent_deleted(instance)
+
+
+#an agent is listed by the name and email of its user
+def post_user_saved_autocomplete_signal(sender, instance, created, **kwargs):
+    if created or not instance.is_agent:
+        return
+    agent = Agent.objects.filter(user=instance).first()
+    if agent is not None:
+        autocomplete.agent_saved(agent, instance)
+
+
+post_save.connect(post_lead_saved_autocomplete_signal, sender=Lead)
+post_delete.connect(post_lead_deleted_autocomplete_signal, sender=Lead)
+post_save.connect(post_agent_saved_autocomplete_signal, sender=Agent)
+post_delete.connect(post_agent_deleted_autocomplete_signal, sender=Agent)
+post_save.connect(post_user_saved_autocomplete_signal, sender=User)
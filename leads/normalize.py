@@ -0,0 +1,39 @@
+import re
+
+from django.conf import settings
+
+
+#contact details as typed are useless for matching, "John@Example.com " and "john@example.com"
+#are the same person and so are "(555) 123-4567" and "+1 555 123 4567". Lead keeps a normalized
+#copy of both in indexed columns so duplicates can be found with an equality lookup
+
+NON_DIGITS_RE = re.compile(r"\D")
+#shorter than this it's an extension or a typo, not something to match leads on
+MIN_PHONE_DIGITS = 7
+#E.164 numbers are at most 15 digits
+MAX_PHONE_DIGITS = 15
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def normalize_phone(phone_number, country_code=None):
+    """E.164 style "+<country code><number>", or "" if it doesn't look like a phone number.
+
+    Numbers written without a country code get settings.LEADS_PHONE_COUNTRY_CODE.
+    """
+    raw = (phone_number or "").strip()
+    digits = NON_DIGITS_RE.sub("", raw)
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        #international dialling prefix
+        digits = digits[2:]
+    else:
+        country_code = country_code if country_code is not None else settings.LEADS_PHONE_COUNTRY_CODE
+        #a national trunk prefix like the UK's 0 is dropped once the country code is added
+        digits = country_code + digits.lstrip("0") if country_code else digits
+    if not MIN_PHONE_DIGITS <= len(digits) <= MAX_PHONE_DIGITS:
+        return ""
+    return f"+{digits}"
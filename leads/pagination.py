@@ -0,0 +1,168 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+
+#keyset (cursor) pagination: instead of OFFSET n we remember the last row we showed
+#and ask for the rows that come after it, so "next page" costs the same on page 1 and page 10000
+#and rows inserted while someone is paging never shift the pages they haven't seen yet
+
+
+def encode_cursor(date_added, pk):
+    raw = f"{date_added.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Turn a cursor string back into a (date_added, pk) tuple, raising ValueError if it is malformed."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        date_added, pk = raw.rsplit("|", 1)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    parsed = parse_datetime(date_added)
+    if parsed is None or not pk.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return parsed, int(pk)
+
+
+def encode_id_cursor(pk):
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip("=")
+
+
+def decode_id_cursor(cursor):
+    """Turn an id cursor string back into the id, raising ValueError if it is malformed."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        pk = base64.urlsafe_b64decode(padded.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if not pk.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return int(pk)
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        #the cursor that produced this page, None for the first page
+        self.cursor = cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return self.cursor is None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginate a Lead queryset newest first on (date_added, id).
+
+    id breaks ties between leads added in the same instant, so the ordering is total
+    and a row can never show up on two pages.
+    """
+    ordering = ("-date_added", "-id")
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            try:
+                queryset = self.after(queryset, cursor)
+            except ValueError:
+                raise Http404("Invalid page cursor.")
+        #fetching one extra row tells us if there is a next page without running a COUNT(*)
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.cursor_for(rows[-1])
+        return KeysetPage(rows, next_cursor, cursor=cursor or None)
+
+    def after(self, queryset, cursor):
+        """The rows of queryset that come after cursor, raising ValueError if it is malformed."""
+        date_added, pk = decode_cursor(cursor)
+        return queryset.filter(Q(date_added__lt=date_added) | Q(date_added=date_added, id__lt=pk))
+
+    def cursor_for(self, row):
+        #model instances, or values() rows that include date_added and id
+        if isinstance(row, dict):
+            return encode_cursor(row["date_added"], row["id"])
+        return encode_cursor(row.date_added, row.pk)
+
+
+class IdKeysetPaginator(KeysetPaginator):
+    """Paginate oldest first on id alone, for the agents and categories of an organization."""
+    ordering = ("id",)
+
+    def after(self, queryset, cursor):
+        return queryset.filter(id__gt=decode_id_cursor(cursor))
+
+    def cursor_for(self, row):
+        return encode_id_cursor(row["id"] if isinstance(row, dict) else row.pk)
+
+
+class KeysetPaginationMixin:
+    """Swap ListView's OFFSET based Paginator for KeysetPaginator.
+
+    The page size comes from paginate_by, falling back to settings.LEADS_PAGINATE_BY.
+    """
+    cursor_kwarg = "cursor"
+    #set here too for the detail views that page a related list
+    paginate_by = None
+
+    def get_paginate_by(self, queryset):
+        return self.paginate_by or settings.LEADS_PAGINATE_BY
+
+    def get_cursor(self, cursor_kwarg=None):
+        return self.request.GET.get(cursor_kwarg or self.cursor_kwarg) or None
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size)
+        page = paginator.page(self.get_cursor())
+        return (paginator, page, page.object_list, page.has_next or not page.is_first)
+
+
+class OffsetPage:
+    """A numbered page that never runs COUNT(*), for ordered results keyset pagination can't page
+    such as search results ordered by rank. Fetching one extra row tells us if there is a next page."""
+
+    def __init__(self, queryset, number, per_page):
+        self.number = number
+        offset = (number - 1) * per_page
+        rows = list(queryset[offset:offset + per_page + 1])
+        self.has_next = len(rows) > per_page
+        self.object_list = rows[:per_page]
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
@@ -0,0 +1,191 @@
+import json
+import logging
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+
+#opt-in per request profiling of the lead and agent pages. A profiled request records its total
+#time, the time and number of its SQL queries (through connection.execute_wrapper, so nothing is
+#patched), the queries that ran more than once with the same shape, and the template render time.
+#
+#PROFILE_REQUESTS profiles every request, PROFILE_HEADER_ENABLED lets a single request ask with an
+#X-Profile header. Those get a Server-Timing header, which browser dev tools show next to the
+#request, and a JSON log line on the leads.profiling logger. PROFILE_SAMPLE_RATE writes that
+#fraction of all requests to PROFILE_SAMPLE_FILE as JSON lines, summarize_profiles aggregates them.
+#
+#the async views query from worker threads, their SQL isn't seen here. Template time includes the
+#queries lazy querysets run while rendering, they are in the SQL time too.
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+#requests to other urls (login, static files, admin) are never recorded
+PROFILED_NAMESPACES = ("leads", "agents", "leads-api", "agents-api")
+#IN lists of any length are the same query
+IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+
+
+def fingerprint(sql):
+    """The shape of a query, the same for every run whatever the parameters."""
+    return IN_LIST.sub("(...)", sql)
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.total_time = None
+        self.sql_time = 0.0
+        self.queries = Counter()
+        self.template_start = None
+        self.template_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        #the execute_wrapper of every connection, runs around each query
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.query_finished(fingerprint(sql))
+
+    def query_finished(self, shape):
+        self.queries[shape] += 1
+
+    def template_started(self):
+        self.template_start = time.perf_counter()
+
+    def template_finished(self):
+        self.template_time += time.perf_counter() - self.template_start
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.start
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def duplicates(self):
+        """[{"sql": fingerprint, "count": n}] of the queries that ran more than once, most repeated first."""
+        return [{"sql": sql, "count": count} for sql, count in self.queries.most_common() if count > 1]
+
+    def server_timing(self):
+        return ", ".join([
+            f"total;dur={milliseconds(self.total_time)}",
+            f'sql;dur={milliseconds(self.sql_time)};desc="{self.query_count} queries"',
+            f"template;dur={milliseconds(self.template_time)}",
+        ])
+
+    def record(self, request, response):
+        return {
+            "time": timezone.now().isoformat(),
+            "view": request.resolver_match.view_name,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "user": request.user.pk if request.user.is_authenticated else None,
+            "total_ms": milliseconds(self.total_time),
+            "sql_ms": milliseconds(self.sql_time),
+            "queries": self.query_count,
+            "duplicates": self.duplicates(),
+            "template_ms": milliseconds(self.template_time),
+        }
+
+
+class ProfilingMiddleware:
+    """Profile requests to the lead and agent views, see the top of this module.
+
+    Goes near the top of MIDDLEWARE so the session and user queries count towards the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_lock = threading.Lock()
+
+    def wants_report(self, request):
+        return settings.PROFILE_REQUESTS or (
+            settings.PROFILE_HEADER_ENABLED and bool(request.headers.get(PROFILE_HEADER))
+        )
+
+    def __call__(self, request):
+        report = self.wants_report(request)
+        sample = settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+        if not report and not sample:
+            return self.get_response(request)
+
+        profile = request.profile = RequestProfile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        profile.finish()
+
+        match = request.resolver_match
+        if match is None or match.namespace not in PROFILED_NAMESPACES:
+            return response
+        record = profile.record(request, response)
+        if report:
+            response["Server-Timing"] = profile.server_timing()
+            logger.info(json.dumps(record, sort_keys=True))
+        if sample:
+            self.write_sample(record)
+        return response
+
+    def process_template_response(self, request, response):
+        #called just before the response is rendered, the callback right after
+        profile = getattr(request, "profile", None)
+        if profile is not None:
+            profile.template_started()
+            response.add_post_render_callback(lambda response: profile.template_finished())
+        return response
+
+    def write_sample(self, record):
+        line = json.dumps(record, sort_keys=True) + "\n"
+        with self.sample_lock:
+            with open(settings.PROFILE_SAMPLE_FILE, "a", encoding="utf-8") as sample_file:
+                sample_file.write(line)
+
+
+def summarize_samples(lines, top=5):
+    """{view: summary} of sampled request records, JSON lines as written by ProfilingMiddleware."""
+    from .benchmarks import percentile
+
+    by_view = defaultdict(list)
+    for line in lines:
+        line = line.strip()
+        if line:
+            record = json.loads(line)
+            by_view[record["view"]].append(record)
+
+    summaries = {}
+    for view, records in sorted(by_view.items()):
+        duplicates = Counter()
+        for record in records:
+            for duplicate in record["duplicates"]:
+                duplicates[duplicate["sql"]] += duplicate["count"]
+        totals = [record["total_ms"] for record in records]
+        summaries[view] = {
+            "requests": len(records),
+            "p50_ms": percentile(totals, 50),
+            "p95_ms": percentile(totals, 95),
+            "max_ms": max(totals),
+            "mean_sql_ms": round(statistics.mean(record["sql_ms"] for record in records), 3),
+            "mean_template_ms": round(statistics.mean(record["template_ms"] for record in records), 3),
+            "mean_queries": round(statistics.mean(record["queries"] for record in records), 1),
+            "max_queries": max(record["queries"] for record in records),
+            #the repeated queries across all the samples of the view, N+1 candidates
+            "top_duplicates": [{"sql": sql, "count": count} for sql, count in duplicates.most_common(top)],
+        }
+    return summaries
@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.models import Max
+
+from .autocomplete import invalidate_autocomplete
+from .conditional import touch_organizations
+from .models import Agent, User, UserProfile
+
+
+#creating users in bulk. User.objects.create() sends post_save, which creates the profile with a
+#query of its own, and bulk_create() sends nothing, leaving users without one. provision_users()
+#writes users, profiles and agents with one bulk insert per table instead.
+#
+#Postgres hands back the ids of bulk inserted rows, SQLite doesn't (before Django 4.0), there the
+#rows are matched back on a unique column so the foreign keys of the next insert point at them.
+
+#values per IN (...) lookup, under SQLite's 999 bound parameters
+LOOKUP_BATCH_SIZE = 500
+
+
+def read_back_ids(model, objs, field):
+    """Set the primary key of bulk created objs that came back without one, matching on unique field."""
+    missing = [obj for obj in objs if obj.pk is None]
+    values = [getattr(obj, field) for obj in missing]
+    ids = {}
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        ids.update(
+            model._default_manager.filter(**{f"{field}__in": values[start:start + LOOKUP_BATCH_SIZE]})
+            .values_list(field, "pk")
+        )
+    for obj in missing:
+        obj.pk = ids[getattr(obj, field)]
+
+
+def read_back_inserted_ids(model, objs):
+    """Set the primary keys of objs bulk created just now, in the current transaction, that came back
+    without one and have no unique column to match on.
+
+    SQLite only: its AUTOINCREMENT ids only ever grow and the transaction holds the write lock from
+    its first insert, so bulk_create gave them the highest ids of the table, in order.
+    """
+    missing = [obj for obj in objs if obj.pk is None]
+    if not missing:
+        return
+    last = model._default_manager.aggregate(last=Max("pk"))["last"]
+    for pk, obj in zip(range(last - len(missing) + 1, last + 1), missing):
+        obj.pk = pk
+
+
+def provision_users(users, agent_organizations=None, batch_size=500):
+    """Create unsaved users, a profile for each and, for usernames in agent_organizations
+    ({username: organization profile}), an Agent of that organization.
+
+    Returns (users, profiles, agents), all with their primary keys set, in the order of users.
+    Passwords are left as they are on the users, hash them once with make_password and share
+    the hash or call set_unusable_password(), hashing per user is what makes bulk creation slow.
+    """
+    users = list(users)
+    agent_organizations = agent_organizations or {}
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=batch_size)
+        read_back_ids(User, users, "username")
+
+        profiles = [UserProfile(user=user) for user in users]
+        UserProfile.objects.bulk_create(profiles, batch_size=batch_size)
+        read_back_ids(UserProfile, profiles, "user_id")
+
+        agents = [
+            Agent(user=user, organization=agent_organizations[user.username])
+            for user in users
+            if user.username in agent_organizations
+        ]
+        Agent.objects.bulk_create(agents, batch_size=batch_size)
+        read_back_ids(Agent, agents, "user_id")
+        #bulk_create sends no post_save, the agent pickers are rebuilt on their next use and the
+        #agent lists are sent in full again
+        if agents:
+            organization_ids = {agent.organization_id for agent in agents}
+            invalidate_autocomplete(*organization_ids)
+            touch_organizations(*organization_ids)
+    return users, profiles, agents
+
+
+def users_without_profiles(batch_size=1000):
+    """Yield the ids of users that have no profile, a batch at a time in id order."""
+    last_id = 0
+    while True:
+        batch = list(
+            User.objects.filter(pk__gt=last_id, userprofile__isnull=True)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def backfill_profiles(user_ids):
+    """Create the missing profiles of user_ids, ignoring any that were created in the meantime."""
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id) for user_id in user_ids], ignore_conflicts=True
+    )
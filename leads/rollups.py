@@ -0,0 +1,358 @@
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+#daily per organization lead counts for the sales dashboard. Each DailyLeadRollup row counts, for one
+#day, agent and category, the leads created that day and the leads converted that day, so the
+#dashboard sums a few hundred rollup rows instead of aggregating over the leads table.
+#
+#the rows describe the leads as they are now: a lead counts under its current agent and category on
+#the day it was added, and as converted on the day it moved into the "Converted" category. That keeps
+#them exactly rebuildable from the leads (rebuild_rollups, the rebuild_lead_rollups command), while
+#saves and deletes adjust them as they happen with an UPDATE per changed row.
+#
+#writes that skip the lead signals keep them right too: bulk_create adds its leads in one go,
+#bulk_update moves them in one go, the assignment engine rebuilds the days it touched,
+#deleting an agent or category rebuilds the days it was counted on, and renaming a category into or
+#out of "Converted" restamps its leads and rebuilds their days.
+
+CONVERTED_CATEGORY_NAME = "Converted"
+
+#the lead fields the rollups depend on, date_added never changes but is part of the key
+STATE_FIELDS = ("date_added", "agent_id", "category_id", "converted_at")
+#the same fields by name, as they may appear in save(update_fields=...)
+STATE_FIELD_NAMES = ("date_added", "agent", "category", "converted_at")
+LeadState = namedtuple("LeadState", STATE_FIELDS)
+#agent_key and category_key for leads without one, NULLs would slip past the unique constraint
+NONE_KEY = 0
+
+
+def lead_state(lead):
+    """The rollup relevant fields of a lead, None when some of them were deferred."""
+    values = lead.__dict__
+    if any(name not in values for name in STATE_FIELDS):
+        return None
+    return LeadState(*(values[name] for name in STATE_FIELDS))
+
+
+def saved_state(lead, update_fields=None):
+    """The state of a lead in the database once save(update_fields=update_fields) has run."""
+    new = lead_state(lead)
+    old = getattr(lead, "_loaded_state", None)
+    if new is None or old is None or update_fields is None:
+        return new
+    #fields left out of update_fields kept their old value in the database
+    return LeadState(*(
+        value if name in update_fields or attname in update_fields else old_value
+        for name, attname, value, old_value in zip(STATE_FIELD_NAMES, STATE_FIELDS, new, old)
+    ))
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def lead_counts(state, sign=1):
+    """{(day, agent_key, category_key): [created, converted]} a lead in state adds to the rollups."""
+    counts = defaultdict(lambda: [0, 0])
+    if state is None:
+        return counts
+    date_added, agent_id, category_id, converted_at = state
+    keys = (agent_id or NONE_KEY, category_id or NONE_KEY)
+    if date_added is not None:
+        counts[(timezone.localdate(date_added),) + keys][0] += sign
+    if converted_at is not None:
+        counts[(timezone.localdate(converted_at),) + keys][1] += sign
+    return counts
+
+
+def state_changes(old, new):
+    counts = lead_counts(new)
+    for key, (created, converted) in lead_counts(old, -1).items():
+        counts[key][0] += created
+        counts[key][1] += converted
+    return counts
+
+
+def add_counts(organization_id, counts):
+    """Add {(day, agent_key, category_key): [created, converted]} to the rollup rows."""
+    from .models import DailyLeadRollup
+
+    for (day, agent_key, category_key), (created, converted) in counts.items():
+        if not created and not converted:
+            continue
+        rows = DailyLeadRollup.objects.filter(
+            organization_id=organization_id, day=day, agent_key=agent_key, category_key=category_key
+        )
+        if rows.update(created=F("created") + created, converted=F("converted") + converted):
+            continue
+        #nothing to take away from a row that isn't there, and no row is created while the
+        #organization is being deleted
+        if created <= 0 and converted <= 0:
+            continue
+        try:
+            with transaction.atomic():
+                DailyLeadRollup.objects.create(
+                    organization_id=organization_id,
+                    day=day,
+                    agent_key=agent_key,
+                    category_key=category_key,
+                    created=max(created, 0),
+                    converted=max(converted, 0),
+                )
+        except IntegrityError:
+            #another request created the row first
+            rows.update(created=F("created") + created, converted=F("converted") + converted)
+
+
+def is_converted(category):
+    return category is not None and category.name == CONVERTED_CATEGORY_NAME
+
+
+def track_conversion(lead):
+    """Stamp converted_at when a lead moves into the Converted category, clear it when it moves out.
+
+    Called by Lead.save(), returns whether converted_at changed.
+    """
+    old = getattr(lead, "_loaded_state", None)
+    if old is None and not lead._state.adding:
+        #read with deferred fields or built by hand, there's no telling what changed
+        return False
+    previous_category_id = old.category_id if old else None
+    if lead.category_id == previous_category_id:
+        return False
+    #the forms set the category instance, so this doesn't query
+    lead.converted_at = timezone.now() if is_converted(lead.category) else None
+    return True
+
+
+def track_bulk_conversions(leads):
+    """converted_at for leads about to be bulk created or bulk updated, one query for the whole batch."""
+    from .models import Category
+
+    category_ids = {lead.category_id for lead in leads if lead.category_id}
+    converted = set()
+    if category_ids:
+        converted = set(
+            Category.objects.filter(pk__in=category_ids, name=CONVERTED_CATEGORY_NAME).values_list("pk", flat=True)
+        )
+    now = timezone.now()
+    for lead in leads:
+        old = getattr(lead, "_loaded_state", None)
+        if old is None:
+            #a new lead
+            if lead.category_id in converted and lead.converted_at is None:
+                lead.converted_at = now
+        elif lead.category_id != old.category_id:
+            lead.converted_at = now if lead.category_id in converted else None
+
+
+def category_saved(category, created):
+    """Restamp the leads of a category renamed into or out of "Converted", they were converted or unconverted with it.
+
+    The leads change with one UPDATE that sends no lead signals, then the days they were counted
+    as converted on, before and after, are rebuilt.
+    """
+    from .models import Lead
+
+    old_name = getattr(category, "_loaded_name", None)
+    category._loaded_name = category.name
+    if created or old_name is None or (old_name == CONVERTED_CATEGORY_NAME) == is_converted(category):
+        return
+    leads = Lead.objects.filter(category=category)
+    now = timezone.now()
+    with transaction.atomic():
+        days = leads.aggregate(start=Min("converted_at"), end=Max("converted_at"))
+        if is_converted(category):
+            changed = leads.filter(converted_at__isnull=True).update(converted_at=now, updated_at=now)
+        else:
+            changed = leads.filter(converted_at__isnull=False).update(converted_at=None, updated_at=now)
+        if not changed:
+            return
+        stamped = [timezone.localdate(stamp) for stamp in (days["start"], days["end"], now) if stamp is not None]
+        rebuild_rollups(category.organization_id, min(stamped), max(stamped))
+
+
+def lead_saved(lead, created, update_fields=None):
+    new = saved_state(lead, update_fields)
+    old = getattr(lead, "_loaded_state", None)
+    if new is None or (old is None and not created):
+        #the nightly rebuild picks these up
+        return
+    add_counts(lead.organization_id, state_changes(None if created else old, new))
+
+
+def lead_deleted(lead):
+    state = getattr(lead, "_loaded_state", None) or lead_state(lead)
+    add_counts(lead.organization_id, state_changes(state, None))
+
+
+def leads_created(leads):
+    """For bulk_create, which sends no post_save."""
+    by_organization = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for lead in leads:
+        state = lead_state(lead)
+        for key, (created, converted) in lead_counts(state).items():
+            counts = by_organization[lead.organization_id][key]
+            counts[0] += created
+            counts[1] += converted
+        lead._loaded_state = state
+    for organization_id, counts in by_organization.items():
+        add_counts(organization_id, counts)
+
+
+def leads_updated(leads, update_fields):
+    """For bulk_update, which sends no post_save either. The leads were read from the database."""
+    by_organization = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for lead in leads:
+        new = saved_state(lead, update_fields)
+        for key, (created, converted) in state_changes(lead._loaded_state, new).items():
+            counts = by_organization[lead.organization_id][key]
+            counts[0] += created
+            counts[1] += converted
+        lead._loaded_state = new
+    for organization_id, counts in by_organization.items():
+        add_counts(organization_id, counts)
+
+
+def rebuild_rollups(organization_id, start=None, end=None):
+    """Recompute the rollup rows of an organization from its leads, for the days start..end or all of them.
+
+    Returns the number of rows written.
+    """
+    from .models import DailyLeadRollup, Lead
+
+    leads = Lead.objects.filter(organization_id=organization_id)
+    created = leads
+    converted = leads.filter(converted_at__isnull=False)
+    rows = DailyLeadRollup.objects.filter(organization_id=organization_id)
+    if start is not None:
+        created = created.filter(date_added__gte=day_start(start))
+        converted = converted.filter(converted_at__gte=day_start(start))
+        rows = rows.filter(day__gte=start)
+    if end is not None:
+        created = created.filter(date_added__lt=day_start(end + timedelta(days=1)))
+        converted = converted.filter(converted_at__lt=day_start(end + timedelta(days=1)))
+        rows = rows.filter(day__lte=end)
+
+    counts = defaultdict(lambda: [0, 0])
+    #one GROUP BY per counter, the result is a row per day, agent and category however many leads there are
+    for position, queryset, field in ((0, created, "date_added"), (1, converted, "converted_at")):
+        grouped = (
+            queryset.annotate(day=TruncDate(field))
+            .values_list("day", "agent", "category")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        for day, agent_id, category_id, count in grouped:
+            counts[day, agent_id or NONE_KEY, category_id or NONE_KEY][position] += count
+
+    with transaction.atomic():
+        rows.delete()
+        DailyLeadRollup.objects.bulk_create(
+            [
+                DailyLeadRollup(
+                    organization_id=organization_id,
+                    day=day,
+                    agent_key=agent_key,
+                    category_key=category_key,
+                    created=created_count,
+                    converted=converted_count,
+                )
+                for (day, agent_key, category_key), (created_count, converted_count) in counts.items()
+            ],
+            batch_size=1000,
+        )
+    return len(counts)
+
+
+def rebuild_rollups_matching(organization_id, **lookup):
+    """Rebuild the days that have rollup rows matching lookup, e.g. agent_key=0 once unassigned leads got an agent."""
+    from .models import DailyLeadRollup
+
+    days = DailyLeadRollup.objects.filter(organization_id=organization_id, **lookup).aggregate(
+        start=Min("day"), end=Max("day")
+    )
+    if days["start"] is None:
+        return 0
+    return rebuild_rollups(organization_id, days["start"], days["end"])
+
+
+def key_deleted(organization_id, **lookup):
+    """An agent or category was deleted and its leads moved to none with an UPDATE that sends no signals.
+
+    Rebuilt after the commit, when a whole organization is deleted its rows are gone by then.
+    """
+    transaction.on_commit(lambda: rebuild_rollups_matching(organization_id, **lookup))
+
+
+def agent_label(first_name, last_name, username):
+    return f"{first_name} {last_name}".strip() or username
+
+
+def conversion_rate(created, converted):
+    return round(100.0 * converted / created, 1) if created else None
+
+
+def summarize(rows, names):
+    return [
+        {
+            "name": names.get(key, "Unknown") if key else None,
+            "created": created,
+            "converted": converted,
+            "conversion_rate": conversion_rate(created, converted),
+        }
+        for key, created, converted in rows
+    ]
+
+
+def dashboard(organization, days):
+    """The dashboard numbers of the last days days, read from the rollups alone.
+
+    Three aggregates over at most days x agents x categories rows, plus the agent and category
+    names, however many leads the organization has.
+    """
+    from .models import Agent, Category, DailyLeadRollup
+
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    rows = DailyLeadRollup.objects.filter(organization=organization, day__gte=start, day__lte=end)
+    sums = {"created_sum": Sum("created"), "converted_sum": Sum("converted")}
+
+    per_day = {
+        day: (created, converted)
+        for day, created, converted in rows.values_list("day").annotate(**sums).order_by()
+    }
+    daily = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        created, converted = per_day.get(day, (0, 0))
+        daily.append({"day": day, "created": created, "converted": converted})
+
+    agent_names = {
+        pk: agent_label(first_name, last_name, username)
+        for pk, first_name, last_name, username in Agent.objects.filter(organization=organization).values_list(
+            "pk", "user__first_name", "user__last_name", "user__username"
+        )
+    }
+    category_names = dict(Category.objects.filter(organization=organization).values_list("pk", "name"))
+    agents = rows.values_list("agent_key").annotate(**sums).order_by("-created_sum", "agent_key")
+    categories = rows.values_list("category_key").annotate(**sums).order_by("-created_sum", "category_key")
+
+    created = sum(day["created"] for day in daily)
+    converted = sum(day["converted"] for day in daily)
+    return {
+        "start": start,
+        "end": end,
+        "created": created,
+        "converted": converted,
+        "conversion_rate": conversion_rate(created, converted),
+        "daily": daily,
+        "agents": summarize(agents, agent_names),
+        "categories": summarize(categories, category_names),
+    }
@@ -0,0 +1,93 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+
+
+#full text search over leads, backed by the index the 0014_lead_search migration maintains:
+#a GIN indexed tsvector column on postgres and an fts5 shadow table on sqlite.
+#every search term is matched as a prefix, so "jo smi" finds "John Smith"
+
+SEARCH_FIELDS = ("first_name", "last_name", "email", "phone_number", "description")
+
+#letters and digits only, which keeps the terms safe to put inside tsquery and fts5 syntax.
+#the indexed text is split the same way, by fts5's tokenizer on sqlite and by the trigger of the
+#0021_lead_search_split_terms migration on postgres
+TERM_RE = re.compile(r"[^\W_]+")
+MAX_TERMS = 8
+
+
+#sqlite can't alter most columns in place, so a migration that changes leads_lead rebuilds the table
+#and the triggers keeping leads_lead_fts in sync go with the old one. Such migrations end with
+#migrations.RunPython(install_sqlite_search_triggers, migrations.RunPython.noop)
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS leads_lead_fts_insert AFTER INSERT ON leads_lead BEGIN
+        INSERT INTO leads_lead_fts(rowid, first_name, last_name, email, phone_number, description)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS leads_lead_fts_delete AFTER DELETE ON leads_lead BEGIN
+        INSERT INTO leads_lead_fts(leads_lead_fts, rowid, first_name, last_name, email, phone_number, description)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS leads_lead_fts_update AFTER UPDATE OF first_name, last_name, email, phone_number, description ON leads_lead BEGIN
+        INSERT INTO leads_lead_fts(leads_lead_fts, rowid, first_name, last_name, email, phone_number, description)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number, old.description);
+        INSERT INTO leads_lead_fts(rowid, first_name, last_name, email, phone_number, description)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number, new.description);
+    END
+    """,
+    "INSERT INTO leads_lead_fts(leads_lead_fts) VALUES ('rebuild')",
+]
+
+
+def install_sqlite_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in SQLITE_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+def search_terms(query):
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def search_leads(queryset, query):
+    """Filter a Lead queryset down to the leads matching query, best match first.
+
+    Each result has a rank attribute, higher is better.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        queryset = queryset.extra(
+            select={"rank": "ts_rank(leads_lead.search_vector, to_tsquery('simple', %s))"},
+            select_params=[tsquery],
+            where=["leads_lead.search_vector @@ to_tsquery('simple', %s)"],
+            params=[tsquery],
+        )
+    elif vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        queryset = queryset.extra(
+            #bm25 is lower for better matches, the column weights favour names over the description
+            select={"rank": "-bm25(leads_lead_fts, 10.0, 10.0, 5.0, 5.0, 1.0)"},
+            tables=["leads_lead_fts"],
+            where=["leads_lead_fts.rowid = leads_lead.id", "leads_lead_fts MATCH %s"],
+            params=[match],
+        )
+    else:
+        #no search index on this database, every term has to appear in one of the fields
+        for term in terms:
+            matches = Q()
+            for field in SEARCH_FIELDS:
+                matches |= Q(**{f"{field}__icontains": term})
+            queryset = queryset.filter(matches)
+        queryset = queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+    return queryset.order_by("-rank", "-id")
@@ -0,0 +1,126 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import Category, Lead, User
+from .provisioning import provision_users
+
+
+FIRST_NAMES = ("James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth")
+LAST_NAMES = ("Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Lopez", "Wilson")
+CATEGORY_NAMES = ("New", "Contacted", "Converted", "Unconverted")
+
+
+def organization_weights(organizations, skew):
+    """Zipf like share of the leads per organization: skew 0 is uniform, higher skew piles
+    more of the leads onto the first organizations like our real customer base."""
+    weights = [1 / (rank + 1) ** skew for rank in range(organizations)]
+    total = sum(weights)
+    return [weight / total for weight in weights]
+
+
+class SyntheticDataGenerator:
+    """Create organizations, agents, categories and leads with bulk_create.
+
+    Every user gets the same password so the benchmark can log in as any of them,
+    and every username starts with prefix so generated data can be told apart.
+    """
+
+    def __init__(self, organizations=10, agents=5, leads=10000, skew=1.0, unassigned=0.2,
+                 uncategorized=0.3, batch_size=5000, prefix="bench", password="password", seed=None):
+        self.organizations = organizations
+        self.agents = agents
+        self.leads = leads
+        self.skew = skew
+        self.unassigned = unassigned
+        self.uncategorized = uncategorized
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.password = password
+        self.random = random.Random(seed)
+
+    def generate(self):
+        #hashing once and sharing the hash, a PBKDF2 hash per user would dominate the run
+        password = make_password(self.password)
+        with transaction.atomic():
+            organizations = self.create_organizations(password)
+            agents = self.create_agents(organizations, password)
+            categories = self.create_categories(organizations)
+        lead_count = self.create_leads(organizations, agents, categories)
+        return {
+            "organizations": len(organizations),
+            "agents": sum(len(org_agents) for org_agents in agents.values()),
+            "categories": sum(len(org_categories) for org_categories in categories.values()),
+            "leads": lead_count,
+        }
+
+    def build_users(self, usernames, password, **fields):
+        return [User(username=username, password=password, email=f"{username}@example.com", **fields) for username in usernames]
+
+    def create_organizations(self, password):
+        #in order, so organization 0 is the biggest one
+        usernames = [f"{self.prefix}-org{i}" for i in range(self.organizations)]
+        _, profiles, _ = provision_users(self.build_users(usernames, password), batch_size=self.batch_size)
+        return profiles
+
+    def create_agents(self, organizations, password):
+        usernames = {
+            f"{organization.user.username}-agent{j}": organization
+            for organization in organizations
+            for j in range(self.agents)
+        }
+        users = self.build_users(usernames, password, is_organizor=False, is_agent=True)
+        _, _, created = provision_users(users, usernames, batch_size=self.batch_size)
+        agents = {organization.pk: [] for organization in organizations}
+        for agent in created:
+            agents[agent.organization_id].append(agent)
+        return agents
+
+    def create_categories(self, organizations):
+        Category.objects.bulk_create(
+            [Category(name=name, organization=organization) for organization in organizations for name in CATEGORY_NAMES],
+            batch_size=self.batch_size,
+        )
+        categories = {organization.pk: [] for organization in organizations}
+        for category in Category.objects.filter(organization__in=organizations):
+            categories[category.organization_id].append(category)
+        return categories
+
+    def create_leads(self, organizations, agents, categories):
+        weights = organization_weights(len(organizations), self.skew)
+        counts = [int(self.leads * weight) for weight in weights]
+        #rounding down loses a few leads, the biggest organization gets them
+        counts[0] += self.leads - sum(counts)
+
+        created = 0
+        batch = []
+        for organization, count in zip(organizations, counts):
+            for _ in range(count):
+                batch.append(self.build_lead(organization, agents[organization.pk], categories[organization.pk], created))
+                created += 1
+                if len(batch) >= self.batch_size:
+                    Lead.objects.bulk_create(batch)
+                    batch = []
+        if batch:
+            Lead.objects.bulk_create(batch)
+        return created
+
+    def build_lead(self, organization, agents, categories, number):
+        agent = None
+        if agents and self.random.random() >= self.unassigned:
+            agent = self.random.choice(agents)
+        category = None
+        if categories and self.random.random() >= self.uncategorized:
+            category = self.random.choice(categories)
+        return Lead(
+            first_name=self.random.choice(FIRST_NAMES),
+            last_name=self.random.choice(LAST_NAMES),
+            age=self.random.randint(18, 80),
+            organization=organization,
+            agent=agent,
+            category=category,
+            description="Synthetic lead generated for benchmarking.",
+            phone_number=f"555{self.random.randint(0, 9999999):07d}",
+            email=f"{self.prefix}-lead{number}@example.com",
+        )
@@ -0,0 +1,12 @@
+from django import template
+
+from leads.cards import render_cards
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def cards(objects, template_name, context_name):
+    """{% cards leads "leads/lead_card.html" "lead" %} renders the cards through the fragment cache."""
+    return render_cards(objects, template_name, context_name)
@@ -0,0 +1,96 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+class QueryCountAssertionsMixin:
+    """Query count assertions for TestCase subclasses.
+
+    assertNumQueries pins how many queries a view runs for the data in the test,
+    assertConstantQueries also proves that number doesn't grow with the data,
+    which is what catches an N+1 that a small fixture would hide.
+    """
+
+    def capture_queries(self, func, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as context:
+            func()
+        return context.captured_queries
+
+    def assertConstantQueries(self, func, grow, num=None, using=DEFAULT_DB_ALIAS):
+        """Run func, call grow() to add more rows, run func again and check the query count didn't change.
+
+        If num is given both runs must also run exactly that many queries.
+        """
+        before = self.capture_queries(func, using)
+        grow()
+        after = self.capture_queries(func, using)
+        if len(before) != len(after):
+            extra = "\n".join(query["sql"] for query in after[len(before):])
+            self.fail(
+                f"Query count went from {len(before)} to {len(after)} as the data grew, "
+                f"probably an N+1. Extra queries:\n{extra}"
+            )
+        if num is not None:
+            executed = "\n".join(query["sql"] for query in after)
+            self.assertEqual(len(after), num, f"{len(after)} queries executed, {num} expected:\n{executed}")
+
+
+class OrganizationTestMixin:
+    """An organizor, its organization and one agent for TestCase subclasses, set up before each test.
+
+    organizor_fields and agent_fields hold extra fields for their users. add_agent(), add_category() and add_lead()
+    add more to the organization, or to another one from add_organization().
+    """
+
+    organizor_fields = {}
+    agent_fields = {}
+
+    def setUp(self):
+        super(OrganizationTestMixin, self).setUp()
+        self.organizor, self.organization = self.add_organization("organizor", **self.organizor_fields)
+        self.agent = self.add_agent("agent", **self.agent_fields)
+
+    def add_organization(self, username, **fields):
+        """A new organizor and its organization, the profile is created by a post_save signal."""
+        from .models import User
+
+        organizor = User.objects.create_user(username=username, password="pass", **fields)
+        return organizor, organizor.userprofile
+
+    def add_agent(self, username, organization=None, **fields):
+        from .models import Agent, User
+
+        user = User.objects.create_user(username=username, password="pass", is_organizor=False, is_agent=True, **fields)
+        return Agent.objects.create(user=user, organization=organization or self.organization)
+
+    def add_category(self, name, organization=None):
+        from .models import Category
+
+        return Category.objects.create(name=name, organization=organization or self.organization)
+
+    def add_lead(self, organization=None, **fields):
+        from .models import Lead
+
+        fields = {"first_name": "Joe", "last_name": "Soap", **fields}
+        return Lead.objects.create(organization=organization or self.organization, **fields)
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """The default runner with the query budgets enforced, see leads/budgets.py.
+
+    A request the test client makes that goes over its view's query budget, or repeats a query like
+    an N+1 does, raises QueryBudgetExceeded out of the client call and fails the test with the stacks
+    of the repeated queries. SQL time budgets aren't checked, they'd fail on a slow machine; tests of
+    them turn QUERY_BUDGETS_CHECK_TIME back on.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super(QueryBudgetTestRunner, self).setup_test_environment(**kwargs)
+        self.query_budgets = override_settings(
+            QUERY_BUDGETS_ENABLED=True, QUERY_BUDGETS_STRICT=True, QUERY_BUDGETS_CHECK_TIME=False
+        )
+        self.query_budgets.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.query_budgets.disable()
+        super(QueryBudgetTestRunner, self).teardown_test_environment(**kwargs)
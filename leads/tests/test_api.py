@@ -0,0 +1,156 @@
+import json
+
+from django.shortcuts import reverse
+from django.test import TestCase
+
+from leads.counters import category_counts
+from leads.models import DailyLeadRollup, Lead, LeadEvent
+from leads.rollups import rebuild_rollups
+from leads.testing import OrganizationTestMixin, QueryCountAssertionsMixin
+
+
+class LeadApiTest(OrganizationTestMixin, QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        super(LeadApiTest, self).setUp()
+        self.contacted = self.add_category("Contacted")
+        self.converted = self.add_category("Converted")
+        self.lead = self.add_lead(agent=self.agent)
+        other = self.add_organization("other")[1]
+        self.other_lead = self.add_lead(other, first_name="Ann", last_name="Other")
+        self.client.force_login(self.organizor)
+
+    def send(self, method, name, batch, **params):
+        url = reverse(name)
+        if params:
+            url += "?" + "&".join(f"{key}={value}" for key, value in params.items())
+        return getattr(self.client, method)(url, json.dumps(batch), content_type="application/json")
+
+    def row(self, **fields):
+        return {
+            "first_name": "New", "last_name": "Lead", "age": 30, "email": "new@example.com",
+            "phone_number": "555 0100", "description": "From the API", **fields,
+        }
+
+    def test_list_pages_with_a_cursor_and_sparse_fields(self):
+        for _ in range(4):
+            self.add_lead()
+        seen = []
+        cursor = ""
+        while True:
+            response = self.client.get(reverse("leads-api:lead-list"), {"fields": "first_name", "limit": 2, "cursor": cursor})
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertTrue(all(list(row) == ["first_name"] for row in body["results"]))
+            seen.extend(body["results"])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        #the other organization's lead is never listed
+        self.assertEqual(len(seen), 5)
+
+        response = self.client.get(reverse("leads-api:lead-list"), {"fields": "id,salary"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "Unknown fields: salary."})
+
+    def test_list_reads_a_constant_number_of_queries(self):
+        get = lambda: self.assertEqual(self.client.get(reverse("leads-api:lead-list")).status_code, 200)
+        #session, user, tenant and the page
+        self.assertConstantQueries(get, lambda: [self.add_lead(agent=self.agent) for _ in range(5)], num=4)
+
+    def test_agents_only_see_and_recategorize_their_own_leads(self):
+        unassigned = self.add_lead()
+        self.client.force_login(self.agent.user)
+        ids = [row["id"] for row in self.client.get(reverse("leads-api:lead-list")).json()["results"]]
+        self.assertEqual(ids, [self.lead.pk])
+        self.assertEqual(self.client.get(reverse("leads-api:lead-detail", args=[unassigned.pk])).status_code, 404)
+
+        response = self.send("patch", "leads-api:lead-list", [{"id": self.lead.pk, "category": self.contacted.pk}])
+        self.assertEqual(response.json()["results"][0]["category"], self.contacted.pk)
+        self.assertEqual(self.send("patch", "leads-api:lead-list", [{"id": self.lead.pk, "first_name": "Jim"}]).status_code, 403)
+        self.assertEqual(self.send("post", "leads-api:lead-list", [self.row()]).status_code, 403)
+        self.assertEqual(self.send("delete", "leads-api:lead-list", [self.lead.pk]).status_code, 403)
+
+    def test_batch_create_in_one_go(self):
+        create = lambda batch: self.send("post", "leads-api:lead-list", batch, fields="id,email,category")
+        #the first batch also creates today's rollup rows
+        create([self.row(category=self.converted.pk), self.row()])
+        small = self.capture_queries(lambda: create([self.row(category=self.converted.pk), self.row()]))
+        batch = [self.row(email=f"new{i}@example.com") for i in range(20)]
+        batch[0]["category"] = self.converted.pk
+        with self.assertNumQueries(len(small)):
+            response = create(batch)
+        self.assertEqual(response.status_code, 201)
+        results = response.json()["results"]
+        self.assertEqual([row["email"] for row in results], [row["email"] for row in batch])
+        created = Lead.objects.get(pk=results[0]["id"])
+        self.assertEqual((created.category, created.email_normalized), (self.converted, "new0@example.com"))
+        self.assertIsNotNone(created.converted_at)
+        self.assertEqual(Lead.objects.filter(organization=self.organization).count(), 25)
+
+    def test_a_bad_row_writes_nothing(self):
+        other_category = self.add_category("Theirs", self.other_lead.organization)
+        batch = [self.row(), self.row(email="not an email"), self.row(category=other_category.pk)]
+        response = self.send("post", "leads-api:lead-list", batch)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()["errors"]), {"1"})
+        self.assertEqual(Lead.objects.count(), 2)
+
+        response = self.send("post", "leads-api:lead-list", [self.row(), self.row(category=other_category.pk)])
+        self.assertEqual(response.json(), {"errors": {"1": {"category": [f"No category {other_category.pk} in this organization."]}}})
+        response = self.send("patch", "leads-api:lead-list", [{"id": self.other_lead.pk, "first_name": "Jim"}])
+        self.assertEqual(response.json(), {"errors": {"0": {"id": ["Not found."]}}})
+        self.assertEqual(Lead.objects.count(), 2)
+
+    def test_batch_update_keeps_the_event_log_and_rollups(self):
+        leads = [self.lead] + [self.add_lead() for _ in range(3)]
+        before = Lead.objects.get(pk=self.lead.pk).updated_at
+        self.assertNotIn(self.converted.pk, category_counts(self.organization))
+        batch = [{"id": lead.pk, "category": self.converted.pk} for lead in leads]
+        batch[1]["email"] = "JOE@Example.com"
+        response = self.send("patch", "leads-api:lead-list", batch, fields="category,email")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][1], {"category": self.converted.pk, "email": "JOE@Example.com"})
+
+        updated = Lead.objects.get(pk=leads[1].pk)
+        self.assertEqual(updated.email_normalized, "joe@example.com")
+        self.assertIsNotNone(updated.converted_at)
+        self.assertGreater(Lead.objects.get(pk=self.lead.pk).updated_at, before)
+        self.assertEqual(LeadEvent.objects.filter(new_value=self.converted.pk).count(), 4)
+        #bulk_update drops the cached category counts like save() does
+        self.assertEqual(category_counts(self.organization)[self.converted.pk], 4)
+        #the incremental counts match a rebuild from the leads
+        counts = lambda: sorted(
+            DailyLeadRollup.objects.exclude(created=0, converted=0)
+            .values_list("agent_key", "category_key", "created", "converted")
+        )
+        before = counts()
+        rebuild_rollups(self.organization.pk)
+        self.assertEqual(counts(), before)
+
+    def test_batch_delete(self):
+        extra = self.add_lead()
+        response = self.send("delete", "leads-api:lead-list", [self.lead.pk, extra.pk, self.other_lead.pk])
+        self.assertEqual(response.json(), {"errors": {"2": ["Not found."]}})
+        self.assertEqual(self.send("delete", "leads-api:lead-list", [self.lead.pk, extra.pk]).json(), {"deleted": 2})
+        self.assertFalse(Lead.objects.filter(organization=self.organization).exists())
+
+    def test_categories(self):
+        response = self.send("post", "leads-api:category-list", [{"name": "Lost"}, {"name": "Won"}])
+        self.assertEqual(response.status_code, 201)
+        lost, won = [row["id"] for row in response.json()["results"]]
+        response = self.send("patch", "leads-api:category-list", [{"id": won, "name": "Closed"}])
+        self.assertEqual(response.json()["results"][0]["name"], "Closed")
+        self.assertEqual(self.send("delete", "leads-api:category-list", [lost]).json(), {"deleted": 1})
+        names = [row["name"] for row in self.client.get(reverse("leads-api:category-list")).json()["results"]]
+        self.assertEqual(names, ["Contacted", "Converted", "Closed"])
+        self.assertEqual(self.client.get(reverse("leads-api:category-detail", args=[won])).json()["name"], "Closed")
+
+    def test_detail_and_errors_are_json(self):
+        url = reverse("leads-api:lead-detail", args=[self.lead.pk])
+        response = self.client.get(url, {"fields": "id,agent"})
+        self.assertEqual(response.json(), {"id": self.lead.pk, "agent": self.agent.pk})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get(reverse("leads-api:lead-detail", args=[self.other_lead.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("leads-api:lead-list"), {"cursor": "nonsense"}).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 401)
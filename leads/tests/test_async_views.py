@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.shortcuts import reverse
+from django.test import TransactionTestCase
+
+from leads.autocomplete import indexes
+from leads.testing import OrganizationTestMixin
+
+
+class AsyncViewsTest(OrganizationTestMixin, TransactionTestCase):
+    #the async views query from worker threads with their own connections, they only see committed rows
+    def setUp(self):
+        super(AsyncViewsTest, self).setUp()
+        cache.clear()
+        indexes.clear()
+        self.category = self.add_category("Contacted")
+        self.assigned = self.add_lead(first_name="John", last_name="Smith", agent=self.agent, category=self.category)
+        self.unassigned = self.add_lead(first_name="Jane", last_name="Doe")
+        self.client.force_login(self.organizor)
+
+    def test_lead_list_matches_the_sync_view(self):
+        sync = self.client.get(reverse("leads:lead-list"))
+        response = self.client.get(reverse("leads:lead-list-async"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["leads"]), list(sync.context["leads"]))
+        self.assertEqual(list(response.context["unassigned_leads"]), [self.unassigned])
+
+    def test_category_list_and_detail(self):
+        response = self.client.get(reverse("leads:category-list-async"))
+        self.assertEqual([category.lead_count for category in response.context["category_list"]], [1])
+        self.assertEqual(response.context["unassigned_lead_count"], 1)
+        response = self.client.get(reverse("leads:lead-detail-async", kwargs={"pk": self.assigned.pk}))
+        self.assertEqual(response.context["lead"], self.assigned)
+
+    def test_scoping_and_login_still_apply(self):
+        outsider = self.add_lead(self.add_organization("other")[1], first_name="Jim")
+        self.assertEqual(self.client.get(reverse("leads:lead-detail-async", kwargs={"pk": outsider.pk})).status_code, 404)
+
+        self.client.force_login(self.agent.user)
+        response = self.client.get(reverse("leads:autocomplete-async"), {"q": "j"})
+        self.assertEqual([result["id"] for result in response.json()["results"]], [self.assigned.pk])
+        self.assertEqual(self.client.get(reverse("leads:autocomplete-async"), {"q": "j", "type": "agent"}).status_code, 403)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("leads:lead-list-async")).status_code, 302)
@@ -0,0 +1,114 @@
+from django.core.cache import cache
+from django.shortcuts import reverse
+from django.test import TestCase, TransactionTestCase
+
+from leads.autocomplete import AGENT, LEAD, IndexCache, PrefixIndex, indexes
+from leads.models import Agent, Lead, User
+from leads.testing import OrganizationTestMixin
+
+
+class PrefixIndexTest(TestCase):
+    def test_every_term_must_prefix_a_word(self):
+        index = PrefixIndex()
+        index.add(LEAD, 1, "John Smith", {"john", "smith"})
+        index.add(LEAD, 2, "Johnny Jones", {"johnny", "jones"})
+        index.add(AGENT, 3, "John Agent", {"john", "agent"})
+        self.assertEqual(index.search("jo", LEAD), [(1, "John Smith"), (2, "Johnny Jones")])
+        self.assertEqual(index.search("jo smi", LEAD), [(1, "John Smith")])
+        self.assertEqual(index.search("john", AGENT), [(3, "John Agent")])
+
+        index.add(LEAD, 1, "Jack Smith", {"jack", "smith"})
+        index.remove(LEAD, 2)
+        self.assertEqual(index.search("jo", LEAD), [])
+        self.assertEqual(sum(len(entries) for entries in index.entries.values()), 4)
+
+    def test_agents_only_scan_their_own_leads(self):
+        index = PrefixIndex()
+        index.load([(LEAD, pk, "John Smith", {"john", "smith"}, 1) for pk in range(1000)])
+        index.add(LEAD, 1000, "John Mine", {"john", "mine"}, 2)
+        self.assertEqual(index.search("jo", LEAD, agent_id=2), [(1000, "John Mine")])
+        self.assertEqual(index.entries[LEAD, 2], [("john", 1000), ("mine", 1000)])
+        #moving a lead to another agent moves its entries
+        index.add(LEAD, 1000, "John Mine", {"john", "mine"}, 1)
+        self.assertEqual(index.search("jo", LEAD, agent_id=2), [])
+        self.assertNotIn((LEAD, 2), index.entries)
+        self.assertEqual(len(index.search("jo", LEAD, limit=5, agent_id=1)), 5)
+
+    def test_least_recently_used_organization_is_evicted(self):
+        cache.clear()
+        lru = IndexCache(max_size=2)
+        for organization_id in (1, 2, 1, 3):
+            lru.get(organization_id)
+        self.assertEqual(list(lru.indexes), [1, 3])
+
+
+class AutocompleteViewTest(OrganizationTestMixin, TestCase):
+    agent_fields = {"email": "jane@example.com", "first_name": "Jane", "last_name": "Doe"}
+
+    def setUp(self):
+        super(AutocompleteViewTest, self).setUp()
+        cache.clear()
+        indexes.clear()
+        self.add_lead(self.add_organization("other")[1], first_name="John", last_name="Other")
+        self.mine = self.add_lead(first_name="John", last_name="Mine", agent=self.agent)
+        self.unassigned = self.add_lead(first_name="John", last_name="Free")
+
+    def results(self, **params):
+        response = self.client.get(reverse("leads:autocomplete"), params)
+        return [result["id"] for result in response.json()["results"]]
+
+    def test_results_are_scoped_to_the_tenant(self):
+        self.client.force_login(self.organizor)
+        self.assertEqual(set(self.results(q="john")), {self.mine.pk, self.unassigned.pk})
+        self.assertEqual(self.results(q="jane@ex", type=AGENT), [self.agent.pk])
+        #session, user and organization, the suggestions come from the in-memory index
+        with self.assertNumQueries(3):
+            self.results(q="doe", type=AGENT)
+
+        self.client.force_login(self.agent.user)
+        self.assertEqual(self.results(q="john"), [self.mine.pk])
+        response = self.client.get(reverse("leads:autocomplete"), {"q": "jane", "type": AGENT})
+        self.assertEqual(response.status_code, 403)
+
+    def test_forms_render_only_the_selected_agent(self):
+        self.client.force_login(self.organizor)
+        response = self.client.get(reverse("leads:lead-update", kwargs={"pk": self.mine.pk}))
+        self.assertContains(response, 'value="jane@example.com"')
+        self.assertNotContains(response, "<option")
+        response = self.client.post(reverse("leads:assign-agent", kwargs={"pk": self.unassigned.pk}), {"agent": self.agent.pk})
+        self.assertEqual(response.status_code, 302)
+
+
+class AutocompleteSignalsTest(TransactionTestCase):
+    #index updates wait for the commit, so these need real transactions
+    def setUp(self):
+        cache.clear()
+        indexes.clear()
+        self.organization = User.objects.create_user(username="organizor", password="pass").userprofile
+
+    def search(self, query, kind=LEAD):
+        return [label for _, label in indexes.get(self.organization.pk).search(query, kind)]
+
+    def test_saves_and_deletes_patch_the_index(self):
+        lead = Lead.objects.create(first_name="John", last_name="Smith", organization=self.organization)
+        self.assertEqual(self.search("smith"), ["John Smith"])
+        index = indexes.get(self.organization.pk)
+
+        lead.last_name = "Jones"
+        lead.save()
+        user = User.objects.create_user(username="agent", email="a@example.com", password="pass", is_organizor=False, is_agent=True)
+        Agent.objects.create(user=user, organization=self.organization)
+        user.first_name = "Ann"
+        user.save()
+        self.assertIs(indexes.get(self.organization.pk), index)
+        self.assertEqual(self.search("jo"), ["John Jones"])
+        self.assertEqual(self.search("ann", AGENT), ["Ann <a@example.com>"])
+
+        lead.delete()
+        self.assertEqual(self.search("jo"), [])
+
+    def test_other_workers_rebuild_after_a_change(self):
+        worker = IndexCache()
+        worker.get(self.organization.pk)
+        Lead.objects.create(first_name="John", last_name="Smith", organization=self.organization)
+        self.assertEqual(len(worker.get(self.organization.pk)), 1)
@@ -0,0 +1,56 @@
+import threading
+
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase
+
+from leads.benchmarks import ViewBenchmark, percentile
+from leads.loadtest import load_test, running_server
+from leads.models import Lead, User
+from leads.synthetic import SyntheticDataGenerator
+
+
+class SyntheticDataGeneratorTest(TestCase):
+    def test_generates_skewed_tenants_with_profiles(self):
+        summary = SyntheticDataGenerator(organizations=3, agents=2, leads=300, skew=2, seed=1).generate()
+        self.assertEqual(summary, {"organizations": 3, "agents": 6, "categories": 12, "leads": 300})
+        #every bulk created user still gets a profile
+        self.assertFalse(User.objects.filter(userprofile__isnull=True).exists())
+        biggest = Lead.objects.filter(organization__user__username="bench-org0").count()
+        smallest = Lead.objects.filter(organization__user__username="bench-org2").count()
+        self.assertGreater(biggest, smallest)
+        #agents only ever get leads of their own organization
+        self.assertFalse(Lead.objects.filter(agent__isnull=False).exclude(agent__organization=F("organization")).exists())
+
+
+class ViewBenchmarkTest(TestCase):
+    def test_report_covers_every_view(self):
+        SyntheticDataGenerator(organizations=2, agents=2, leads=50, seed=1).generate()
+        report = ViewBenchmark(iterations=2, warmup=0).run()
+        self.assertEqual(report["meta"]["organization"], "bench-org0")
+        self.assertEqual(set(report["views"]), {
+            "lead_list", "agent_lead_list", "lead_detail", "category_list", "agent_list", "lead_create", "assign_agent",
+        })
+        for name, result in report["views"].items():
+            self.assertTrue(set(result["status_codes"]) <= {200, 302}, name)
+        #the write scenarios are rolled back
+        self.assertEqual(Lead.objects.count(), 50)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 50), 3)
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 100), 5)
+
+
+class LoadTestTest(SimpleTestCase):
+    def test_worker_threads_are_reused_across_requests(self):
+        threads = set()
+
+        def app(environ, start_response):
+            threads.add(threading.current_thread().name)
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return [b"ok"]
+
+        with running_server(app, threads=2) as base_url:
+            summary = load_test(base_url, ["/"], requests=20, concurrency=4, warmup=0)
+        self.assertEqual((summary["requests"], summary["status_codes"]), (20, [200]))
+        self.assertNotIn("queries", summary)
+        self.assertLessEqual(len(threads), 2)
@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.shortcuts import reverse
+from django.test import TestCase, override_settings
+
+from agents.views import AgentListView
+from leads.autocomplete import indexes
+from leads.budgets import QueryBudgetExceeded
+from leads.models import Agent, Category, Lead, User
+from leads.synthetic import SyntheticDataGenerator
+from leads.views import LeadListView
+
+
+@override_settings(QUERY_BUDGETS_ENABLED=True, QUERY_BUDGETS_STRICT=True, QUERY_BUDGETS_CHECK_TIME=False)
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        SyntheticDataGenerator(organizations=2, agents=3, leads=200, seed=1).generate()
+        cls.organizor = User.objects.get(username="bench-org0")
+        cls.agent = Agent.objects.filter(organization=cls.organizor.userprofile).select_related("user").first()
+        cls.category = Category.objects.filter(organization=cls.organizor.userprofile).first()
+        cls.lead = Lead.objects.filter(agent=cls.agent).first()
+
+    def setUp(self):
+        cache.clear()
+        indexes.clear()
+
+    def get(self, name, data=None, **kwargs):
+        response = self.client.get(reverse(name, kwargs=kwargs), data)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+    def test_views_stay_within_their_budgets(self):
+        #organizors and agents, the cards are rendered cold and then read from the cache
+        pages = [
+            ("leads:lead-list", {}, {}),
+            ("leads:lead-detail", {}, {"pk": self.lead.pk}),
+            ("leads:lead-search", {"q": "smith"}, {}),
+            ("leads:autocomplete", {"q": "jo"}, {}),
+            ("leads:lead-export", {"format": "json"}, {}),
+            ("leads:category-list", {}, {}),
+            ("leads:category-detail", {}, {"pk": self.category.pk}),
+        ]
+        organizor_pages = [
+            ("leads:dashboard", {}, {}),
+            ("agents:agent-list", {}, {}),
+            ("agents:agent-detail", {}, {"pk": self.agent.pk}),
+        ]
+        for user, user_pages in [(self.organizor, pages + organizor_pages), (self.agent.user, pages)]:
+            self.client.force_login(user)
+            for _ in range(2):
+                for name, data, kwargs in user_pages:
+                    with self.subTest(user=user.username, view=name):
+                        self.assertEqual(self.get(name, data, **kwargs).status_code, 200)
+
+    def test_a_view_over_its_budget_fails(self):
+        self.client.force_login(self.organizor)
+        with mock.patch.object(LeadListView, "query_budget", 2):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "queries, the budget is 2"):
+                self.get("leads:lead-list")
+        with mock.patch.object(AgentListView, "sql_time_budget", -1):
+            #off by default in tests, the time depends on the machine
+            self.assertEqual(self.get("agents:agent-list").status_code, 200)
+            with override_settings(QUERY_BUDGETS_CHECK_TIME=True):
+                with self.assertRaisesMessage(QueryBudgetExceeded, "ms of SQL, the budget is -1 ms"):
+                    self.get("agents:agent-list")
+
+    def test_repeated_queries_point_at_the_template_line(self):
+        self.client.force_login(self.organizor)
+        #without its select_related every agent card looks its user up, the same query as the request user
+        with mock.patch.object(AgentListView, "get_queryset", lambda view: Agent.objects.for_tenant(view.request.tenant)):
+            with self.assertRaises(QueryBudgetExceeded) as raised:
+                self.get("agents:agent-list")
+        message = str(raised.exception)
+        self.assertIn("the same query ran 4 times, at most 2 allowed (N+1?)", message)
+        self.assertIn("from template agents/agent_card.html:10", message)
+        self.assertIn("leads/cards.py", message)
+
+    @override_settings(QUERY_BUDGETS_STRICT=False)
+    def test_outside_strict_mode_it_only_logs(self):
+        self.client.force_login(self.organizor)
+        with mock.patch.object(LeadListView, "query_budget", 2):
+            with self.assertLogs("leads.budgets", "WARNING") as logs:
+                self.assertEqual(self.get("leads:lead-list").status_code, 200)
+        self.assertIn("LeadListView (GET /leads/) went over its query budget", logs.output[0])
@@ -0,0 +1,77 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.shortcuts import reverse
+from django.test import TestCase
+
+from leads.assignment import AssignmentEngine
+from leads.cards import card_cache_key, render_cards
+from leads.models import Lead
+from leads.testing import OrganizationTestMixin
+
+
+class CardCacheTest(OrganizationTestMixin, TestCase):
+    def setUp(self):
+        super(CardCacheTest, self).setUp()
+        cache.clear()
+        self.lead = self.add_lead()
+
+    def render(self, leads):
+        return render_cards(leads, "leads/lead_card.html", "lead")
+
+    def test_cached_cards_are_not_rendered_again(self):
+        first = self.render([self.lead])
+        self.assertIn("Joe Soap", first)
+        with mock.patch("leads.cards.get_template") as get_template:
+            self.assertEqual(self.render([self.lead]), first)
+        get_template.assert_not_called()
+
+    def test_a_saved_lead_is_rendered_again(self):
+        self.render([self.lead])
+        old_key = card_cache_key("leads/lead_card.html", self.lead)
+        self.lead.first_name = "Jim"
+        self.lead.save(update_fields=["first_name"])
+        self.lead.refresh_from_db()
+        self.assertNotEqual(card_cache_key("leads/lead_card.html", self.lead), old_key)
+        self.assertIn("Jim Soap", self.render([self.lead]))
+
+    def test_only_the_missing_cards_are_rendered(self):
+        other = self.add_lead(first_name="Ann", last_name="Other")
+        self.render([self.lead])
+        with mock.patch("leads.cards.default_cache.set_many") as set_many:
+            cards = self.render([self.lead, other])
+        self.assertLess(cards.index("Joe Soap"), cards.index("Ann Other"))
+        self.assertEqual(list(set_many.call_args[0][0]), [card_cache_key("leads/lead_card.html", other)])
+
+    def test_bulk_assignment_bumps_updated_at(self):
+        before = self.lead.updated_at
+        AssignmentEngine(self.organization).assign()
+        self.lead.refresh_from_db()
+        self.assertEqual(self.lead.agent, self.agent)
+        self.assertGreater(self.lead.updated_at, before)
+
+    def test_deleting_a_category_bumps_its_leads(self):
+        category = self.add_category("Contacted")
+        Lead.objects.filter(pk=self.lead.pk).update(category=category)
+        self.lead.refresh_from_db()
+        before = self.lead.updated_at
+        category.delete()
+        self.lead.refresh_from_db()
+        self.assertGreater(self.lead.updated_at, before)
+
+    def test_renaming_an_agent_user_bumps_the_agent(self):
+        before = self.agent.updated_at
+        self.agent.user.username = "renamed"
+        self.agent.user.save()
+        self.agent.refresh_from_db()
+        self.assertGreater(self.agent.updated_at, before)
+
+    def test_list_pages_render_the_cards(self):
+        self.client.force_login(self.organizor)
+        for _ in range(2):
+            response = self.client.get(reverse("leads:lead-list"))
+            self.assertContains(response, "Joe Soap")
+            self.assertContains(response, reverse("leads:assign-agent", args=[self.lead.pk]))
+            response = self.client.get(reverse("agents:agent-list"))
+            self.assertContains(response, "agent")
+            self.assertContains(response, reverse("agents:agent-detail", args=[self.agent.pk]))
@@ -0,0 +1,135 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import Client, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from leads.assignment import AssignmentEngine
+from leads.autocomplete import indexes
+from leads.models import Lead
+from leads.testing import OrganizationTestMixin
+
+
+class ConditionalGetTest(OrganizationTestMixin, TransactionTestCase):
+    #the organization stamp moves on commit, which TestCase never gets to
+    def setUp(self):
+        super(ConditionalGetTest, self).setUp()
+        cache.clear()
+        indexes.clear()
+        self.category = self.add_category("Contacted")
+        self.lead = self.add_lead(agent=self.agent, category=self.category)
+        self.client.force_login(self.organizor)
+        #the csrf token is part of the tags, a browser has it from the login page
+        self.client.get(reverse("login"))
+
+    def revalidate(self, url, data=None):
+        """Get url, then get it again with the etag it came with and return the second response."""
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+        return lambda: self.client.get(url, data, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_list_is_not_modified_after_the_tenant_lookup(self):
+        again = self.revalidate(reverse("leads:lead-list"))
+        with CaptureQueriesContext(connection) as queries:
+            response = again()
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        #session, user and the organization with its stamp
+        self.assertEqual(len(queries), 3)
+
+    def test_writes_move_the_organization_stamp(self):
+        again = self.revalidate(reverse("leads:lead-list"))
+        self.add_lead()
+        self.assertEqual(again().status_code, 200)
+
+        again = self.revalidate(reverse("leads:category-list"))
+        self.category.delete()
+        self.assertEqual(again().status_code, 200)
+
+        again = self.revalidate(reverse("agents:agent-list"))
+        self.agent.user.username = "renamed"
+        self.agent.user.save()
+        self.assertEqual(again().status_code, 200)
+
+    def test_bulk_writes_move_the_organization_stamp(self):
+        unassigned = Lead(first_name="Ann", last_name="Other", organization=self.organization)
+        again = self.revalidate(reverse("leads:lead-list"))
+        Lead.objects.bulk_create([unassigned])
+        self.assertEqual(again().status_code, 200)
+
+        again = self.revalidate(reverse("leads:lead-list"))
+        self.assertEqual(AssignmentEngine(self.organization).assign(), 1)
+        self.assertEqual(again().status_code, 200)
+
+    def test_detail_follows_its_own_row(self):
+        url = reverse("leads:lead-detail", kwargs={"pk": self.lead.pk})
+        again = self.revalidate(url)
+        #another lead changing leaves this page alone
+        self.add_lead()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(again().status_code, 304)
+        self.assertEqual(len(queries), 4)
+
+        self.lead.first_name = "Jim"
+        self.lead.save()
+        self.assertContains(again(), "Jim")
+
+        again = self.revalidate(reverse("agents:agent-detail", kwargs={"pk": self.agent.pk}))
+        self.agent.user.email = "agent@example.com"
+        self.agent.user.save()
+        self.assertEqual(again().status_code, 200)
+
+    def test_a_lead_taken_away_is_not_found_rather_than_not_modified(self):
+        self.client.force_login(self.agent.user)
+        again = self.revalidate(reverse("leads:lead-detail", kwargs={"pk": self.lead.pk}))
+        Lead.objects.filter(pk=self.lead.pk).update(agent=None)
+        self.assertEqual(again().status_code, 404)
+
+    def test_users_get_their_own_tags(self):
+        response = self.client.get(reverse("leads:lead-list"))
+        self.client.force_login(self.agent.user)
+        self.assertEqual(
+            self.client.get(reverse("leads:lead-list"), HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200
+        )
+
+    def test_logging_in_again_sends_the_page_with_the_new_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        csrf_token = lambda response: re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+
+        def login():
+            page = client.get(reverse("login"))
+            response = client.post(reverse("login"), {
+                "username": "organizor", "password": "pass", "csrfmiddlewaretoken": csrf_token(page),
+            })
+            self.assertEqual(response.status_code, 302)
+
+        self.add_lead()
+        login()
+        before = client.get(reverse("leads:lead-list"))
+        client.get(reverse("logout"))
+        #rotates the csrf token, the page sent before it carries the old one
+        login()
+        response = client.get(reverse("leads:lead-list"), HTTP_IF_NONE_MATCH=before["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+        assign = lambda page: client.post(reverse("leads:bulk-assign-agent"), {
+            "strategy": "round_robin", "all_unassigned": "on", "csrfmiddlewaretoken": csrf_token(page),
+        })
+        self.assertEqual(assign(before).status_code, 403)
+        self.assertEqual(assign(response).status_code, 302)
+
+    def test_json_and_async_views(self):
+        again = self.revalidate(reverse("leads:autocomplete"), {"q": "jo"})
+        self.assertEqual(again().status_code, 304)
+        again = self.revalidate(reverse("leads:lead-export"), {"format": "json"})
+        self.assertEqual(again().status_code, 304)
+        list_again = self.revalidate(reverse("leads:lead-list-async"))
+        self.assertEqual(list_again().status_code, 304)
+        detail_again = self.revalidate(reverse("leads:lead-detail-async", kwargs={"pk": self.lead.pk}))
+        self.assertEqual(detail_again().status_code, 304)
+        self.add_lead()
+        self.assertEqual(list_again().status_code, 200)
+        self.assertEqual(detail_again().status_code, 304)
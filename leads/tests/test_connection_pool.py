@@ -0,0 +1,154 @@
+from unittest import mock, skipIf
+
+from django.test import SimpleTestCase
+
+try:
+    import psycopg2
+    from psycopg2 import extensions
+
+    from djcrm.db.postgresql import base
+except ImportError:
+    base = None
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql):
+        if self.connection.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+
+class FakeConnection:
+    """What the pool uses of a psycopg2 connection."""
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        if self.broken:
+            raise psycopg2.InterfaceError("connection already closed")
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@skipIf(base is None, "the pooled postgresql engine needs psycopg2")
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        self.connected = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.connected.append(connection)
+        return connection
+
+    def failing_connect(self):
+        raise psycopg2.OperationalError("could not connect to server")
+
+    def test_idle_connections_are_reused(self):
+        pool = base.ConnectionPool(2)
+        first, second = pool.get(self.connect), pool.get(self.connect)
+        pool.put(first)
+        pool.put(second)
+        #newest idle connection first
+        self.assertIs(pool.get(self.connect), second)
+        self.assertIs(pool.get(self.connect), first)
+        self.assertEqual(len(self.connected), 2)
+
+    def test_an_exhausted_pool_times_out(self):
+        pool = base.ConnectionPool(1, timeout=0.01)
+        connection = pool.get(self.connect)
+        with self.assertRaisesMessage(psycopg2.OperationalError, "No database connection free after 0.01s"):
+            pool.get(self.connect)
+        pool.put(connection)
+        self.assertIs(pool.get(self.connect), connection)
+
+    def test_a_failed_connect_gives_its_slot_back(self):
+        pool = base.ConnectionPool(1, timeout=0.01)
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.get(self.failing_connect)
+        self.assertIsInstance(pool.get(self.connect), FakeConnection)
+
+    def test_connections_past_their_lifetime_are_replaced(self):
+        pool = base.ConnectionPool(1, max_lifetime=3600)
+        old = pool.get(self.connect)
+        pool.put(old)
+        pool.max_lifetime = -1
+        new = pool.get(self.connect)
+        self.assertIsNot(new, old)
+        self.assertTrue(old.closed)
+
+    def test_put_rolls_back_what_the_request_left_open(self):
+        pool = base.ConnectionPool(1)
+        connection = pool.get(self.connect)
+        connection.status = extensions.TRANSACTION_STATUS_INTRANS
+        pool.put(connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertIs(pool.get(self.connect), connection)
+
+    def test_broken_connections_are_discarded(self):
+        pool = base.ConnectionPool(1, timeout=0.01)
+        #on the way back in
+        connection = pool.get(self.connect)
+        connection.broken = True
+        pool.put(connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.get(self.connect), connection)
+
+    def test_health_checks_discard_connections_dropped_while_idle(self):
+        pool = base.ConnectionPool(1, timeout=0.01, health_checks=True)
+        connection = pool.get(self.connect)
+        pool.put(connection)
+        connection.broken = True
+        fresh = pool.get(self.connect)
+        self.assertIsNot(fresh, connection)
+        self.assertTrue(connection.closed)
+        #closed by the server, no health check needed to tell
+        pool.put(fresh)
+        fresh.closed = 2
+        self.assertIsNot(pool.get(self.connect), fresh)
+
+
+@skipIf(base is None, "the pooled postgresql engine needs psycopg2")
+class PooledDatabaseWrapperTest(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(base.close_pools)
+        settings_dict = {
+            "NAME": "djcrm", "USER": "", "PASSWORD": "", "HOST": "", "PORT": "", "OPTIONS": {},
+            "TIME_ZONE": None, "CONN_MAX_AGE": 0, "AUTOCOMMIT": True,
+            "POOL": {"max_size": 1, "timeout": 0.01},
+        }
+        self.wrappers = [base.DatabaseWrapper(dict(settings_dict), alias="pooled") for _ in range(2)]
+
+    def test_close_hands_the_connection_back_to_the_pool(self):
+        first, second = self.wrappers
+        connection = FakeConnection()
+        with mock.patch.object(base.base.DatabaseWrapper, "get_new_connection", return_value=connection) as connect:
+            self.assertIs(first.get_new_connection({}), connection)
+            first.connection = connection
+            #the only slot is taken
+            with self.assertRaises(psycopg2.OperationalError):
+                second.get_new_connection({})
+            first._close()
+            self.assertIs(second.get_new_connection({}), connection)
+        connect.assert_called_once_with({})
+        self.assertFalse(connection.closed)
@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from leads.counters import category_counts
+from leads.testing import OrganizationTestMixin
+
+
+class CategoryCountsTest(OrganizationTestMixin, TestCase):
+    def setUp(self):
+        super(CategoryCountsTest, self).setUp()
+        cache.clear()
+        self.other_organization = self.add_organization("other")[1]
+        self.category = self.add_category("Contacted")
+        self.lead = self.add_lead(category=self.category)
+        self.add_lead()
+        self.add_lead(self.other_organization)
+
+    def test_counts_are_per_organization(self):
+        self.assertEqual(category_counts(self.organization), {self.category.pk: 1, None: 1})
+        self.assertEqual(category_counts(self.other_organization), {None: 1})
+
+    def test_lead_changes_invalidate_counts(self):
+        category_counts(self.organization)
+        with self.assertNumQueries(0):
+            category_counts(self.organization)
+
+        self.lead.category = None
+        self.lead.save()
+        self.assertEqual(category_counts(self.organization), {None: 2})
+
+        self.lead.delete()
+        self.assertEqual(category_counts(self.organization), {None: 1})
+
+    def test_category_delete_invalidates_counts(self):
+        category_counts(self.organization)
+        self.category.delete()
+        self.assertEqual(category_counts(self.organization), {None: 2})
@@ -0,0 +1,85 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from leads.dedupe import DuplicateFinder, group_duplicates, merge_leads
+from leads.models import Lead, User
+from leads.normalize import normalize_email, normalize_phone
+from leads.testing import OrganizationTestMixin
+
+
+@override_settings(LEADS_PHONE_COUNTRY_CODE="1")
+class NormalizeTest(TestCase):
+    def test_emails_and_phones(self):
+        self.assertEqual(normalize_email("  John@Example.COM "), "john@example.com")
+        self.assertEqual(normalize_phone("(555) 123-4567"), "+15551234567")
+        self.assertEqual(normalize_phone("+1 555 123 4567"), "+15551234567")
+        self.assertEqual(normalize_phone("0044 20 7946 0000"), "+442079460000")
+        self.assertEqual(normalize_phone("ext 12"), "")
+
+    def test_save_and_bulk_create_fill_the_shadow_columns(self):
+        organization = User.objects.create_user(username="organizor", password="pass").userprofile
+        lead = Lead.objects.create(first_name="Joe", last_name="Soap", organization=organization, email="JOE@x.com", phone_number="555 123 4567")
+        Lead.objects.bulk_create([Lead(first_name="Jim", last_name="Soap", organization=organization, email=" Jim@x.com")])
+        self.assertEqual((lead.email_normalized, lead.phone_normalized), ("joe@x.com", "+15551234567"))
+        self.assertTrue(Lead.objects.filter(email_normalized="jim@x.com").exists())
+
+
+@override_settings(LEADS_PHONE_COUNTRY_CODE="1")
+class DuplicateFinderTest(OrganizationTestMixin, TestCase):
+    def add_lead(self, first_name, last_name, organization=None, **fields):
+        return super(DuplicateFinderTest, self).add_lead(organization, first_name=first_name, last_name=last_name, **fields)
+
+    def test_finds_pairs_through_each_blocking_key(self):
+        john = self.add_lead("John", "Smith", email="john@example.com")
+        same_email = self.add_lead("Jon", "Smith", email="JOHN@example.com ")
+        same_phone = self.add_lead("Mary", "Jones", phone_number="555-123-4567")
+        other_phone = self.add_lead("Mary", "Jones", phone_number="+1 (555) 123 4567")
+        typo = self.add_lead("Jonh", "Smith")
+        #shares the email but is clearly someone else
+        self.add_lead("Alice", "Wong", email="john@example.com")
+        #a duplicate in another organization isn't ours to find
+        self.add_lead("John", "Smith", email="john@example.com", organization=self.add_organization("other")[1])
+
+        pairs = {(c.lead_id, c.duplicate_id): c for c in DuplicateFinder(self.organization).find()}
+        self.assertEqual(set(pairs), {
+            (john.pk, same_email.pk), (same_phone.pk, other_phone.pk),
+            (john.pk, typo.pk), (same_email.pk, typo.pk),
+        })
+        self.assertEqual(pairs[john.pk, same_email.pk].reasons, ["email"])
+        self.assertEqual(pairs[same_phone.pk, other_phone.pk].score, 0.8)
+        self.assertEqual(group_duplicates(pairs.values()), [[john.pk, same_email.pk, typo.pk], [same_phone.pk, other_phone.pk]])
+
+    def test_oversized_blocks_are_skipped(self):
+        for _ in range(4):
+            self.add_lead("John", "Smith", email="sales@example.com")
+        finder = DuplicateFinder(self.organization, max_block_size=3)
+        self.assertEqual(finder.find(), [])
+        self.assertEqual(finder.skipped_blocks, 2)
+
+    def test_merge_fills_blanks_and_deletes_the_duplicates(self):
+        lead = self.add_lead("John", "Smith", email="john@example.com")
+        duplicate = self.add_lead("Jon", "Smith", phone_number="5551234567", agent=self.agent)
+        other_email = self.add_lead("John", "Smith", email="j.smith@work.com", phone_number="555 123 4567")
+        merge_leads(lead, [duplicate, other_email])
+        lead.refresh_from_db()
+        self.assertEqual((lead.email, lead.phone_normalized, lead.agent), ("john@example.com", "+15551234567", self.agent))
+        #the address the lead didn't keep is noted rather than lost
+        self.assertEqual(lead.description, f"Merged from lead {other_email.pk}: j.smith@work.com")
+        self.assertFalse(Lead.objects.filter(pk__in=[duplicate.pk, other_email.pk]).exists())
+
+    def test_command_merges_into_the_oldest_lead(self):
+        lead = self.add_lead("John", "Smith", email="john@example.com")
+        self.add_lead("John", "Smith", email="john@example.com")
+        call_command("find_duplicate_leads", "--organizor", "organizor", "--merge", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(list(Lead.objects.values_list("pk", flat=True)), [lead.pk])
+
+    def test_command_only_reports_leads_matched_on_the_name(self):
+        #same name, different people
+        first = self.add_lead("John", "Smith", email="john@example.com", phone_number="555 123 4567")
+        second = self.add_lead("John", "Smith", email="jsmith@other.com", phone_number="555 765 4321")
+        stdout = StringIO()
+        call_command("find_duplicate_leads", "--organizor", "organizor", "--merge", stdout=stdout, stderr=StringIO())
+        self.assertIn(f"{first.pk},{second.pk},0.7,", stdout.getvalue())
+        self.assertEqual(Lead.objects.count(), 2)
@@ -0,0 +1,131 @@
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.utils import timezone
+
+from leads.assignment import AssignmentEngine
+from leads.events import AGENT, CATEGORY, ArchivedHistory, archive_events, category_periods, state_at
+from leads.models import Lead, LeadEvent, LeadEventArchive
+from leads.testing import OrganizationTestMixin
+
+
+class LeadEventTest(OrganizationTestMixin, TestCase):
+    def setUp(self):
+        super(LeadEventTest, self).setUp()
+        self.new = self.add_category("New")
+        self.contacted = self.add_category("Contacted")
+        self.lead = self.add_lead(category=self.new)
+
+    def events(self):
+        return list(LeadEvent.objects.order_by("id").values_list("field", "old_value", "new_value"))
+
+    def move(self, event_id, timestamp):
+        LeadEvent.objects.filter(pk=event_id).update(timestamp=timestamp)
+
+    def test_views_record_changes(self):
+        self.client.force_login(self.organizor)
+        self.client.post(reverse("leads:lead-category-update", args=[self.lead.pk]), {"category": self.contacted.pk})
+        self.client.post(reverse("leads:assign-agent", args=[self.lead.pk]), {"agent": self.agent.pk})
+        self.assertEqual(self.events(), [(CATEGORY, self.new.pk, self.contacted.pk), (AGENT, None, self.agent.pk)])
+
+    def test_unchanged_saves_record_nothing(self):
+        self.lead.description = "Called back"
+        self.lead.save()
+        self.assertEqual(self.events(), [])
+
+    def test_bulk_assignment_records_an_event_per_lead(self):
+        Lead.objects.bulk_create([
+            Lead(first_name="Jane", last_name="Doe", organization=self.organization) for _ in range(3)
+        ])
+        AssignmentEngine(self.organization).assign()
+        self.assertEqual(self.events(), [(AGENT, None, self.agent.pk)] * 4)
+
+    def test_deleting_a_category_records_its_leads_losing_it(self):
+        category_pk = self.new.pk
+        self.new.delete()
+        self.assertEqual(self.events(), [(CATEGORY, category_pk, None)])
+
+    def test_state_at_any_point_in_time(self):
+        created = self.lead.date_added
+        self.lead.category = self.contacted
+        self.lead.save()
+        self.lead.agent = self.agent
+        self.lead.category = None
+        self.lead.save()
+        first, second, third = LeadEvent.objects.order_by("id").values_list("pk", flat=True)
+        self.move(first, created + timedelta(days=1))
+        self.move(second, created + timedelta(days=2))
+        self.move(third, created + timedelta(days=2))
+
+        self.assertIsNone(state_at(self.lead, created - timedelta(days=1)))
+        #before any event the old value of the first one
+        self.assertEqual(state_at(self.lead, created + timedelta(hours=1)), (None, self.new.pk))
+        self.assertEqual(state_at(self.lead, created + timedelta(days=1, hours=1)), (None, self.contacted.pk))
+        self.assertEqual(state_at(self.lead, created + timedelta(days=3)), (self.agent.pk, None))
+        #a handful of LIMIT 1 lookups on the lead's events, plus the archive check
+        with self.assertNumQueries(5):
+            state_at(self.lead, created + timedelta(hours=1))
+
+        self.assertEqual(
+            [category for category, _, _ in category_periods(self.lead)], [self.new.pk, self.contacted.pk, None]
+        )
+
+    def test_leads_without_events_are_in_their_current_state(self):
+        self.assertEqual(state_at(self.lead, timezone.now()), (None, self.new.pk))
+
+    def test_archive_moves_old_events_to_monthly_files(self):
+        now = timezone.now()
+        Lead.objects.filter(pk=self.lead.pk).update(date_added=now - timedelta(days=100))
+        self.lead.refresh_from_db()
+        self.lead.category = self.contacted
+        self.lead.save()
+        self.lead.category = self.new
+        self.lead.save()
+        old, recent = LeadEvent.objects.order_by("id").values_list("pk", flat=True)
+        self.move(old, now - timedelta(days=70))
+
+        with tempfile.TemporaryDirectory() as directory:
+            archives = archive_events(now - timedelta(days=1), directory)
+            rows = []
+            for archive in archives:
+                with gzip.open(archive.path, "rt") as archive_file:
+                    rows.extend(json.loads(line) for line in archive_file)
+        #one file per month the range touches
+        self.assertIn(len(archives), (3, 4))
+        self.assertEqual([row["id"] for row in rows], [old])
+        self.assertEqual(list(LeadEvent.objects.values_list("pk", flat=True)), [recent])
+        self.assertEqual(state_at(self.lead, timezone.now()), (None, self.new.pk))
+        with self.assertRaises(ArchivedHistory):
+            state_at(self.lead, now - timedelta(days=2))
+
+    def test_archive_skips_months_already_archived(self):
+        now = timezone.now()
+        first = LeadEvent.objects.create(
+            organization=self.organization, lead=self.lead, timestamp=now - timedelta(days=70),
+            field=CATEGORY, old_value=self.new.pk, new_value=self.contacted.pk,
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            archive_events(now - timedelta(days=40), directory)
+            #backdated to a month before what is archived already
+            second = LeadEvent.objects.create(
+                organization=self.organization, lead=self.lead, timestamp=now - timedelta(days=100),
+                field=CATEGORY, old_value=self.contacted.pk, new_value=self.new.pk,
+            )
+            archives = archive_events(now - timedelta(days=1), directory)
+        self.assertTrue(all(archive.start < archive.end for archive in archives))
+        self.assertEqual(sum(archive.events for archive in archives), 0)
+        self.assertEqual(list(LeadEvent.objects.values_list("pk", flat=True)), [second.pk])
+        self.assertFalse(LeadEvent.objects.filter(pk=first.pk).exists())
+
+    def test_archive_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = StringIO()
+            call_command("archive_lead_events", "--older-than-days", "30", "--output-dir", directory, stdout=output)
+        self.assertIn("Archived 0 events", output.getvalue())
+        self.assertFalse(LeadEventArchive.objects.exists())
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+
+from django.shortcuts import reverse
+from django.test import TestCase
+
+from leads.exporters import EXPORT_FIELDS
+from leads.models import Lead
+from leads.testing import OrganizationTestMixin, QueryCountAssertionsMixin
+
+
+class LeadExportTest(OrganizationTestMixin, QueryCountAssertionsMixin, TestCase):
+    agent_fields = {"email": "agent@test.com"}
+
+    def setUp(self):
+        super(LeadExportTest, self).setUp()
+        self.category = self.add_category("Contacted")
+        self.lead = self.add_lead(
+            description='Said "call me, later"\nthen hung up', agent=self.agent, category=self.category
+        )
+        self.unassigned = self.add_lead(first_name="Jim")
+        self.add_lead(self.add_organization("other")[1], first_name="Ann", last_name="Other")
+
+    def add_lead(self, organization=None, **fields):
+        fields = {"age": 30, "email": "joe@test.com", **fields}
+        return super(LeadExportTest, self).add_lead(organization, **fields)
+
+    def export(self, export_format=None):
+        data = {"format": export_format} if export_format else {}
+        response = self.client.get(reverse("leads:lead-export"), data)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        self.client.force_login(self.organizor)
+        response, content = self.export()
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="leads.csv"')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], list(EXPORT_FIELDS))
+        first = dict(zip(rows[0], rows[1]))
+        #the quotes, comma and newline of the description survive the round trip
+        self.assertEqual(first["description"], 'Said "call me, later"\nthen hung up')
+        self.assertEqual((first["agent"], first["category"]), ("agent@test.com", "Contacted"))
+        self.assertEqual(dict(zip(rows[0], rows[2]))["agent"], "")
+
+    def test_json(self):
+        self.client.force_login(self.organizor)
+        response, content = self.export("json")
+        self.assertEqual(response["Content-Type"], "application/json")
+        leads = json.loads(content)
+        self.assertEqual([lead["id"] for lead in leads], [self.lead.pk, self.unassigned.pk])
+        self.assertEqual(list(leads[0]), list(EXPORT_FIELDS))
+        self.assertEqual(leads[0]["description"], self.lead.description)
+        self.assertEqual((leads[1]["agent"], leads[1]["category"]), ("", ""))
+
+    def test_json_of_no_leads_is_an_empty_array(self):
+        Lead.objects.all().delete()
+        self.client.force_login(self.organizor)
+        self.assertEqual(json.loads(self.export("json")[1]), [])
+
+    def test_agents_only_export_their_own_leads(self):
+        self.client.force_login(self.agent.user)
+        leads = json.loads(self.export("json")[1])
+        self.assertEqual([lead["id"] for lead in leads], [self.lead.pk])
+
+    def test_a_constant_number_of_queries(self):
+        self.client.force_login(self.organizor)
+        export = lambda: self.export("csv")
+
+        def grow():
+            for i in range(10):
+                self.add_lead(agent=self.add_agent(f"agent{i}"), category=self.add_category(f"Category {i}"))
+
+        #session, user, tenant and one streamed select with the agents and categories joined
+        self.assertConstantQueries(export, grow, num=4)
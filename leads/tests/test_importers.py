@@ -0,0 +1,64 @@
+import io
+
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from leads.importers import LeadCSVImporter
+from leads.models import Lead, QueuedEmail
+from leads.testing import OrganizationTestMixin
+
+
+HEADER = "first_name,last_name,age,description,phone_number,email,agent,category\n"
+
+
+class LeadCSVImporterTest(OrganizationTestMixin, TestCase):
+    organizor_fields = {"email": "org@test.com"}
+    agent_fields = {"email": "agent@test.com"}
+
+    def setUp(self):
+        super(LeadCSVImporterTest, self).setUp()
+        self.category = self.add_category("Contacted")
+
+    def test_valid_rows_are_inserted_in_batches(self):
+        rows = "".join(
+            f"Lead{i},Test,30,desc,555,lead{i}@test.com,agent@test.com,contacted\n" for i in range(10)
+        )
+        importer = LeadCSVImporter(self.organization, batch_size=4)
+        with CaptureQueriesContext(connection) as ctx:
+            result = importer.run(io.StringIO(HEADER + rows))
+        self.assertEqual(result.created, 10)
+        self.assertEqual(Lead.objects.filter(agent=self.agent, category=self.category).count(), 10)
+        #one insert per batch, not per row
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "leads_lead"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(QueuedEmail.objects.count(), 1)
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        rows = (
+            "Good,Lead,30,desc,555,good@test.com,,\n"
+            "Bad,Lead,old,desc,555,not-an-email,,\n"
+            "Unknown,Agent,30,desc,555,unknown@test.com,nobody@test.com,\n"
+        )
+        result = LeadCSVImporter(self.organization).run(io.StringIO(HEADER + rows))
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.error_count, 2)
+        self.assertEqual([line for line, _ in result.errors], [3, 4])
+
+    def test_import_view(self):
+        self.client.force_login(self.organizor)
+        upload = io.BytesIO((HEADER + "Joe,Soap,30,desc,555,joe@test.com,agent,\n").encode())
+        upload.name = "leads.csv"
+        response = self.client.post(reverse("leads:lead-import"), {"file": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Lead.objects.get().agent, self.agent)
+
+    def test_import_view_reports_a_file_that_isnt_utf8(self):
+        self.client.force_login(self.organizor)
+        upload = io.BytesIO((HEADER + "José,Soap,30,desc,555,jose@test.com,,\n").encode("latin-1"))
+        upload.name = "leads.csv"
+        response = self.client.post(reverse("leads:lead-import"), {"file": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response, "form", "file", 'The file isn\'t UTF-8 encoded, save it as "CSV UTF-8" and upload it again.')
+        self.assertFalse(Lead.objects.exists())
@@ -0,0 +1,71 @@
+import re
+
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from leads.middleware import Tenant
+from leads.testing import OrganizationTestMixin
+from leads.views import CategoryListView
+
+
+#sqlite prints "SCAN leads_lead" for a full table scan and "SEARCH ... USING INDEX" otherwise,
+#postgres prints "Seq Scan on leads_lead"
+SQLITE_FULL_SCAN = re.compile(r"\bSCAN (leads_\w+)(?! USING)")
+POSTGRES_FULL_SCAN = re.compile(r"Seq Scan on (leads_\w+)")
+
+
+class LeadIndexTest(OrganizationTestMixin, TestCase):
+    def setUp(self):
+        super(LeadIndexTest, self).setUp()
+        self.category = self.add_category("New")
+        self.lead = self.add_lead(agent=self.agent, category=self.category)
+        self.add_lead(first_name="Jane")
+        if connection.vendor == "postgresql":
+            #tiny test tables are always cheaper to seq scan, so make the planner show what it could use
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan TO off")
+
+    def full_scans(self, queries):
+        prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+        pattern = SQLITE_FULL_SCAN if connection.vendor == "sqlite" else POSTGRES_FULL_SCAN
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query["sql"].startswith("SELECT"):
+                    continue
+                cursor.execute(prefix + query["sql"])
+                plan = "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+                scans.extend((table, query["sql"]) for table in pattern.findall(plan))
+        return scans
+
+    def assertIndexBacked(self, queries):
+        self.assertEqual(self.full_scans(queries), [])
+
+    def test_lead_list_is_index_backed(self):
+        self.client.force_login(self.organizor)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("leads:lead-list"))
+        self.assertIndexBacked(ctx.captured_queries)
+
+    def test_agent_lead_list_is_index_backed(self):
+        self.client.force_login(self.agent.user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("leads:lead-list"))
+        self.assertIndexBacked(ctx.captured_queries)
+
+    def test_lead_detail_is_index_backed(self):
+        self.client.force_login(self.organizor)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("leads:lead-detail", kwargs={"pk": self.lead.pk}))
+        self.assertIndexBacked(ctx.captured_queries)
+
+    def test_category_list_is_index_backed(self):
+        request = RequestFactory().get(reverse("leads:category-list"))
+        request.user = self.organizor
+        request.tenant = Tenant(self.organizor)
+        with CaptureQueriesContext(connection) as ctx:
+            response = CategoryListView.as_view()(request)
+            list(response.context_data["category_list"])
+        self.assertIndexBacked(ctx.captured_queries)
@@ -0,0 +1,54 @@
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from leads.mail import queue_mail, send_queued_mail
+from leads.models import QueuedEmail
+
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError("mail server is down")
+
+
+class QueuedEmailTest(TestCase):
+    def queue(self, count=1):
+        for i in range(count):
+            queue_mail(
+                subject=f"Email {i}",
+                message="body",
+                from_email="test@test.com",
+                recipient_list=[f"agent{i}@test.com", "test2@test.com"],
+            )
+
+    def test_worker_drains_queue_in_batches(self):
+        self.queue(5)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(send_queued_mail(batch_size=3), 3)
+        self.assertEqual(send_queued_mail(batch_size=3), 2)
+        self.assertEqual(send_queued_mail(batch_size=3), 0)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].to, ["agent0@test.com", "test2@test.com"])
+        self.assertFalse(QueuedEmail.objects.exclude(status=QueuedEmail.SENT).exists())
+
+    @override_settings(
+        EMAIL_BACKEND="leads.tests.test_mail.FailingBackend",
+        EMAIL_QUEUE_MAX_ATTEMPTS=2,
+    )
+    def test_failed_sends_back_off_then_give_up(self):
+        self.queue()
+        self.assertEqual(send_queued_mail(), 0)
+        email = QueuedEmail.objects.get()
+        self.assertEqual(email.status, QueuedEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertIn("mail server is down", email.last_error)
+
+        #not due yet, so the worker leaves it alone
+        self.assertEqual(send_queued_mail(), 0)
+        self.assertEqual(QueuedEmail.objects.get().attempts, 1)
+
+        QueuedEmail.objects.update(next_attempt_at=timezone.now())
+        send_queued_mail()
+        self.assertEqual(QueuedEmail.objects.get().status, QueuedEmail.FAILED)
@@ -0,0 +1,41 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from leads.models import Lead
+from leads.pagination import KeysetPaginator, decode_cursor, encode_cursor
+from leads.testing import OrganizationTestMixin
+
+
+class KeysetPaginatorTest(OrganizationTestMixin, TestCase):
+    def setUp(self):
+        super(KeysetPaginatorTest, self).setUp()
+        Lead.objects.bulk_create([
+            Lead(first_name=f"Lead{i}", last_name="Test", organization=self.organization)
+            for i in range(7)
+        ])
+        #every lead shares the same timestamp so only the id tie breaker keeps the order total
+        Lead.objects.update(date_added=timezone.now())
+
+    def test_pages_cover_every_lead_once(self):
+        paginator = KeysetPaginator(Lead.objects.all(), per_page=3)
+        seen = []
+        page = paginator.page()
+        while True:
+            seen.extend(lead.pk for lead in page)
+            if not page.has_next:
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(seen, list(Lead.objects.order_by("-id").values_list("pk", flat=True)))
+
+    def test_insert_does_not_shift_later_pages(self):
+        paginator = KeysetPaginator(Lead.objects.all(), per_page=3)
+        first = paginator.page()
+        expected = [lead.pk for lead in paginator.page(first.next_cursor)]
+        self.add_lead(first_name="New", last_name="Lead")
+        self.assertEqual([lead.pk for lead in paginator.page(first.next_cursor)], expected)
+
+    def test_cursor_round_trip(self):
+        now = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(now, 42)), (now, 42))
+        with self.assertRaises(ValueError):
+            decode_cursor("not-a-cursor")
@@ -0,0 +1,104 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import TestCase, override_settings
+
+from leads.models import Lead
+from leads.profiling import RequestProfile, fingerprint, summarize_samples
+from leads.testing import OrganizationTestMixin
+
+
+class ProfilingMiddlewareTest(OrganizationTestMixin, TestCase):
+    def setUp(self):
+        super(ProfilingMiddlewareTest, self).setUp()
+        self.category = self.add_category("Contacted")
+        for i in range(3):
+            self.add_lead(first_name=f"Lead{i}", last_name="Test", category=self.category)
+        self.client.force_login(self.organizor)
+
+    def profiled_get(self, url, **extra):
+        with self.assertLogs("leads.profiling", "INFO") as logs:
+            response = self.client.get(url, **extra)
+        self.assertEqual(len(logs.records), 1)
+        return response, json.loads(logs.records[0].getMessage())
+
+    def test_off_by_default(self):
+        with override_settings(PROFILE_HEADER_ENABLED=False):
+            response = self.client.get(reverse("leads:lead-list"), HTTP_X_PROFILE="1")
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(PROFILE_REQUESTS=True)
+    def test_records_sql_and_template_time(self):
+        response, record = self.profiled_get(reverse("leads:lead-list"))
+        self.assertEqual(record["view"], "leads:lead-list")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["queries"], 0)
+        self.assertGreater(record["template_ms"], 0)
+        self.assertGreaterEqual(record["total_ms"], record["template_ms"])
+        self.assertEqual(record["duplicates"], [])
+        timing = response["Server-Timing"]
+        self.assertIn("total;dur=", timing)
+        self.assertIn(f'desc="{record["queries"]} queries"', timing)
+        self.assertIn("template;dur=", timing)
+
+    @override_settings(PROFILE_HEADER_ENABLED=True)
+    def test_header_opts_in_a_single_request(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("leads:lead-list")))
+        response, record = self.profiled_get(reverse("agents:agent-list"), HTTP_X_PROFILE="1")
+        self.assertIn("Server-Timing", response)
+        self.assertEqual(record["view"], "agents:agent-list")
+
+    @override_settings(PROFILE_REQUESTS=True)
+    def test_only_lead_and_agent_views_are_recorded(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("landing-page")))
+        self.client.logout()
+        _, record = self.profiled_get(reverse("leads:lead-list"))
+        self.assertEqual(record["status"], 302)
+        self.assertIsNone(record["user"])
+
+    def test_repeated_queries_are_reported(self):
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile):
+            for lead in Lead.objects.order_by("pk"):
+                lead.category.name
+        profile.finish()
+        self.assertEqual(profile.query_count, 4)
+        self.assertEqual(len(profile.duplicates()), 1)
+        self.assertEqual(profile.duplicates()[0]["count"], 3)
+        self.assertIn('FROM "leads_category"', profile.duplicates()[0]["sql"])
+
+    def test_fingerprint_ignores_in_list_length(self):
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM "t" WHERE "id" IN (%s, %s, %s)'),
+            fingerprint('SELECT 1 FROM "t" WHERE "id" IN (%s)'),
+        )
+
+    def test_samples_are_written_and_summarized(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profiles.jsonl")
+            with override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_SAMPLE_FILE=path):
+                for _ in range(3):
+                    response = self.client.get(reverse("leads:category-list"))
+                    #sampling alone doesn't add the header
+                    self.assertNotIn("Server-Timing", response)
+            with open(path) as sample_file:
+                summary = summarize_samples(sample_file)
+            self.assertEqual(summary["leads:category-list"]["requests"], 3)
+            call_command("summarize_profiles", file=path, output=os.path.join(directory, "report.json"), stdout=StringIO())
+            with open(os.path.join(directory, "report.json")) as report:
+                self.assertEqual(json.load(report)["leads:category-list"]["requests"], 3)
+
+    def test_summary_adds_up_duplicates(self):
+        records = [
+            {"view": "leads:category-detail", "total_ms": ms, "sql_ms": 1, "template_ms": 1, "queries": 5,
+             "duplicates": [{"sql": "SELECT x", "count": 3}]}
+            for ms in (10, 20)
+        ]
+        summary = summarize_samples(json.dumps(record) for record in records)["leads:category-detail"]
+        self.assertEqual(summary["top_duplicates"], [{"sql": "SELECT x", "count": 6}])
+        self.assertEqual(summary["max_ms"], 20)
@@ -0,0 +1,46 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from leads.models import Agent, User, UserProfile
+from leads.provisioning import provision_users
+
+
+class ProvisionUsersTest(TestCase):
+    def setUp(self):
+        self.organization = User.objects.create_user(username="organizor", password="pass").userprofile
+
+    def test_users_profiles_and_agents_are_linked(self):
+        users = [User(username=f"user{i}", email=f"user{i}@example.com") for i in range(1200)]
+        agents = {f"user{i}": self.organization for i in range(0, 1200, 2)}
+        with CaptureQueriesContext(connection) as queries:
+            users, profiles, created = provision_users(users, agents)
+        #a bulk insert per table, plus reading back ids where the database doesn't return them
+        self.assertLess(len(queries), 40)
+
+        self.assertEqual(UserProfile.objects.filter(user__username__startswith="user").count(), 1200)
+        self.assertEqual(len(created), 600)
+        for user, profile in zip(users, profiles):
+            self.assertEqual(profile.user_id, user.pk)
+        by_user = dict(UserProfile.objects.values_list("user__username", "pk"))
+        self.assertEqual([profile.pk for profile in profiles], [by_user[user.username] for user in users])
+        self.assertEqual(
+            sorted(Agent.objects.filter(organization=self.organization).values_list("user__username", flat=True)),
+            sorted(agents),
+        )
+        self.assertEqual({agent.pk for agent in created}, set(Agent.objects.values_list("pk", flat=True)))
+
+    def test_check_command_backfills_missing_profiles(self):
+        User.objects.bulk_create([User(username=f"bare{i}") for i in range(5)])
+        self.assertEqual(User.objects.filter(userprofile__isnull=True).count(), 5)
+
+        output = StringIO()
+        call_command("check_user_profiles", "--dry-run", stdout=output)
+        self.assertIn("5 users without a profile found", output.getvalue())
+        self.assertEqual(User.objects.filter(userprofile__isnull=True).count(), 5)
+
+        call_command("check_user_profiles", "--batch-size", "2", stdout=StringIO())
+        self.assertFalse(User.objects.filter(userprofile__isnull=True).exists())
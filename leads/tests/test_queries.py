@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.shortcuts import reverse
+from django.test import TestCase
+
+from leads.models import Category
+from leads.testing import OrganizationTestMixin, QueryCountAssertionsMixin
+
+
+class LeadViewQueryCountTest(OrganizationTestMixin, QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        super(LeadViewQueryCountTest, self).setUp()
+        cache.clear()
+        self.category = self.add_category("Contacted")
+        self.lead = self.add_leads(1)[0]
+
+    def add_leads(self, count):
+        leads = []
+        for i in range(count):
+            leads.append(self.add_lead(first_name=f"Lead{i}", last_name="Test", agent=self.agent, category=self.category))
+            self.add_lead(first_name=f"Unassigned{i}", last_name="Test")
+        return leads
+
+    def get(self, name, **kwargs):
+        return lambda: self.assertEqual(self.client.get(reverse(name, kwargs=kwargs)).status_code, 200)
+
+    def test_lead_list(self):
+        self.client.force_login(self.organizor)
+        self.assertConstantQueries(self.get("leads:lead-list"), lambda: self.add_leads(5), num=5)
+        #the cards only show the lead's own columns, the pages join nothing
+        pages = [query["sql"] for query in self.capture_queries(self.get("leads:lead-list")) if '"leads_lead"."first_name"' in query["sql"]]
+        self.assertEqual(len(pages), 2)
+        self.assertFalse(any("JOIN" in sql or '"leads_lead"."phone_number"' in sql for sql in pages))
+
+    def test_agent_lead_list(self):
+        self.client.force_login(self.agent.user)
+        #the agent and its organization come back from one joined query
+        self.assertConstantQueries(self.get("leads:lead-list"), lambda: self.add_leads(5), num=4)
+
+    def test_lead_detail(self):
+        self.client.force_login(self.organizor)
+        #the conditional GET stamp is its own narrow lookup, so a 304 doesn't pay for the joins
+        self.assertNumQueries(5, self.get("leads:lead-detail", pk=self.lead.pk))
+
+    def test_category_list(self):
+        self.client.force_login(self.organizor)
+        add_categories = lambda: Category.objects.bulk_create(
+            Category(name=f"Category{i}", organization=self.organization) for i in range(5)
+        )
+        def uncached_get():
+            cache.clear()
+            self.get("leads:category-list")()
+        self.assertConstantQueries(uncached_get, add_categories, num=5)
+        #the counts aggregate is skipped while the cache is warm
+        self.get("leads:category-list")()
+        self.assertNumQueries(4, self.get("leads:category-list"))
+
+    def test_category_detail(self):
+        self.client.force_login(self.organizor)
+        self.assertConstantQueries(
+            self.get("leads:category-detail", pk=self.category.pk), lambda: self.add_leads(5), num=5
+        )
@@ -0,0 +1,154 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.utils import timezone
+
+from leads.assignment import AssignmentEngine
+from leads.models import DailyLeadRollup, Lead
+from leads.rollups import dashboard, rebuild_rollups, rebuild_rollups_matching
+from leads.testing import OrganizationTestMixin
+
+
+class RollupTest(OrganizationTestMixin, TestCase):
+    def setUp(self):
+        super(RollupTest, self).setUp()
+        self.contacted = self.add_category("Contacted")
+        self.converted = self.add_category("Converted")
+        self.today = timezone.localdate()
+
+    def rollups(self):
+        """{(agent_key, category_key): (created, converted)} of today, empty rows left out."""
+        return {
+            (row.agent_key, row.category_key): (row.created, row.converted)
+            for row in DailyLeadRollup.objects.filter(organization=self.organization, day=self.today)
+            if row.created or row.converted
+        }
+
+    def rebuilt(self):
+        rebuild_rollups(self.organization.pk)
+        return self.rollups()
+
+    def test_created_leads_are_counted_by_agent_and_category(self):
+        self.add_lead(agent=self.agent, category=self.contacted)
+        self.add_lead(agent=self.agent, category=self.contacted)
+        self.add_lead()
+        self.assertEqual(self.rollups(), {(self.agent.pk, self.contacted.pk): (2, 0), (0, 0): (1, 0)})
+
+    def test_category_update_view_counts_conversions(self):
+        lead = self.add_lead(agent=self.agent, category=self.contacted)
+        self.client.force_login(self.organizor)
+        self.client.post(reverse("leads:lead-category-update", args=[lead.pk]), {"category": self.converted.pk})
+
+        lead.refresh_from_db()
+        self.assertIsNotNone(lead.converted_at)
+        self.assertEqual(self.rollups(), {(self.agent.pk, self.converted.pk): (1, 1)})
+
+        #moving back out takes the conversion away again
+        self.client.post(reverse("leads:lead-category-update", args=[lead.pk]), {"category": self.contacted.pk})
+        lead.refresh_from_db()
+        self.assertIsNone(lead.converted_at)
+        self.assertEqual(self.rollups(), {(self.agent.pk, self.contacted.pk): (1, 0)})
+
+    def test_bulk_create_counts_and_stamps_conversions(self):
+        Lead.objects.bulk_create([
+            Lead(first_name="Joe", last_name="Soap", organization=self.organization, category=self.converted)
+            for _ in range(3)
+        ])
+        self.assertEqual(Lead.objects.filter(converted_at__isnull=False).count(), 3)
+        self.assertEqual(self.rollups(), {(0, self.converted.pk): (3, 3)})
+
+    def test_incremental_counts_match_a_rebuild(self):
+        first = self.add_lead(category=self.contacted)
+        second = self.add_lead(agent=self.agent)
+        self.add_lead()
+        first.category = self.converted
+        first.save()
+        second.agent = None
+        second.save(update_fields=["agent"])
+        self.add_lead(agent=self.agent).delete()
+        Lead.objects.bulk_create([Lead(first_name="Jane", last_name="Doe", organization=self.organization)])
+        AssignmentEngine(self.organization).assign()
+
+        incremental = self.rollups()
+        self.assertEqual(sum(created for created, _ in incremental.values()), 4)
+        self.assertEqual(incremental, self.rebuilt())
+
+    def test_renaming_a_category_into_or_out_of_converted_restamps_its_leads(self):
+        lead = self.add_lead(agent=self.agent, category=self.contacted)
+        self.client.force_login(self.organizor)
+        self.client.post(reverse("leads:category-update", args=[self.converted.pk]), {"name": "Won"})
+        self.client.post(reverse("leads:category-update", args=[self.contacted.pk]), {"name": "Converted"})
+
+        lead.refresh_from_db()
+        self.assertIsNotNone(lead.converted_at)
+        self.assertEqual(self.rollups(), {(self.agent.pk, self.contacted.pk): (1, 1)})
+        self.assertEqual(self.rebuilt(), {(self.agent.pk, self.contacted.pk): (1, 1)})
+
+        self.client.post(reverse("leads:category-update", args=[self.contacted.pk]), {"name": "Contacted"})
+        lead.refresh_from_db()
+        self.assertIsNone(lead.converted_at)
+        self.assertEqual(self.rollups(), {(self.agent.pk, self.contacted.pk): (1, 0)})
+
+    def test_deleted_agent_moves_its_counts_to_unassigned(self):
+        self.add_lead(agent=self.agent)
+        self.add_lead()
+        agent_pk = self.agent.pk
+        self.agent.delete()
+        #key_deleted rebuilds after the commit, which a TestCase never reaches
+        rebuild_rollups_matching(self.organization.pk, agent_key=agent_pk)
+        self.assertEqual(self.rollups(), {(0, 0): (2, 0)})
+
+    def test_rebuild_only_touches_the_given_days(self):
+        old = self.add_lead()
+        Lead.objects.filter(pk=old.pk).update(date_added=timezone.now() - timedelta(days=3))
+        rebuild_rollups(self.organization.pk, start=self.today)
+        self.assertFalse(DailyLeadRollup.objects.filter(day__lt=self.today).exists())
+        self.assertEqual(self.rollups(), {})
+
+        rebuild_rollups(self.organization.pk)
+        self.assertEqual(
+            DailyLeadRollup.objects.get(organization=self.organization).day, self.today - timedelta(days=3)
+        )
+
+    def test_dashboard_reads_a_constant_number_of_queries(self):
+        self.add_lead(agent=self.agent, category=self.converted)
+        self.add_lead(agent=self.agent, category=self.contacted)
+        self.add_lead()
+        #per day, per agent, per category aggregates and the agent and category names
+        with self.assertNumQueries(5):
+            numbers = dashboard(self.organization, 7)
+        self.assertEqual((numbers["created"], numbers["converted"], numbers["conversion_rate"]), (3, 1, 33.3))
+        self.assertEqual(len(numbers["daily"]), 7)
+        self.assertEqual(numbers["daily"][-1], {"day": self.today, "created": 3, "converted": 1})
+        self.assertEqual(
+            [(row["name"], row["created"], row["converted"]) for row in numbers["agents"]],
+            [("agent", 2, 1), (None, 1, 0)],
+        )
+
+        Lead.objects.bulk_create([
+            Lead(first_name="Joe", last_name="Soap", organization=self.organization, agent=self.agent)
+            for _ in range(50)
+        ])
+        with self.assertNumQueries(5):
+            dashboard(self.organization, 7)
+
+    def test_dashboard_view_is_for_organizors(self):
+        self.add_lead(category=self.contacted)
+        self.client.force_login(self.organizor)
+        response = self.client.get(reverse("leads:dashboard"), {"days": "7"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Contacted")
+
+        self.client.force_login(self.agent.user)
+        self.assertEqual(self.client.get(reverse("leads:dashboard")).status_code, 302)
+
+    def test_rebuild_command(self):
+        self.add_lead()
+        DailyLeadRollup.objects.all().delete()
+        output = StringIO()
+        call_command("rebuild_lead_rollups", "--organizor", "organizor", "--days", "2", stdout=output)
+        self.assertIn("Rebuilt 1 rollup rows", output.getvalue())
+        self.assertEqual(self.rollups(), {(0, 0): (1, 0)})
@@ -0,0 +1,125 @@
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.http import HttpResponse
+from django.shortcuts import reverse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from djcrm.routers import ReplicaRouter, ReplicaStickinessMiddleware, pinned_to_primary, wrote_to_primary
+from leads.models import Agent, Lead, User
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"], DATABASE_REPLICA_STICKY_SECONDS=10)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def request(self, view, cookie=None):
+        """Run view(request) through the middleware, returning what it read from and the response."""
+        reads = []
+
+        def get_response(request):
+            reads.append(view(request))
+            return HttpResponse()
+
+        request = self.factory.get("/")
+        if cookie is not None:
+            request.COOKIES[ReplicaStickinessMiddleware.cookie_name] = cookie
+        response = ReplicaStickinessMiddleware(get_response)(request)
+        return reads[0], response
+
+    def test_reads_go_to_a_replica_until_the_request_writes(self):
+        def view(request):
+            before = self.router.db_for_read(Lead)
+            self.router.db_for_write(Lead)
+            return before, self.router.db_for_read(Lead)
+
+        outside = pinned_to_primary.get()
+        reads, response = self.request(view)
+        self.assertEqual(reads, ("replica1", "default"))
+        self.assertIn(ReplicaStickinessMiddleware.cookie_name, response.cookies)
+        #the flag doesn't leak out of the request
+        self.assertEqual(pinned_to_primary.get(), outside)
+
+    def test_cookie_pins_reads_to_the_primary_until_it_expires(self):
+        read = lambda request: self.router.db_for_read(Lead)
+        self.assertEqual(self.request(read, cookie=str(time.time() + 5))[0], "default")
+        self.assertEqual(self.request(read, cookie=str(time.time() - 1))[0], "replica1")
+        self.assertEqual(self.request(read, cookie="garbage")[0], "replica1")
+        _, response = self.request(read)
+        self.assertNotIn(ReplicaStickinessMiddleware.cookie_name, response.cookies)
+
+    def test_replicas_are_never_migrated(self):
+        self.assertIs(self.router.allow_migrate("replica1", "leads"), False)
+        self.assertIsNone(self.router.allow_migrate("default", "leads"))
+
+
+#a replica alias reading the default test database, like the replicas settings.py makes from
+#DATABASE_REPLICA_URLS. Added here when none is configured, before the test databases are set up
+REPLICA = settings.DATABASE_REPLICAS[0] if settings.DATABASE_REPLICAS else "replica1"
+if REPLICA not in settings.DATABASES:
+    settings.DATABASES[REPLICA] = {**settings.DATABASES[DEFAULT_DB_ALIAS], "TEST": {"MIRROR": DEFAULT_DB_ALIAS}}
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], DATABASE_REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTest(TransactionTestCase):
+    #a TestCase would wrap every test in a transaction on default, and reads inside one stay on default
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def setUp(self):
+        #what a write pins outside a request would otherwise carry over to the next test
+        self.addCleanup(pinned_to_primary.reset, pinned_to_primary.set(False))
+        self.addCleanup(wrote_to_primary.reset, wrote_to_primary.set(False))
+        self.organizor = User.objects.create_user(username="organizor", password="pass")
+        self.lead = Lead.objects.create(first_name="Joe", last_name="Soap", age=30, organization=self.organizor.userprofile)
+        #the rows above were written outside a request, which pinned the test to the primary
+        pinned_to_primary.set(False)
+
+    def queries(self, func):
+        """Run func, returning how many queries it ran on the primary and on the replica."""
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+            with CaptureQueriesContext(connections[REPLICA]) as replica:
+                func()
+        return len(primary), len(replica)
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        self.assertEqual(self.queries(lambda: list(Lead.objects.all())), (0, 1))
+        self.assertEqual(Lead.objects.get(pk=self.lead.pk)._state.db, REPLICA)
+        self.assertEqual(self.queries(lambda: Lead.objects.filter(pk=self.lead.pk).update(age=31)), (1, 0))
+        #outside a request the first write pins the rest of the run
+        self.assertEqual(self.queries(lambda: list(Lead.objects.all())), (1, 0))
+
+    def test_a_request_that_writes_pins_the_browser_to_the_primary(self):
+        self.client.force_login(self.organizor)
+        pinned_to_primary.set(False)
+        primary, replica = self.queries(lambda: self.client.get(reverse("leads:lead-list")))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        response = self.client.post(reverse("leads:lead-update", kwargs={"pk": self.lead.pk}), {
+            "first_name": "Jim", "last_name": "Soap", "age": 30, "description": "Moved", "phone_number": "555",
+            "email": "jim@test.com",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(ReplicaStickinessMiddleware.cookie_name, response.cookies)
+        #the cookie keeps the next requests on the primary, where the change is already visible
+        primary, replica = self.queries(lambda: self.client.get(reverse("leads:lead-list")))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_relations_across_aliases_and_migrations(self):
+        agent_user = User.objects.create_user(username="agent", password="pass", is_organizor=False, is_agent=True)
+        agent = Agent.objects.create(user=agent_user, organization=self.organizor.userprofile)
+        #the rows above were written outside a request, which pinned the test to the primary
+        pinned_to_primary.set(False)
+        lead = Lead.objects.get(pk=self.lead.pk)
+        self.assertEqual((lead._state.db, agent._state.db), (REPLICA, DEFAULT_DB_ALIAS))
+        #allowed by allow_relation, every alias holds the same data
+        lead.agent = agent
+        lead.save()
+        self.assertEqual(Lead.objects.using(DEFAULT_DB_ALIAS).get(pk=lead.pk).agent, agent)
+        self.assertFalse(router.allow_migrate_model(REPLICA, Lead))
+        self.assertTrue(router.allow_migrate_model(DEFAULT_DB_ALIAS, Lead))
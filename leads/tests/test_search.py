@@ -0,0 +1,70 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import TestCase
+
+from leads.models import Lead
+from leads.search import search_leads, search_terms
+from leads.testing import OrganizationTestMixin
+
+
+class LeadSearchTest(OrganizationTestMixin, TestCase):
+    def add_lead(self, first_name, last_name, organization=None, **fields):
+        return super(LeadSearchTest, self).add_lead(organization, first_name=first_name, last_name=last_name, age=30, **fields)
+
+    def search(self, query):
+        return list(search_leads(Lead.objects.filter(organization=self.organization), query))
+
+    def test_terms_drop_punctuation(self):
+        self.assertEqual(search_terms('Jo* "Smith" OR -x'), ["jo", "smith", "or", "x"])
+        self.assertEqual(self.search("*:&|"), [])
+
+    def test_prefix_matches_ranked_by_name_first(self):
+        in_description = self.add_lead("Ann", "Lee", description="met smithers at the fair")
+        in_name = self.add_lead("John", "Smithers")
+        self.add_lead("Jane", "Doe")
+        self.assertEqual(self.search("smith"), [in_name, in_description])
+        self.assertEqual(self.search("jo smi"), [in_name])
+
+    def test_matches_email_and_phone(self):
+        lead = self.add_lead("Ann", "Lee", email="ann@example.com", phone_number="5551234")
+        self.assertEqual(self.search("ann@example"), [lead])
+        self.assertEqual(self.search("5551234"), [lead])
+
+    def test_matches_whole_emails_domains_and_dashed_phones(self):
+        lead = self.add_lead("Ann", "Lee", email="joe@test.com", phone_number="555-123-4567")
+        for query in ["joe@test.com", "test.com", "555-123-4567", "123-4567"]:
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [lead])
+
+    @skipUnless(connection.vendor == "postgresql", "the tsvector column only exists on postgres")
+    def test_postgres_vector_is_split_like_the_query(self):
+        lead = self.add_lead("Ann", "Lee", email="joe@test.com", phone_number="555-123-4567")
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tsvector_to_array(search_vector) FROM leads_lead WHERE id = %s", [lead.pk])
+            lexemes = set(cursor.fetchone()[0])
+        self.assertEqual(lexemes, {"ann", "lee", "joe", "test", "com", "555", "123", "4567"})
+
+    def test_index_follows_updates_deletes_and_bulk_create(self):
+        lead = self.add_lead("John", "Smith")
+        Lead.objects.filter(pk=lead.pk).update(last_name="Jones")
+        self.assertEqual(self.search("smith"), [])
+        self.assertEqual(self.search("jones"), [lead])
+        lead.delete()
+        self.assertEqual(self.search("jones"), [])
+        Lead.objects.bulk_create([Lead(first_name="Bulk", last_name="Lead", age=30, organization=self.organization)])
+        self.assertEqual(len(self.search("bulk")), 1)
+
+    def test_view_is_scoped_to_the_tenant(self):
+        self.add_lead("John", "Smith", organization=self.add_organization("other")[1])
+        mine = self.add_lead("John", "Smith", agent=self.agent)
+        unassigned = self.add_lead("John", "Smithson")
+
+        self.client.force_login(self.organizor)
+        response = self.client.get(reverse("leads:lead-search"), {"q": "john"})
+        self.assertEqual(set(response.context["leads"]), {mine, unassigned})
+
+        self.client.force_login(self.agent.user)
+        response = self.client.get(reverse("leads:lead-search"), {"q": "john"})
+        self.assertEqual(list(response.context["leads"]), [mine])
@@ -0,0 +1,32 @@
+from django.test import TestCase
+
+from leads.middleware import Tenant
+from leads.models import Agent, Category, Lead, User
+from leads.testing import OrganizationTestMixin
+
+
+class TenantTest(OrganizationTestMixin, TestCase):
+    def setUp(self):
+        super(TenantTest, self).setUp()
+        self.other_agent = self.add_agent("other")
+        self.lead = self.add_lead(agent=self.agent)
+        self.add_lead(first_name="Jane", agent=self.other_agent)
+        other_organization = self.add_organization("other-organizor")[1]
+        self.add_lead(other_organization, first_name="Jim")
+        self.add_category("Other", other_organization)
+        self.category = self.add_category("Contacted")
+
+    def test_organizor_sees_the_whole_organization(self):
+        tenant = Tenant(User.objects.get(pk=self.organizor.pk))
+        self.assertEqual(Lead.objects.for_tenant(tenant).count(), 2)
+        self.assertEqual(list(Category.objects.for_tenant(tenant)), [self.category])
+        self.assertEqual(Agent.objects.for_tenant(tenant).count(), 2)
+
+    def test_agent_sees_only_own_leads(self):
+        tenant = Tenant(User.objects.get(pk=self.agent.user.pk))
+        #one joined query resolves the agent and its organization
+        with self.assertNumQueries(1):
+            self.assertEqual(tenant.organization, self.organization)
+            self.assertEqual(tenant.agent, self.agent)
+        self.assertEqual(list(Lead.objects.for_tenant(tenant)), [self.lead])
+        self.assertEqual(list(Category.objects.for_tenant(tenant)), [self.category])
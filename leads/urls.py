@@ -7,9 +7,24 @@ from .views import (
     LeadUpdateView, 
     LeadDeleteView, 
     AssignAgentView,
+    BulkAssignAgentView,
     CategoryListView,
     CategoryDetailView,
+    CategoryCreateView,
+    CategoryUpdateView,
+    CategoryDeleteView,
     LeadCategoryUpdateView,
+    LeadImportView,
+    LeadExportView,
+    LeadSearchView,
+    AutocompleteView,
+    DashboardView,
+)
+from .async_views import (
+    AsyncLeadListView,
+    AsyncLeadDetailView,
+    AsyncCategoryListView,
+    AsyncAutocompleteView,
 )
 
 app_name = "leads"
@@ -22,7 +37,21 @@ urlpatterns = [
     path('<int:pk>/assign-agent/', AssignAgentView.as_view(), name='assign-agent'),
     path('<int:pk>/category/', LeadCategoryUpdateView.as_view(), name='lead-category-update'),
     path('create/', LeadCreateView.as_view(), name='lead-create'),
+    path('assign-agents/', BulkAssignAgentView.as_view(), name='bulk-assign-agent'),
+    path('import/', LeadImportView.as_view(), name='lead-import'),
+    path('export/', LeadExportView.as_view(), name='lead-export'),
+    path('search/', LeadSearchView.as_view(), name='lead-search'),
+    path('autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
     path('categories/', CategoryListView.as_view(), name='category-list'),
     path('categories/<int:pk>/', CategoryDetailView.as_view(), name='category-detail'),
+    path('categories/<int:pk>/update/', CategoryUpdateView.as_view(), name='category-update'),
+    path('categories/<int:pk>/delete/', CategoryDeleteView.as_view(), name='category-delete'),
+    path('categories/create/', CategoryCreateView.as_view(), name='category-create'),
+    #async variants of the read heavy pages, for ASGI deployments
+    path('async/', AsyncLeadListView.as_view(), name='lead-list-async'),
+    path('async/<int:pk>/', AsyncLeadDetailView.as_view(), name='lead-detail-async'),
+    path('async/categories/', AsyncCategoryListView.as_view(), name='category-list-async'),
+    path('async/autocomplete/', AsyncAutocompleteView.as_view(), name='autocomplete-async'),
 
 ]
\ No newline at end of file
@@ -1,11 +1,24 @@
-from django.shortcuts import render, redirect, reverse
-from django.core.mail import send_mail
-from django.http import HttpResponse
+import io
+from django.conf import settings
+from django.shortcuts import render, redirect, reverse, get_object_or_404
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.exceptions import PermissionDenied
 from django.views import generic
+from django.utils import timezone
 from .models import Lead, Agent, Category
-from .forms import LeadForm, LeadModelForm, CustomUserCreationForm, AssignAgentForm, LeadCategoryUpdateForm
+from .forms import LeadForm, LeadModelForm, CustomUserCreationForm, AssignAgentForm, LeadCategoryUpdateForm, LeadImportForm, CategoryModelForm, BulkAssignAgentForm
+from .importers import CSV_READ_ERRORS, LeadCSVImporter, csv_read_error
+from .exporters import stream_csv, stream_json
+from .mail import queue_mail
+from .counters import category_counts
+from .assignment import AssignmentEngine
+from .search import search_leads
+from .autocomplete import AGENT, KINDS, LEAD, autocomplete
+from .rollups import dashboard
 from django.contrib.auth.mixins import LoginRequiredMixin
 from agents.mixins import OrganizorAndLoginRequiredMixin
+from .pagination import KeysetPaginationMixin, KeysetPaginator, OffsetPage
+from .conditional import ConditionalGetMixin, make_etag
 # Create your views here.
 
 #CRUD+L - Create, Retrieve, Update, and Delete + List
@@ -35,46 +48,126 @@ def landing_page(request):
     return render(request, "landing.html")
 
 
+#the columns of a lead the list page reads: names on the cards, updated_at for the card cache
+#and date_added for the keyset pagination. The unassigned cards show the description too
+LEAD_CARD_FIELDS = ("first_name", "last_name", "updated_at", "date_added")
+
+
 # #converting the lead_list function based view to a class based view
-class LeadListView(generic.ListView):
+class LeadListView(LoginRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, generic.ListView):
+    #most queries and milliseconds of SQL a request may take, with the session, user and tenant lookups,
+    #checked by leads.budgets.QueryBudgetMiddleware
+    query_budget = 5
+    sql_time_budget = 100
     #specifying a template name
     template_name = "leads/lead_list.html"
     #ListView automatically assign context variable to be object_list
     context_object_name = "leads"
+    #the unassigned leads block is paged independently with its own cursor
+    unassigned_cursor_kwarg = "unassigned_cursor"
 
     def get_queryset(self):
-        user = self.request.user
+        #for_tenant gives organizors every lead of the organization and agents only their own
+        queryset = Lead.objects.for_tenant(self.request.tenant).filter(agent__isnull=False)
+        #only what the cards render, their cache keys and the keyset cursor read, no related rows
+        return queryset.only(*LEAD_CARD_FIELDS)
 
-        # initial queryset of leads for the entire organization
-        if user.is_organizor:
-            queryset = Lead.objects.filter(
-                organization=user.userprofile,
-                agent__isnull=False
-                )
-        #filtering the leads based on the conditions of the user
-        else:
-            queryset = Lead.objects.filter(
-                organization=user.agent.organization,
-                agent__isnull=False
-                )
-            # filter for the agent that is logged in
-            queryset = queryset.filter(agent__user=user)
-        return queryset
+    def get_unassigned_queryset(self):
+        return Lead.objects.for_tenant(self.request.tenant).filter(
+            agent__isnull=True
+        ).only(*LEAD_CARD_FIELDS, "description")
 
     def get_context_data(self, **kwargs):
         context = super(LeadListView, self).get_context_data(**kwargs)
-        user = self.request.user
-        if user.is_organizor:
-            queryset = Lead.objects.filter(
-                organization=user.userprofile,
-                agent__isnull=True
-            )
+        tenant = self.request.tenant
+        if tenant.is_organizor:
+            queryset = self.get_unassigned_queryset()
+            paginator = KeysetPaginator(queryset, self.get_paginate_by(queryset))
+            page = paginator.page(self.get_cursor(self.unassigned_cursor_kwarg))
             context.update({
-                "unassigned_leads": queryset
+                "unassigned_leads": page.object_list,
+                "unassigned_page_obj": page,
             })
         return context
 
 
+class LeadSearchView(LoginRequiredMixin, ConditionalGetMixin, generic.ListView):
+    query_budget = 4
+    #the full text match of a common name over a large organization
+    sql_time_budget = 1000
+    template_name = "leads/lead_search.html"
+    context_object_name = "leads"
+
+    def get_query(self):
+        return self.request.GET.get("q", "").strip()
+
+    def get_queryset(self):
+        queryset = Lead.objects.for_tenant(self.request.tenant).select_related("agent__user", "category")
+        return search_leads(queryset, self.get_query())
+
+    def paginate_queryset(self, queryset, page_size):
+        #results are ordered by rank so keyset pagination doesn't apply, OffsetPage at least skips the COUNT(*)
+        try:
+            number = max(int(self.request.GET.get("page", 1)), 1)
+        except ValueError:
+            number = 1
+        page = OffsetPage(queryset, number, page_size)
+        return (None, page, page.object_list, page.has_next or page.has_previous)
+
+    def get_paginate_by(self, queryset):
+        return settings.LEADS_PAGINATE_BY
+
+    def get_context_data(self, **kwargs):
+        context = super(LeadSearchView, self).get_context_data(**kwargs)
+        context["query"] = self.get_query()
+        return context
+
+
+class AutocompleteView(LoginRequiredMixin, ConditionalGetMixin, generic.View):
+    query_budget = 5
+    sql_time_budget = 100
+    #?type=agent|lead&q=jo returns {"results": [{"id": 1, "text": "John Smith"}, ...]}
+    def get(self, request, *args, **kwargs):
+        tenant = request.tenant
+        kind = request.GET.get("type", LEAD)
+        if kind not in KINDS:
+            kind = LEAD
+        if kind == AGENT and not tenant.is_organizor:
+            raise PermissionDenied
+        query = request.GET.get("q", "").strip()
+        results = []
+        if query:
+            #agents only get suggestions from their own leads, like everywhere else
+            agent_id = None if tenant.is_organizor else tenant.agent.pk
+            results = autocomplete(
+                tenant.organization.pk, query, kind, limit=settings.AUTOCOMPLETE_LIMIT, agent_id=agent_id
+            )
+        return JsonResponse({"results": [{"id": pk, "text": label} for pk, label in results]})
+
+
+class LeadExportView(LoginRequiredMixin, ConditionalGetMixin, generic.View):
+    #the leads are streamed after the middleware is done, only the queries before the stream count
+    query_budget = 3
+    #?format=csv (default) or ?format=json
+    formats = {
+        "csv": (stream_csv, "text/csv"),
+        "json": (stream_json, "application/json"),
+    }
+
+    def get_queryset(self):
+        # organizors export every lead of the organization, assigned or not, agents only their own
+        return Lead.objects.for_tenant(self.request.tenant)
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get("format", "csv")
+        if export_format not in self.formats:
+            export_format = "csv"
+        stream, content_type = self.formats[export_format]
+        response = StreamingHttpResponse(stream(self.get_queryset()), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="leads.{export_format}"'
+        return response
+
+
 #django takes our function and passes request into it and returns our httpresponse
 def lead_list(request):
     #retrieved all leads with a queryset
@@ -88,23 +181,26 @@ def lead_list(request):
     return render(request, "leads/lead_list.html", context)
 
 
-class LeadDetailView(generic.DetailView):
+class LeadDetailView(LoginRequiredMixin, ConditionalGetMixin, generic.DetailView):
+    query_budget = 5
+    sql_time_budget = 50
     template_name = "leads/lead_detail.html"
     queryset = Lead.objects.all()
     context_object_name = "lead"
 
-    def get_queryset(self):
-        user = self.request.user
+    def get_change_stamp(self):
+        #the page only shows the lead's own fields, a lead the user can't see has no stamp and 404s
+        return (
+            Lead.objects.for_tenant(self.request.tenant)
+            .filter(pk=self.kwargs["pk"])
+            .values_list("updated_at", flat=True)
+            .first()
+        )
 
-        # initial queryset of leads for the entire organization
-        if user.is_organizor:
-            queryset = Lead.objects.filter(organization=user.userprofile)
-        #filtering the leads based on the conditions of the user
-        else:
-            queryset = Lead.objects.filter(organization=user.agent.organization)
-            # filter for the agent that is logged in
-            queryset = queryset.filter(agent__user=user)
-        return queryset
+    def get_queryset(self):
+        # leads for the entire organization, or only the agent's own leads
+        queryset = Lead.objects.for_tenant(self.request.tenant)
+        return queryset.select_related("agent__user", "category")
     
 
 
@@ -123,14 +219,21 @@ class LeadCreateView(OrganizorAndLoginRequiredMixin, generic.CreateView):
     template_name = "leads/lead_create.html"
     form_class = LeadModelForm
 
+    def get_form_kwargs(self, **kwargs):
+        kwargs = super(LeadCreateView, self).get_form_kwargs(**kwargs)
+        kwargs.update({
+            "request": self.request
+        })
+        return kwargs
+
     def get_success_url(self):
         return reverse("leads:lead-list")
 
     def form_valid(self, form):
         lead = form.save(commit=False)
-        lead.organization = self.request.user.userprofile
+        lead.organization = self.request.tenant.organization
         lead.save()
-        send_mail(
+        queue_mail(
             subject="A lead has been created",
             message="Go to the site to see the new lead",
             from_email="test@test.com",
@@ -140,6 +243,22 @@ class LeadCreateView(OrganizorAndLoginRequiredMixin, generic.CreateView):
 
 
 
+class LeadImportView(OrganizorAndLoginRequiredMixin, generic.FormView):
+    template_name = "leads/lead_import.html"
+    form_class = LeadImportForm
+
+    def form_valid(self, form):
+        #reading the upload line by line instead of loading the whole file into memory
+        lines = io.TextIOWrapper(form.cleaned_data["file"].file, encoding="utf-8-sig", newline="")
+        importer = LeadCSVImporter(self.request.tenant.organization)
+        try:
+            result = importer.run(lines)
+        except CSV_READ_ERRORS as error:
+            form.add_error("file", csv_read_error(error))
+            return self.render_to_response(self.get_context_data(form=form, result=importer.result))
+        return self.render_to_response(self.get_context_data(form=form, result=result))
+
+
 #this view will allow us to submit a form and create our own lead
 def lead_create(request):
     form = LeadModelForm()
@@ -163,10 +282,15 @@ class LeadUpdateView(OrganizorAndLoginRequiredMixin, generic.UpdateView):
     queryset = Lead.objects.all()
 
     def get_queryset(self):
-        user = self.request.user
         # initial queryset of leads for the entire organization
-        #filtering the leads based on the conditions of the user
-        return Lead.objects.filter(organization=user.userprofile)
+        return Lead.objects.for_tenant(self.request.tenant)
+
+    def get_form_kwargs(self, **kwargs):
+        kwargs = super(LeadUpdateView, self).get_form_kwargs(**kwargs)
+        kwargs.update({
+            "request": self.request
+        })
+        return kwargs
 
     def get_success_url(self):
         return reverse("leads:lead-list")
@@ -196,10 +320,8 @@ class LeadDeleteView(OrganizorAndLoginRequiredMixin, generic.DeleteView):
         return reverse("leads:lead-list")
 
     def get_queryset(self):
-        user = self.request.user
         # initial queryset of leads for the entire organization
-        #filtering the leads based on the conditions of the user
-        return Lead.objects.filter(organization=user.userprofile)
+        return Lead.objects.for_tenant(self.request.tenant)
 
 
 
@@ -228,78 +350,133 @@ class AssignAgentView(OrganizorAndLoginRequiredMixin, generic.FormView):
     def form_valid(self, form):
         #accessing value that is submitted
         agent = form.cleaned_data["agent"]
-        lead = Lead.objects.get(id=self.kwargs["pk"])
+        #only leads of the organizor's own organization can be assigned
+        lead = get_object_or_404(Lead.objects.for_tenant(self.request.tenant), id=self.kwargs["pk"])
         lead.agent = agent
         lead.save()
         return super(AssignAgentView, self).form_valid(form)
 
 
-class CategoryListView(LoginRequiredMixin, generic.ListView):
+class BulkAssignAgentView(OrganizorAndLoginRequiredMixin, generic.FormView):
+    #the leads are written an agent at a time, see AssignmentEngine.apply()
+    query_max_repeats = None
+    template_name = "leads/bulk_assign_agent.html"
+    form_class = BulkAssignAgentForm
+
+    def get_initial(self):
+        #the page is what the "Assign all unassigned leads" link opens
+        return {"all_unassigned": True}
+
+    def get_success_url(self):
+        return reverse("leads:lead-list")
+
+    def form_valid(self, form):
+        engine = AssignmentEngine(self.request.tenant.organization, form.cleaned_data["strategy"])
+        #None assigns every unassigned lead of the organization
+        engine.assign(None if form.cleaned_data["all_unassigned"] else form.cleaned_data["leads"])
+        return super(BulkAssignAgentView, self).form_valid(form)
+
+
+class DashboardView(OrganizorAndLoginRequiredMixin, ConditionalGetMixin, generic.TemplateView):
+    query_budget = 8
+    sql_time_budget = 100
+    template_name = "leads/dashboard.html"
+
+    def get_etag(self, stamp):
+        #the window ends today, the page changes at midnight too
+        return make_etag(self.request, stamp, timezone.localdate().isoformat())
+
+    def get_last_modified(self, stamp):
+        return None
+
+    def get_days(self):
+        #?days= picks the window, within 1..DASHBOARD_MAX_DAYS
+        try:
+            days = int(self.request.GET.get("days", settings.DASHBOARD_DAYS))
+        except ValueError:
+            days = settings.DASHBOARD_DAYS
+        return min(max(days, 1), settings.DASHBOARD_MAX_DAYS)
+
+    def get_context_data(self, **kwargs):
+        context = super(DashboardView, self).get_context_data(**kwargs)
+        #only the daily rollups are read, never the leads table
+        context.update(dashboard(self.request.tenant.organization, self.get_days()))
+        return context
+
+
+class CategoryListView(LoginRequiredMixin, ConditionalGetMixin, generic.ListView):
+    query_budget = 5
+    sql_time_budget = 100
     template_name = "leads/category_list.html"
     context_object_name = "category_list"
 
     def get_context_data(self, **kwargs):
         context = super(CategoryListView, self).get_context_data(**kwargs)
-        user = self.request.user
-
-        if user.is_organizor:
-            queryset = Lead.objects.filter(
-                organization=user.userprofile
-                )
-        #filtering the leads based on the conditions of the user
-        else:
-            queryset = Category.objects.filter(
-                organization=user.agent.organization
-                )
-        
+        counts = category_counts(self.request.tenant.organization)
+        self.add_lead_counts(context["category_list"], counts)
         context.update({
-            "unassigned_lead_count": Lead.objects.filter(category__isnull=True).count()
+            "unassigned_lead_count": counts.get(None, 0)
         })
         return context
 
+    def add_lead_counts(self, categories, counts):
+        for category in categories:
+            category.lead_count = counts.get(category.pk, 0)
+
     def get_queryset(self):
-        user = self.request.user
+        # categories of the organization, for organizors and agents alike
+        return Category.objects.for_tenant(self.request.tenant)
 
-        # initial queryset of leads for the entire organization
-        if user.is_organizor:
-            queryset = Category.objects.filter(
-                organization=user.userprofile
-                )
-        #filtering the leads based on the conditions of the user
-        else:
-            queryset = Category.objects.filter(
-                organization=user.agent.organization
-                )
-        return queryset
-
-
-class CategoryDetailView(LoginRequiredMixin, generic.DetailView):
+
+class CategoryDetailView(LoginRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, generic.DetailView):
+    query_budget = 5
+    sql_time_budget = 100
     template_name = "leads/category_detail.html"
     context_object_name = "category"
 
 
     def get_queryset(self):
-        user = self.request.user
+        return Category.objects.for_tenant(self.request.tenant)
 
-        # initial queryset of leads for the entire organization
-        if user.is_organizor:
-            queryset = Category.objects.filter(
-                organization=user.userprofile
-                )
-        #filtering the leads based on the conditions of the user
-        else:
-            queryset = Category.objects.filter(
-                organization=user.agent.organization
-                )
-        return queryset
-
-
-class CategoryCreateView(LoginRequiredMixin, generic.CreateView):
+    def get_leads_queryset(self):
+        #agents only see their own leads here too
+        return Lead.objects.for_tenant(self.request.tenant).filter(category=self.object)
+
+    def get_context_data(self, **kwargs):
+        context = super(CategoryDetailView, self).get_context_data(**kwargs)
+        #a page of leads at a time, a category can hold most of an organization's leads
+        queryset = self.get_leads_queryset()
+        page = KeysetPaginator(queryset, self.get_paginate_by(queryset)).page(self.get_cursor())
+        context.update({
+            "leads": page.object_list,
+            "page_obj": page,
+        })
+        return context
+
+
+class CategoryCreateView(OrganizorAndLoginRequiredMixin, generic.CreateView):
     template_name = "leads/category_create.html"
-    form_class = LeadModelForm
+    form_class = CategoryModelForm
+
+    def get_success_url(self):
+        return reverse("leads:category-list")
+
+    def form_valid(self, form):
+        category = form.save(commit=False)
+        category.organization = self.request.tenant.organization
+        category.save()
+        return super(CategoryCreateView, self).form_valid(form)
+
+
+class CategoryUpdateView(OrganizorAndLoginRequiredMixin, generic.UpdateView):
+    template_name = "leads/category_update.html"
+    form_class = CategoryModelForm
 
     def get_success_url(self):
-        return reverse("catetory:category-list")
+        return reverse("leads:category-list")
+
+    def get_queryset(self):
+        return Category.objects.for_tenant(self.request.tenant)
 
 
 
@@ -315,17 +492,8 @@ class LeadCategoryUpdateView(LoginRequiredMixin, generic.UpdateView):
 
 
     def get_queryset(self):
-        user = self.request.user
-
-        # initial queryset of leads for the entire organization
-        if user.is_organizor:
-            queryset = Lead.objects.filter(organization=user.userprofile)
-        #filtering the leads based on the conditions of the user
-        else:
-            queryset = Lead.objects.filter(organization=user.agent.organization)
-            # filter for the agent that is logged in
-            queryset = queryset.filter(agent__user=user)
-        return queryset
+        # leads for the entire organization, or only the agent's own leads
+        return Lead.objects.for_tenant(self.request.tenant)
 
 
     def get_success_url(self):
@@ -344,10 +512,8 @@ class CategoryDeleteView(OrganizorAndLoginRequiredMixin, generic.DeleteView):
         return reverse("leads:lead-list")
 
     def get_queryset(self):
-        user = self.request.user
-        # initial queryset of leads for the entire organization
-        #filtering the leads based on the conditions of the user
-        return Category.objects.filter(organization=user.userprofile)
+        # initial queryset of categories for the entire organization
+        return Category.objects.for_tenant(self.request.tenant)
 
 
 
@@ -1 +1,35 @@
-console.log("Hi")
\ No newline at end of file
+console.log("Hi")
+
+//typeahead for the AutocompleteSelect widget: the text box asks the autocomplete endpoint for
+//suggestions and the hidden input holds the id of the one that was picked
+document.querySelectorAll("[data-autocomplete]").forEach(function (container) {
+    var hidden = container.querySelector("input[type=hidden]")
+    var input = container.querySelector("input[type=text]")
+    var options = container.querySelector("datalist")
+    var timer = null
+
+    input.addEventListener("input", function () {
+        var picked = Array.prototype.find.call(options.options, function (option) {
+            return option.value === input.value
+        })
+        hidden.value = picked ? picked.dataset.id : ""
+        if (picked) {
+            return
+        }
+        clearTimeout(timer)
+        timer = setTimeout(function () {
+            var url = container.dataset.autocomplete + "&q=" + encodeURIComponent(input.value)
+            fetch(url, {credentials: "same-origin"})
+                .then(function (response) { return response.json() })
+                .then(function (data) {
+                    options.innerHTML = ""
+                    data.results.forEach(function (result) {
+                        var option = document.createElement("option")
+                        option.value = result.text
+                        option.dataset.id = result.id
+                        options.appendChild(option)
+                    })
+                })
+        }, 150)
+    })
+})